@@ -2,21 +2,345 @@
 Analytics Service for TaskFlow Python Backend
 """
 
+import bisect
+import itertools
 import logging
+import os
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import json
+from memory_tracker import memory_tracker
+from metrics import metrics
+from state_snapshots import pack_strings, paused_gc, state_snapshots, unpack_strings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the deployment
+    orjson = None
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Summaries are streamed in chunks of this many users, e.g. one FCM batch each
+SUMMARY_CHUNK_USERS = 500
+# Periods with at least this many events are summarized in worker processes
+OFFLOAD_MIN_EVENTS = int(os.getenv('SUMMARY_OFFLOAD_MIN_EVENTS', '500000'))
+
+def build_summary(user_id: str, period: str, event_count: int, tasks_completed: int, projects_active: int) -> Dict:
+    """
+    Build a user summary from the user's event counts of one period
+    
+    Args:
+        user_id: User ID
+        period: Time period (daily, weekly, monthly)
+        event_count: Number of events within the period
+        tasks_completed: Number of task_completed events
+        projects_active: Number of distinct projects of the events
+        
+    Returns:
+        User summary data
+    """
+    # Calculate hours worked (simplified)
+    hours_worked = event_count * 0.5  # Assume 30 minutes per activity
+    
+    # Calculate productivity score (simplified)
+    productivity_score = min(10, tasks_completed * 2 + hours_worked * 0.2)
+    
+    # Calculate trends (simplified)
+    completion_rate = tasks_completed / max(1, event_count) if event_count else 0
+    improvement = completion_rate * 0.1  # Simplified improvement calculation
+    
+    return {
+        "user_id": user_id,
+        "period": period,
+        "summary": {
+            "tasksCompleted": tasks_completed,
+            "projectsActive": projects_active,
+            "hoursWorked": round(hours_worked, 1),
+            "productivityScore": round(productivity_score, 1)
+        },
+        "trends": {
+            "completionRate": round(completion_rate, 2),
+            "improvement": round(improvement, 2)
+        }
+    }
+
+def summarize_events(user_id: str, period: str, user_events: List[Dict]) -> Dict:
+    """
+    Summarize a user's events of one period
+    
+    Args:
+        user_id: User ID
+        period: Time period (daily, weekly, monthly)
+        user_events: The user's events within the period
+        
+    Returns:
+        User summary data
+    """
+    tasks_completed = len([
+        event for event in user_events
+        if event["event_type"] == "task_completed"
+    ])
+    
+    projects_active = len(set([
+        event["event_data"].get("project_id") for event in user_events
+        if event["event_data"].get("project_id")
+    ]))
+    
+    return build_summary(user_id, period, len(user_events), tasks_completed, projects_active)
+
+def summarize_shard(shard: Tuple) -> List[Dict]:
+    """
+    Summarize a chunk of users from their events as arrays; runs in a worker process for large periods
+    
+    Args:
+        shard: (period, user IDs, and per event of the period: the user's
+            position in the user IDs, whether it completed a task, and its
+            project code or -1)
+        
+    Returns:
+        Summaries, in the order of the user IDs
+    """
+    import numpy as np
+    
+    period, user_ids, users, completed, projects = shard
+    count = len(user_ids)
+    event_counts = np.bincount(users, minlength=count)
+    tasks_completed = np.bincount(users, weights=completed, minlength=count).astype(np.int64)
+    # Distinct (user, project) pairs, counted per user
+    with_project = projects >= 0
+    project_count = int(projects.max()) + 1 if with_project.any() else 1
+    pairs = np.unique(users[with_project] * project_count + projects[with_project])
+    projects_active = np.bincount(pairs // project_count, minlength=count)
+    return [
+        build_summary(user_id, period, *counts)
+        for user_id, *counts in zip(user_ids, event_counts.tolist(), tasks_completed.tolist(), projects_active.tolist())
+    ]
+
+def _isoformat_round_trips(timestamp: str) -> bool:
+    """Whether datetime.isoformat() gives back a timestamp after parsing it as datetime64[us]"""
+    if len(timestamp) == 26:
+        return timestamp[10] == 'T' and timestamp[19] == '.' and timestamp[20:] != '000000'
+    return len(timestamp) == 19 and timestamp[10] == 'T'
+
+def _event_number(event_id: str) -> int:
+    """N of an "event_N" event ID, -1 for other IDs"""
+    number = event_id[6:]
+    if event_id.startswith("event_") and number.isdigit() and f"event_{int(number)}" == event_id:
+        return int(number)
+    return -1
+
+def _dumps_data(event_data: Dict) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(event_data)
+        except TypeError:
+            pass
+    return json.dumps(event_data, separators=(',', ':'), default=str).encode()
+
+class EventColumns:
+    """
+    The events as NumPy arrays, for batch summaries and state snapshots
+    
+    Users, projects, event types and event data are coded as integers.
+    Events recorded since the last update are encoded on the next one, so
+    each event is read once.
+    """
+    
+    def __init__(self):
+        """Initialize the columns, filled on the first update"""
+        # NumPy is imported then, not with the app
+        self._events = None
+        self.size = 0
+        self._lock = threading.Lock()
+    
+    def _reset(self, events: Optional[List[Dict]]):
+        import numpy as np
+        
+        self._events = events
+        self.size = 0
+        self.user_codes = {}
+        self.project_codes = {}
+        self.type_codes = {}
+        self.data_codes = {}  # Event data as JSON -> code
+        self.users = np.empty(0, np.int64)
+        self.times = np.empty(0, 'datetime64[us]')
+        self.completed = np.empty(0, bool)
+        self.projects = np.empty(0, np.int64)
+        self.types = np.empty(0, np.int64)
+        self.data = np.empty(0, np.int64)
+        self.data_projects = np.empty(0, np.int64)  # Project code of each event data code, or -1
+        # N of each "event_N" event ID, -1 for other IDs
+        self.numbers = np.empty(0, np.int64)
+        # By position, the event IDs not of the form "event_N" and the
+        # timestamps isoformat() would not give back
+        self.other_ids = {}
+        self.other_times = {}
+    
+    def _encode(self, events: List[Dict], size: int):
+        """Encode the events up to size added since the last update"""
+        import numpy as np
+        
+        if events is not self._events or size < self.size:
+            self._reset(events)
+        if size <= self.size:
+            return
+        user_codes, project_codes = self.user_codes, self.project_codes
+        type_codes, data_codes = self.type_codes, self.data_codes
+        other_times, other_ids = self.other_times, self.other_ids
+        dumps = orjson.dumps if orjson is not None else _dumps_data
+        data_projects = []  # Project code of each new event data code
+        users, times, types, data, numbers = [], [], [], [], []
+        for position, event in enumerate(events[self.size:size], self.size):
+            users.append(user_codes.setdefault(event["user_id"], len(user_codes)))
+            timestamp = event["timestamp"]
+            times.append(timestamp)
+            if (len(timestamp) != 26 or timestamp[10] != 'T' or timestamp.endswith('000000')) \
+                    and not _isoformat_round_trips(timestamp):
+                other_times[position] = timestamp
+            types.append(type_codes.setdefault(event["event_type"], len(type_codes)))
+            event_data = event["event_data"]
+            try:
+                text = dumps(event_data)
+            except TypeError:
+                text = _dumps_data(event_data)
+            code = data_codes.get(text)
+            if code is None:
+                code = data_codes[text] = len(data_codes)
+                project_id = event_data.get("project_id")
+                data_projects.append(project_codes.setdefault(project_id, len(project_codes)) if project_id else -1)
+            data.append(code)
+            event_id = event["event_id"]
+            number = position + 1 if event_id == f"event_{position + 1}" else _event_number(event_id)
+            numbers.append(number)
+            if number < 0:
+                other_ids[position] = event_id
+        types = np.array(types, np.int64)
+        data = np.array(data, np.int64)
+        # Per type and per event data, then per event
+        completed = np.array([event_type == "task_completed" for event_type in type_codes], bool)[types]
+        self.data_projects = np.concatenate((self.data_projects, np.array(data_projects, np.int64)))
+        self.users = np.concatenate((self.users, np.array(users, np.int64)))
+        self.times = np.concatenate((self.times, np.array(times, 'datetime64[us]')))
+        self.completed = np.concatenate((self.completed, completed))
+        self.projects = np.concatenate((self.projects, self.data_projects[data]))
+        self.types = np.concatenate((self.types, types))
+        self.data = np.concatenate((self.data, data))
+        self.numbers = np.concatenate((self.numbers, np.array(numbers, np.int64)))
+        self.size = size
+    
+    def update(self, events: List[Dict]) -> Tuple:
+        """
+        Encode the events added since the last update
+        
+        Args:
+            events: Every event, in recording order
+            
+        Returns:
+            (user codes by ID, and per event: user code, time, whether it
+            completed a task, and project code or -1)
+        """
+        with self._lock:
+            self._encode(events, len(events))
+            return dict(self.user_codes), self.users, self.times, self.completed, self.projects
+    
+    def containers(self) -> Tuple:
+        """The codes and arrays held, for memory accounting"""
+        names = ('user_codes', 'project_codes', 'type_codes', 'data_codes', 'users', 'times', 'completed',
+                 'projects', 'types', 'data', 'data_projects', 'numbers', 'other_ids', 'other_times')
+        return tuple(getattr(self, name) for name in names if hasattr(self, name))
+    
+    def snapshot(self, events: List[Dict]) -> Dict[str, Any]:
+        """
+        Encode the events added since the last update, and get every column
+        
+        Args:
+            events: Every event, in recording order
+            
+        Returns:
+            Tables of the users, event types and event data (as JSON) in code
+            order, and the per-event columns: user, type and data codes,
+            time, event number, with the other IDs and timestamps by position
+        """
+        with self._lock:
+            self._encode(events, len(events))
+            return {
+                "users": list(self.user_codes),
+                "types": list(self.type_codes),
+                "data": [text.decode() for text in self.data_codes],
+                "user": self.users,
+                "type": self.types,
+                "data_code": self.data,
+                "time": self.times,
+                "number": self.numbers,
+                "other_ids": dict(self.other_ids),
+                "other_times": dict(self.other_times)
+            }
+    
+    def append(self, events: List[Dict], new_events: List[Dict], columns: Dict[str, Any]):
+        """
+        Append events together with their columns, saving their encoding
+        
+        Args:
+            events: Every event, in recording order, extended with new_events
+            new_events: Events to append, e.g. restored from a snapshot
+            columns: The new events' columns, as returned by snapshot, with
+                "data_values" the event data parsed from "data"
+        """
+        import numpy as np
+        
+        with self._lock:
+            self._encode(events, len(events))
+            offset = self.size
+            user_codes, project_codes = self.user_codes, self.project_codes
+            type_codes, data_codes = self.type_codes, self.data_codes
+            # The new codes of the appended events' codes
+            user_map = np.array([user_codes.setdefault(user_id, len(user_codes)) for user_id in columns["users"]], np.int64)
+            type_map = np.array([type_codes.setdefault(event_type, len(type_codes)) for event_type in columns["types"]], np.int64)
+            data_map, data_projects = [], []
+            for text, value in zip(columns["data"], columns["data_values"]):
+                code = data_codes.get(text.encode())
+                if code is None:
+                    code = data_codes[text.encode()] = len(data_codes)
+                    project_id = value.get("project_id")
+                    data_projects.append(project_codes.setdefault(project_id, len(project_codes)) if project_id else -1)
+                data_map.append(code)
+            data_map = np.array(data_map, np.int64)
+            self.data_projects = np.concatenate((self.data_projects, np.array(data_projects, np.int64)))
+            completed_map = np.array([event_type == "task_completed" for event_type in columns["types"]], bool)
+            
+            self.users = np.concatenate((self.users, user_map[columns["user"]]))
+            self.times = np.concatenate((self.times, columns["time"]))
+            self.completed = np.concatenate((self.completed, completed_map[columns["type"]]))
+            self.projects = np.concatenate((self.projects, self.data_projects[data_map[columns["data_code"]]]))
+            self.types = np.concatenate((self.types, type_map[columns["type"]]))
+            self.data = np.concatenate((self.data, data_map[columns["data_code"]]))
+            self.numbers = np.concatenate((self.numbers, columns["number"]))
+            self.other_ids.update((offset + position, event_id) for position, event_id in columns["other_ids"].items())
+            self.other_times.update((offset + position, timestamp) for position, timestamp in columns["other_times"].items())
+            events.extend(new_events)
+            self.size = len(events)
+
 class AnalyticsService:
     def __init__(self):
         """Initialize the analytics service"""
         self.events = []  # In a real implementation, this would be a database
+        # Per-user sorted event times and versions, for conditional summaries
+        self.user_event_times = {}
+        self.user_versions = {}
+        self._version_counter = itertools.count(1)
+        self.columns = EventColumns()
+        # Held while recording an event and while restoring a snapshot
+        self._lock = threading.Lock()
+        memory_tracker.track('analytics_events', lambda: self.events)
+        memory_tracker.track('analytics_user_event_times', lambda: self.user_event_times)
+        memory_tracker.track('analytics_user_versions', lambda: self.user_versions)
+        memory_tracker.track('analytics_event_columns', self.columns.containers, lambda: self.columns.size)
+        state_snapshots.register('analytics', self.save_state, self.restore_state,
+                                 lambda: (id(self.events), len(self.events)))
         logger.info("Analytics service initialized")
     
+    @metrics.timed('analytics')
     def record_user_activity(self, user_id: str, event_type: str, event_data: Dict = None) -> str:
         """
         Record a user activity event
@@ -30,15 +354,19 @@ class AnalyticsService:
             Event ID
         """
         try:
-            event = {
-                "event_id": f"event_{len(self.events) + 1}",
-                "user_id": user_id,
-                "event_type": event_type,
-                "event_data": event_data or {},
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            self.events.append(event)
+            timestamp = datetime.utcnow()
+            with self._lock:
+                event = {
+                    "event_id": f"event_{len(self.events) + 1}",
+                    "user_id": user_id,
+                    "event_type": event_type,
+                    "event_data": event_data or {},
+                    "timestamp": timestamp.isoformat()
+                }
+                
+                self.events.append(event)
+                bisect.insort(self.user_event_times.setdefault(user_id, []), timestamp)
+                self.user_versions[user_id] = next(self._version_counter)
             logger.info(f"Recorded user activity: {event_type} for user {user_id}")
             return event["event_id"]
             
@@ -46,6 +374,7 @@ class AnalyticsService:
             logger.error(f"Failed to record user activity: {e}")
             raise Exception(f"Failed to record user activity: {e}")
     
+    @metrics.timed('analytics')
     def get_user_summary(self, user_id: str, period: str = "weekly") -> Dict:
         """
         Get user activity summary
@@ -59,15 +388,7 @@ class AnalyticsService:
         """
         try:
             # Calculate time range
-            end_time = datetime.utcnow()
-            if period == "daily":
-                start_time = end_time - timedelta(days=1)
-            elif period == "weekly":
-                start_time = end_time - timedelta(weeks=1)
-            elif period == "monthly":
-                start_time = end_time - timedelta(days=30)
-            else:
-                start_time = end_time - timedelta(weeks=1)  # Default to weekly
+            start_time = self._period_start(period)
             
             # Filter events for user and time period
             user_events = [
@@ -75,42 +396,7 @@ class AnalyticsService:
                 if event["user_id"] == user_id and
                 datetime.fromisoformat(event["timestamp"].replace('Z', '+00:00')) >= start_time
             ]
-            
-            # Calculate summary statistics
-            tasks_completed = len([
-                event for event in user_events
-                if event["event_type"] == "task_completed"
-            ])
-            
-            projects_active = len(set([
-                event["event_data"].get("project_id") for event in user_events
-                if event["event_data"].get("project_id")
-            ]))
-            
-            # Calculate hours worked (simplified)
-            hours_worked = len(user_events) * 0.5  # Assume 30 minutes per activity
-            
-            # Calculate productivity score (simplified)
-            productivity_score = min(10, tasks_completed * 2 + hours_worked * 0.2)
-            
-            # Calculate trends (simplified)
-            completion_rate = tasks_completed / max(1, len(user_events)) if user_events else 0
-            improvement = completion_rate * 0.1  # Simplified improvement calculation
-            
-            summary = {
-                "user_id": user_id,
-                "period": period,
-                "summary": {
-                    "tasksCompleted": tasks_completed,
-                    "projectsActive": projects_active,
-                    "hoursWorked": round(hours_worked, 1),
-                    "productivityScore": round(productivity_score, 1)
-                },
-                "trends": {
-                    "completionRate": round(completion_rate, 2),
-                    "improvement": round(improvement, 2)
-                }
-            }
+            summary = summarize_events(user_id, period, user_events)
             
             logger.info(f"Generated user summary for {user_id} ({period})")
             return summary
@@ -119,6 +405,33 @@ class AnalyticsService:
             logger.error(f"Failed to generate user summary: {e}")
             raise Exception(f"Failed to generate user summary: {e}")
     
+    @staticmethod
+    def _period_start(period: str) -> datetime:
+        end_time = datetime.utcnow()
+        if period == "daily":
+            return end_time - timedelta(days=1)
+        elif period == "monthly":
+            return end_time - timedelta(days=30)
+        return end_time - timedelta(weeks=1)  # Weekly, also the default
+    
+    def get_summary_version(self, user_id: str, period: str = "weekly") -> str:
+        """
+        Get the version of a user's summary
+        
+        Changes when the user records an event or an event leaves the period.
+        
+        Args:
+            user_id: User ID
+            period: Time period (daily, weekly, monthly)
+            
+        Returns:
+            Version string
+        """
+        event_times = self.user_event_times.get(user_id, [])
+        first_in_period = bisect.bisect_left(event_times, self._period_start(period))
+        return f"{self.user_versions.get(user_id, 0)}.{first_in_period}"
+    
+    @metrics.timed('analytics')
     def generate_daily_summary(self, user_id: str) -> Dict:
         """
         Generate daily summary for a user
@@ -131,6 +444,7 @@ class AnalyticsService:
         """
         return self.get_user_summary(user_id, "daily")
     
+    @metrics.timed('analytics')
     def generate_weekly_report(self, user_id: str) -> Dict:
         """
         Generate weekly report for a user
@@ -143,6 +457,209 @@ class AnalyticsService:
         """
         return self.get_user_summary(user_id, "weekly")
     
+    @metrics.timed('analytics')
+    def iter_summaries(self, user_ids: Iterable[str], period: str = "weekly",
+                       map_chunks: Optional[Callable] = None) -> Iterator[List[Dict]]:
+        """
+        Generate the summaries of many users at once, in chunks
+        
+        The events are grouped by user with NumPy, in one pass over the
+        events of the period. For large periods the chunks are summarized
+        through map_chunks, e.g. in worker processes, and each chunk is
+        yielded as soon as it is ready, so it can be sent while the next ones
+        are computed.
+        
+        Args:
+            user_ids: User IDs
+            period: Time period (daily, weekly, monthly)
+            map_chunks: Applies summarize_shard to the chunks, defaults to map in this thread
+            
+        Yields:
+            Summaries of up to SUMMARY_CHUNK_USERS users, in the order of the users
+        """
+        import numpy as np
+        
+        user_ids = list(dict.fromkeys(user_ids))
+        user_codes, users, times, completed, projects = self.columns.update(self.events)
+        
+        # Position of each user code among the requested users, -1 for the others
+        positions = np.full(len(user_codes), -1, np.int64)
+        known = [(user_codes[user_id], position) for position, user_id in enumerate(user_ids) if user_id in user_codes]
+        if known:
+            known = np.array(known, np.int64)
+            positions[known[:, 0]] = known[:, 1]
+        in_period = times >= np.datetime64(self._period_start(period), 'us')
+        users = positions[users[in_period]]
+        requested = users >= 0
+        users, completed, projects = users[requested], completed[in_period][requested], projects[in_period][requested]
+        
+        # Sorted by user, each chunk's events are one slice
+        order = np.argsort(users, kind='stable')
+        users, completed, projects = users[order], completed[order], projects[order]
+        starts = list(range(0, len(user_ids), SUMMARY_CHUNK_USERS))
+        bounds = np.searchsorted(users, starts + [len(user_ids)]).tolist()
+        shards = (
+            (period, user_ids[start:start + SUMMARY_CHUNK_USERS], users[bounds[i]:bounds[i + 1]] - start,
+             completed[bounds[i]:bounds[i + 1]], projects[bounds[i]:bounds[i + 1]])
+            for i, start in enumerate(starts)
+        )
+        
+        if map_chunks is None or len(users) < OFFLOAD_MIN_EVENTS:
+            map_chunks = map
+        yield from map_chunks(summarize_shard, shards)
+        logger.info(f"Generated {len(user_ids)} user summaries ({period}) from {len(users)} events")
+    
+    def generate_summaries(self, user_ids: Iterable[str], period: str = "weekly",
+                           map_chunks: Optional[Callable] = None) -> List[Dict]:
+        """
+        Generate the summaries of many users at once
+        
+        Args:
+            user_ids: User IDs
+            period: Time period (daily, weekly, monthly)
+            map_chunks: Applies summarize_shard to the chunks, defaults to map in this thread
+            
+        Returns:
+            Summaries, in the order of the users
+        """
+        return [summary for chunk in self.iter_summaries(user_ids, period, map_chunks) for summary in chunk]
+    
+    def save_state(self) -> Dict:
+        """
+        Get the events and summary versions as state snapshot sections
+        
+        Returns:
+            Section name -> NumPy array
+        """
+        import numpy as np
+        
+        columns = self.columns.snapshot(self.events)
+        versions = dict(self.user_versions)
+        sections = {"time": columns["time"]}
+        for name in ("user", "type", "data_code"):
+            codes = columns[name]
+            sections[name] = codes.astype(np.min_scalar_type(max(int(codes.max()), 0) if len(codes) else 0))
+        numbers = columns["number"]
+        if len(numbers) and numbers[0] >= 0 and np.array_equal(numbers, np.arange(numbers[0], numbers[0] + len(numbers))):
+            # Recorded by this service: consecutive event numbers
+            sections["first_number"] = numbers[:1]
+        else:
+            sections["number"] = numbers
+        tables = {
+            "users": columns["users"],
+            "types": columns["types"],
+            "data": columns["data"],
+            "other_ids": list(columns["other_ids"].values()),
+            "other_times": list(columns["other_times"].values()),
+            "version_users": list(versions)
+        }
+        for table, strings in tables.items():
+            for name, array in pack_strings(strings).items():
+                sections[f"{table}.{name}"] = array
+        sections["other_id_positions"] = np.array(list(columns["other_ids"]), np.int64)
+        sections["other_time_positions"] = np.array(list(columns["other_times"]), np.int64)
+        sections["versions"] = np.array(list(versions.values()), np.int64)
+        return sections
+    
+    def restore_state(self, sections: Dict) -> int:
+        """
+        Add the events and summary versions of a state snapshot to those recorded
+        
+        Restored events are numbered on from the events already recorded.
+        
+        Args:
+            sections: Section name -> NumPy array, as saved by save_state
+            
+        Returns:
+            Number of events restored
+        """
+        import numpy as np
+        
+        def strings(table: str) -> List[str]:
+            return unpack_strings(sections[f"{table}.offsets"], sections[f"{table}.bytes"])
+        
+        loads = orjson.loads if orjson is not None else json.loads
+        data = strings("data")
+        columns = {
+            "users": strings("users"),
+            "types": strings("types"),
+            "data": data,
+            "data_values": [loads(text) for text in data],
+            "user": sections["user"].astype(np.int64),
+            "type": sections["type"].astype(np.int64),
+            "data_code": sections["data_code"].astype(np.int64),
+            # Copied out of the mapped file
+            "time": np.array(sections["time"]),
+            "other_ids": dict(zip(sections["other_id_positions"].tolist(), strings("other_ids"))),
+            "other_times": dict(zip(sections["other_time_positions"].tolist(), strings("other_times")))
+        }
+        count = len(columns["time"])
+        if "first_number" in sections:
+            first = int(sections["first_number"][0])
+            columns["number"] = np.arange(first, first + count, dtype=np.int64)
+        else:
+            columns["number"] = np.array(sections["number"])
+        
+        # isoformat() leaves out zero microseconds
+        timestamps = [timestamp[:19] if timestamp.endswith('.000000') else timestamp
+                      for timestamp in np.datetime_as_string(columns["time"], unit='us').tolist()]
+        for position, timestamp in columns["other_times"].items():
+            timestamps[position] = timestamp
+        event_ids = [f"event_{number}" for number in columns["number"].tolist()]
+        for position, event_id in columns["other_ids"].items():
+            event_ids[position] = event_id
+        users, types, values = columns["users"], columns["types"], columns["data_values"]
+        # Millions of new objects would otherwise set off a collection every few hundred
+        with paused_gc():
+            events = [
+                {
+                    "event_id": event_id,
+                    "user_id": users[user],
+                    "event_type": types[event_type],
+                    "event_data": dict(values[data_code]),
+                    "timestamp": timestamp
+                }
+                for event_id, user, event_type, data_code, timestamp in zip(
+                    event_ids, columns["user"].tolist(), columns["type"].tolist(), columns["data_code"].tolist(), timestamps
+                )
+            ]
+            
+            # Each user's event times, sorted, from one sort of all events
+            order = np.lexsort((columns["time"], columns["user"]))
+            sorted_users = columns["user"][order]
+            sorted_times = columns["time"][order].astype(object).tolist()
+            bounds = (np.flatnonzero(np.diff(sorted_users)) + 1).tolist()
+            user_times = {
+                users[int(sorted_users[start])]: sorted_times[start:end]
+                for start, end in zip([0] + bounds, bounds + [count]) if start < end
+            }
+        versions = dict(zip(strings("version_users"), sections["versions"].tolist()))
+        
+        with self._lock:
+            # Event IDs number events by position, so events merged after others, recorded
+            # since startup or restored from another worker's snapshot, are renumbered
+            first = len(self.events) + 1
+            if columns["other_ids"] or not (count == 0 or int(columns["number"][0]) == first
+                                            and "first_number" in sections):
+                for number, event in enumerate(events, first):
+                    event["event_id"] = f"event_{number}"
+                columns["number"] = np.arange(first, first + count, dtype=np.int64)
+                columns["other_ids"] = {}
+            self.columns.append(self.events, events, columns)
+            for user_id, times in user_times.items():
+                existing = self.user_event_times.get(user_id)
+                if existing:
+                    existing.extend(times)
+                    existing.sort()
+                else:
+                    self.user_event_times[user_id] = times
+            # Versions go on from the restored ones; users with events on both sides get a new one
+            self._version_counter = itertools.count(max(max(versions.values(), default=0), next(self._version_counter)) + 1)
+            for user_id, version in versions.items():
+                self.user_versions[user_id] = next(self._version_counter) if user_id in self.user_versions else version
+        logger.info(f"Restored {count} analytics events of {len(user_times)} users")
+        return count
+    
     def get_all_events(self) -> List[Dict]:
         """
         Get all recorded events (for admin purposes)
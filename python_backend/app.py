@@ -1,31 +1,49 @@
-from flask import Flask, jsonify, request
+from startup import startup_timer
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
-import firebase_admin
-from firebase_admin import credentials, messaging, auth
-from apscheduler.schedulers.background import BackgroundScheduler
 import os
 from dotenv import load_dotenv
 import json
 import logging
 from functools import wraps
+import hmac
 import datetime
+import threading
+import time
+from firebase_app import verify_id_token, is_invalid_id_token_error
 from notification_service import notification_service
 from task_scheduler import task_scheduler
 from analytics_service import analytics_service
 from user_preferences_service import user_preferences_service
 from scheduled_tasks_service import scheduled_tasks_service
+from dashboard_service import dashboard_service
+from firestore_store import firestore_store
+from bulk_task_service import bulk_task_service, is_workspace_member
+from search_service import search_service
+from event_hub import event_hub
+from json_provider import get_json_provider_class
+from compression import Compressor
+from conditional import make_etag, not_modified_response
+from batch_dispatcher import batch_dispatcher
+from memory_tracker import GROUP_BY, memory_tracker
+from metrics import metrics
+from request_profiler import request_profiler
+from state_snapshots import pack_strings, state_snapshots, unpack_strings
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+startup_timer.checkpoint('imports')
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = get_json_provider_class()(app)
 CORS(app)
+Compressor(app)
 
 # JWT Configuration
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'taskflow-secret-key')
@@ -36,6 +54,13 @@ jwt = JWTManager(app)
 request_counts = {}
 time_window = 60  # 1 minute
 max_requests = 100  # Max requests per time window
+memory_tracker.track('rate_limit_request_counts', lambda: request_counts)
+rate_limit_duration = metrics.histogram(
+    'taskflow_rate_limit_check_seconds', 'Time spent in the rate limiter'
+).labels()
+token_verification_duration = metrics.histogram(
+    'taskflow_token_verification_seconds', 'Firebase ID token verification latency', ('source',)
+)
 
 def rate_limit(limit=100, window=60):
     """
@@ -44,6 +69,7 @@ def rate_limit(limit=100, window=60):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            check_start = time.perf_counter()
             client_ip = request.remote_addr
             current_time = datetime.datetime.now().timestamp()
             
@@ -59,16 +85,50 @@ def rate_limit(limit=100, window=60):
             
             # Check if limit exceeded
             if len(request_counts[client_ip]) >= limit:
+                rate_limit_duration.observe(time.perf_counter() - check_start)
                 logger.warning(f"Rate limit exceeded for IP: {client_ip}")
                 return jsonify({"error": "Rate limit exceeded"}), 429
             
             # Add current request
             request_counts[client_ip].append(current_time)
+            rate_limit_duration.observe(time.perf_counter() - check_start)
             
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+def save_rate_limit_state():
+    """
+    Get the rate limiter's request times as state snapshot sections
+    """
+    import numpy as np
+    
+    windows = {client_ip: list(times) for client_ip, times in list(request_counts.items()) if isinstance(client_ip, str)}
+    sections = {f"clients.{name}": array for name, array in pack_strings(list(windows)).items()}
+    sections["counts"] = np.array([len(times) for times in windows.values()], np.int64)
+    sections["times"] = np.array([t for times in windows.values() for t in times], np.float64)
+    return sections
+
+def restore_rate_limit_state(sections):
+    """
+    Add the request times of a state snapshot still within the time window
+    """
+    clients = unpack_strings(sections["clients.offsets"], sections["clients.bytes"])
+    times = sections["times"].tolist()
+    current_time = datetime.datetime.now().timestamp()
+    start = restored = 0
+    for client_ip, count in zip(clients, sections["counts"].tolist()):
+        recent = [req_time for req_time in times[start:start + count] if current_time - req_time < time_window]
+        start += count
+        if recent:
+            request_counts[client_ip] = sorted(request_counts.get(client_ip, []) + recent)
+            restored += len(recent)
+    return restored
+
+# Request windows survive restarts through the state snapshots
+state_snapshots.register('rate_limit', save_rate_limit_state, restore_rate_limit_state,
+                         lambda: rate_limit_duration.count)
+
 def firebase_auth_required(f):
     """
     Firebase authentication decorator
@@ -81,54 +141,57 @@ def firebase_auth_required(f):
                 return jsonify({"error": "Missing or invalid authorization header"}), 401
             
             token = auth_header.split('Bearer ')[1]
-            decoded_token = auth.verify_id_token(token)
+            with token_verification_duration.labels('firebase_auth_required').time():
+                decoded_token = verify_id_token(token)
             request.user = decoded_token
             return f(*args, **kwargs)
-        except auth.InvalidIdTokenError:
-            return jsonify({"error": "Invalid Firebase ID token"}), 401
         except Exception as e:
+            if is_invalid_id_token_error(e):
+                return jsonify({"error": "Invalid Firebase ID token"}), 401
             logger.error(f"Authentication error: {e}")
             return jsonify({"error": "Authentication failed"}), 401
     return decorated_function
 
-# Initialize Firebase Admin SDK
-# You'll need to download the service account key from Firebase Console
-# and place it in the project directory
-try:
-    if os.path.exists("serviceAccountKey.json"):
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(cred)
-        logger.info("Firebase Admin SDK initialized successfully")
-    else:
-        # Try to initialize with environment variables
-        project_id = os.getenv('FIREBASE_PROJECT_ID')
-        private_key = os.getenv('FIREBASE_PRIVATE_KEY')
-        client_email = os.getenv('FIREBASE_CLIENT_EMAIL')
-        
-        if project_id and private_key and client_email:
-            service_account_info = {
-                "type": "service_account",
-                "project_id": project_id,
-                "private_key": private_key.replace('\\n', '\n'),
-                "client_email": client_email,
-                "client_id": os.getenv('FIREBASE_CLIENT_ID', ''),
-                "auth_uri": os.getenv('FIREBASE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
-                "token_uri": os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
-                "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_X509_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs'),
-                "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_X509_CERT_URL', '')
-            }
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            logger.info("Firebase Admin SDK initialized successfully with environment variables")
+def is_admin_request():
+    """
+    Check the X-Admin-Key header against ADMIN_API_KEY
+    """
+    admin_key = os.getenv('ADMIN_API_KEY')
+    provided_key = request.headers.get('X-Admin-Key', '')
+    return bool(admin_key) and hmac.compare_digest(provided_key.encode(), admin_key.encode())
+
+def admin_required(f):
+    """
+    Admin API key decorator
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"error": "Admin access required"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def publish_event(user_id, event_type, data, coalesce=False):
+    """
+    Publish an event to a user's event streams, logging rather than raising on failure
+    """
+    try:
+        if coalesce:
+            event_hub.publish_coalesced(user_id, event_type, data)
         else:
-            logger.warning("serviceAccountKey.json not found and environment variables not set, using default credentials")
-            firebase_admin.initialize_app()
-except Exception as e:
-    logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
+            event_hub.publish(user_id, event_type, data)
+    except Exception as e:
+        logger.error(f"Failed to publish {event_type} event: {e}")
+
+# Batch dispatcher for /api/batch; sub-requests skip the JWT and rate limit checks the batch has made
+batch_dispatcher.init_app(app, excluded_endpoints={'batch', 'stream_events'},
+                          applied_decorators=(jwt_required(), rate_limit()))
 
-# Initialize scheduler
-scheduler = BackgroundScheduler()
-scheduler.start()
+# Request profiling (X-Profile header for admins, PROFILE_SAMPLE_RATE for continuous sampling)
+request_profiler.init_app(app, authorize=is_admin_request)
+
+# Firebase Admin SDK and the task scheduler are initialized on first use,
+# see firebase_app.get_firebase_app and TaskScheduler.scheduler
 
 @app.route('/')
 def home():
@@ -139,6 +202,10 @@ def home():
 def health_check():
     return jsonify({"status": "healthy", "timestamp": datetime.datetime.utcnow().isoformat()})
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/login', methods=['POST'])
 @rate_limit()
 def login():
@@ -150,7 +217,8 @@ def login():
             return jsonify({"error": "Firebase token is required"}), 400
         
         # Verify Firebase token
-        decoded_token = auth.verify_id_token(firebase_token)
+        with token_verification_duration.labels('login').time():
+            decoded_token = verify_id_token(firebase_token)
         user_id = decoded_token['uid']
         
         # Create access token
@@ -162,9 +230,9 @@ def login():
             "user_id": user_id
         })
         
-    except auth.InvalidIdTokenError:
-        return jsonify({"error": "Invalid Firebase token"}), 401
     except Exception as e:
+        if is_invalid_id_token_error(e):
+            return jsonify({"error": "Invalid Firebase token"}), 401
         logger.error(f"Login error: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -185,10 +253,12 @@ def send_notification():
         
         # Send notification
         response = notification_service.send_notification_to_user(token, title, body)
+        publish_event(get_jwt_identity(), 'notification', {"kind": "device", "status": "sent", "messageId": response})
         return jsonify({"success": True, "message_id": response})
         
     except Exception as e:
         logger.error(f"Send notification error: {e}")
+        publish_event(get_jwt_identity(), 'notification', {"kind": "device", "status": "failed", "error": str(e)})
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/send-topic-notification', methods=['POST'])
@@ -208,10 +278,13 @@ def send_topic_notification():
         
         # Send notification
         response = notification_service.send_notification_to_topic(topic, title, body)
+        publish_event(get_jwt_identity(), 'notification',
+                      {"kind": "topic", "topic": topic, "status": "sent", "messageId": response})
         return jsonify({"success": True, "message_id": response})
         
     except Exception as e:
         logger.error(f"Send topic notification error: {e}")
+        publish_event(get_jwt_identity(), 'notification', {"kind": "topic", "status": "failed", "error": str(e)})
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/notify-task-assignment', methods=['POST'])
@@ -235,16 +308,20 @@ def notify_task_assignment():
         # For now, we'll assume it's in the request
         user_id = data.get('userId', 'default_user')
         if not user_preferences_service.should_send_notification(user_id, "task_assignment"):
+            publish_event(get_jwt_identity(), 'notification', {"kind": "task_assignment", "status": "suppressed"})
             return jsonify({"success": True, "message": "Notification suppressed by user preferences"})
         
         # Send task assignment notification
         response = notification_service.send_task_assignment_notification(
             assignee_token, task_title, project_name, due_date
         )
+        publish_event(get_jwt_identity(), 'notification',
+                      {"kind": "task_assignment", "status": "sent", "messageId": response})
         return jsonify({"success": True, "message_id": response})
         
     except Exception as e:
         logger.error(f"Notify task assignment error: {e}")
+        publish_event(get_jwt_identity(), 'notification', {"kind": "task_assignment", "status": "failed", "error": str(e)})
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/send-bulk-notifications', methods=['POST'])
@@ -264,10 +341,15 @@ def send_bulk_notifications():
         
         # Send bulk notifications
         response = notification_service.send_bulk_notifications(tokens, title, body)
+        publish_event(get_jwt_identity(), 'notification', {
+            "kind": "bulk", "status": "sent",
+            "successCount": response["success_count"], "failureCount": response["failure_count"]
+        })
         return jsonify({"success": True, "result": response})
         
     except Exception as e:
         logger.error(f"Send bulk notifications error: {e}")
+        publish_event(get_jwt_identity(), 'notification', {"kind": "bulk", "status": "failed", "error": str(e)})
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/analytics/event', methods=['POST'])
@@ -285,6 +367,8 @@ def record_analytics_event():
         
         # Record the event
         event_id = analytics_service.record_user_activity(user_id, event_type, event_data)
+        # Clients refetch the summary; bursts of activity make one event
+        publish_event(user_id, 'summary', {"reason": "activity"}, coalesce=True)
         return jsonify({"success": True, "eventId": event_id})
         
     except Exception as e:
@@ -302,22 +386,112 @@ def get_user_summary():
         if not user_id:
             return jsonify({"error": "userId is required"}), 400
         
+        # Answer unchanged polls without recomputing the summary
+        etag = make_etag(analytics_service.get_summary_version(user_id, period))
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
         # Get user summary
         summary = analytics_service.get_user_summary(user_id, period)
-        return jsonify(summary)
+        response = jsonify(summary)
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"Get user summary error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+@rate_limit()
+def get_dashboard():
+    try:
+        # The whole dashboard in one round trip, from counters kept by the Firestore listeners
+        dashboard, version = dashboard_service.get_dashboard(get_jwt_identity())
+        etag = make_etag(version)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        response = jsonify(dashboard)
+        response.set_etag(etag)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Get dashboard error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/workspaces/<workspace_id>/tasks/bulk', methods=['POST'])
+@jwt_required()
+@rate_limit()
+def bulk_update_tasks(workspace_id):
+    try:
+        data = request.get_json()
+        operations = data.get('operations')
+        
+        error = bulk_task_service.validate(operations)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        workspace = firestore_store.get_workspace(workspace_id)
+        if workspace is None:
+            return jsonify({"error": "Workspace not found"}), 404
+        user_id = get_jwt_identity()
+        if not is_workspace_member(workspace, user_id):
+            return jsonify({"error": "Not a member of this workspace"}), 403
+        
+        # Batched writes committed concurrently, one notification per assignee
+        return jsonify(bulk_task_service.apply(workspace, operations, user_id))
+        
+    except Exception as e:
+        logger.error(f"Bulk update tasks error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/workspaces/<workspace_id>/tasks/search', methods=['GET'])
+@jwt_required()
+@rate_limit()
+def search_tasks(workspace_id):
+    try:
+        query = request.args.get('q', '')
+        filters = {field: request.args[field] for field in ('projectId', 'status', 'assigneeId') if field in request.args}
+        if not query.strip() and 'assigneeId' not in filters:
+            return jsonify({"error": "q or assigneeId is required"}), 400
+        
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        
+        workspace = firestore_store.get_workspace(workspace_id)
+        if workspace is None:
+            return jsonify({"error": "Workspace not found"}), 404
+        if not is_workspace_member(workspace, get_jwt_identity()):
+            return jsonify({"error": "Not a member of this workspace"}), 403
+        
+        # Served from the workspace's in-memory index
+        prefix = request.args.get('prefix', 'true').lower() != 'false'
+        return jsonify(search_service.search(workspace_id, query, limit, prefix, filters))
+        
+    except Exception as e:
+        logger.error(f"Search tasks error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/users/<user_id>/preferences', methods=['GET'])
 @jwt_required()
 @rate_limit()
 def get_user_preferences(user_id):
     try:
+        # Answer unchanged polls without reading the preferences
+        etag = make_etag(user_preferences_service.get_version(user_id), epoch=user_preferences_service.store_id)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
         # Get user preferences
         preferences = user_preferences_service.get_user_preferences(user_id)
-        return jsonify({"userId": user_id, "preferences": preferences})
+        response = jsonify({"userId": user_id, "preferences": preferences})
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"Get user preferences error: {e}")
@@ -331,10 +505,18 @@ def update_user_preferences(user_id):
         data = request.get_json()
         preferences = data.get('preferences', {})
         
+        error = user_preferences_service.validate(preferences)
+        if error:
+            return jsonify({"error": error}), 400
+        
         # Update user preferences
         success = user_preferences_service.update_user_preferences(user_id, preferences)
         
         if success:
+            publish_event(user_id, 'preferences', {
+                "version": user_preferences_service.get_version(user_id),
+                "preferences": dict(user_preferences_service.get_user_preferences(user_id))
+            })
             return jsonify({"success": True, "message": "Preferences updated successfully"})
         else:
             return jsonify({"success": False, "message": "Failed to update preferences"}), 500
@@ -343,6 +525,20 @@ def update_user_preferences(user_id):
         logger.error(f"Update user preferences error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/preferences/changes', methods=['GET'])
+@admin_required
+def get_preference_changes():
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 1000, type=int), 10000)
+        
+        # Change feed for workers that cache preferences
+        return jsonify(user_preferences_service.get_changes_since(since, limit))
+        
+    except Exception as e:
+        logger.error(f"Get preference changes error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/scheduled-tasks', methods=['POST'])
 @jwt_required()
 @rate_limit()
@@ -350,8 +546,10 @@ def create_scheduled_task():
     try:
         data = request.get_json()
         
-        # Create scheduled task
-        result = scheduled_tasks_service.create_scheduled_task(data)
+        # Create scheduled task, owned by the caller
+        result = scheduled_tasks_service.create_scheduled_task(data, owner_id=get_jwt_identity())
+        publish_event(get_jwt_identity(), 'scheduled_task',
+                      {"taskId": result["taskId"], "change": "created", "nextRun": result["nextRun"]})
         return jsonify(result)
         
     except Exception as e:
@@ -363,9 +561,39 @@ def create_scheduled_task():
 @rate_limit()
 def get_scheduled_tasks():
     try:
-        # Get all scheduled tasks
-        tasks = scheduled_tasks_service.get_scheduled_tasks()
-        return jsonify({"tasks": tasks})
+        # Answer unchanged polls without serializing the tasks
+        etag = make_etag(scheduled_tasks_service.get_version(), epoch=scheduled_tasks_service.store_id)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        
+        if request.args.get('order') == 'nextRun':
+            # The tasks that run next, soonest first
+            response = jsonify({"tasks": scheduled_tasks_service.get_next_scheduled_tasks(limit)})
+            response.set_etag(etag)
+            return response
+        
+        filters = {field: request.args[field] for field in ('taskType', 'ownerId') if field in request.args}
+        if 'enabled' in request.args:
+            enabled = request.args['enabled'].lower()
+            if enabled not in ('true', 'false'):
+                return jsonify({"error": "enabled must be true or false"}), 400
+            filters['enabled'] = enabled == 'true'
+        
+        try:
+            tasks, next_cursor = scheduled_tasks_service.list_scheduled_tasks(
+                filters, request.args.get('cursor'), limit
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        response = jsonify({"tasks": tasks, "nextCursor": next_cursor})
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"Get scheduled tasks error: {e}")
@@ -377,9 +605,11 @@ def get_scheduled_tasks():
 def delete_scheduled_task(task_id):
     try:
         # Delete scheduled task
+        owner_id = scheduled_tasks_service.scheduled_tasks.get(task_id, {}).get('ownerId') or get_jwt_identity()
         success = scheduled_tasks_service.delete_scheduled_task(task_id)
         
         if success:
+            publish_event(owner_id, 'scheduled_task', {"taskId": task_id, "change": "deleted"})
             return jsonify({"success": True, "message": "Task deleted successfully"})
         else:
             return jsonify({"success": False, "message": "Failed to delete task"}), 500
@@ -388,9 +618,141 @@ def delete_scheduled_task(task_id):
         logger.error(f"Delete scheduled task error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/events', methods=['GET'])
+@jwt_required()
+@rate_limit()
+def stream_events():
+    try:
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId'))
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return jsonify({"error": "Last-Event-ID must be an event ID"}), 400
+        
+        subscription = event_hub.subscribe(get_jwt_identity(), last_event_id)
+        if subscription is None:
+            return jsonify({"error": "Too many open event streams"}), 503, {"Retry-After": "10"}
+        
+        # One long-lived response carrying every change event of the caller
+        return Response(event_hub.stream(subscription), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+    except Exception as e:
+        logger.error(f"Stream events error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/batch', methods=['POST'])
+@jwt_required()
+@rate_limit()
+def batch():
+    try:
+        data = request.get_json()
+        sub_requests = data.get('requests')
+        
+        error = batch_dispatcher.validate(sub_requests)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        # Dispatch sub-requests, authenticated and rate limited once for the whole batch
+        responses = batch_dispatcher.dispatch(sub_requests, parallel=bool(data.get('parallel', False)))
+        return jsonify({"responses": responses})
+        
+    except Exception as e:
+        logger.error(f"Batch error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/startup', methods=['GET'])
+@admin_required
+def get_startup_report():
+    return jsonify(startup_timer.report())
+
+@app.route('/api/admin/scheduler', methods=['GET'])
+@admin_required
+def get_scheduler_report():
+    return jsonify(task_scheduler.report())
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    try:
+        return jsonify({"profiles": request_profiler.list_profiles()})
+        
+    except Exception as e:
+        logger.error(f"List profiles error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    try:
+        path = request_profiler.get_profile_path(profile_id)
+        if path is None:
+            return jsonify({"error": "Profile not found"}), 404
+        
+        return send_file(path, as_attachment=True, download_name=profile_id)
+        
+    except Exception as e:
+        logger.error(f"Get profile error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/memory', methods=['GET'])
+@admin_required
+def get_memory_report():
+    try:
+        return jsonify(memory_tracker.report())
+        
+    except Exception as e:
+        logger.error(f"Memory report error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/memory/snapshots', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def memory_snapshots():
+    try:
+        if request.method == 'GET':
+            return jsonify({"pid": os.getpid(), "snapshots": memory_tracker.list_snapshots()})
+        if request.method == 'DELETE':
+            memory_tracker.stop()
+            return jsonify({"success": True, "message": "Stopped tracing memory allocations"})
+        
+        # Frames per allocation only apply when this snapshot starts tracing
+        frames = request.args.get('frames', 1, type=int)
+        return jsonify(memory_tracker.take_snapshot(frames))
+        
+    except Exception as e:
+        logger.error(f"Memory snapshot error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/memory/snapshots/<int:snapshot_id>/diff', methods=['GET'])
+@admin_required
+def diff_memory_snapshots(snapshot_id):
+    try:
+        group_by = request.args.get('groupBy', 'module')
+        if group_by not in GROUP_BY:
+            return jsonify({"error": f"groupBy must be one of {', '.join(GROUP_BY)}"}), 400
+        
+        diff = memory_tracker.diff(
+            snapshot_id,
+            base_id=request.args.get('base', type=int),
+            group_by=group_by,
+            limit=min(request.args.get('limit', 20, type=int), 500)
+        )
+        if diff is None:
+            # Snapshots are kept per worker
+            return jsonify({"error": "Snapshot not found in this worker", "pid": os.getpid()}), 404
+        return jsonify(diff)
+        
+    except Exception as e:
+        logger.error(f"Memory snapshot diff error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # Example scheduled job
 def scheduled_task_reminder():
     """Send reminders for overdue tasks"""
+    # Scheduled in every worker, sent by one
+    if not task_scheduler.is_leader:
+        return
     logger.info("Checking for overdue tasks...")
     # This would contain logic to query Firebase for overdue tasks
     # and send notifications to users
@@ -406,8 +768,71 @@ def scheduled_task_reminder():
     except Exception as e:
         logger.error(f"Error sending scheduled notification: {e}")
 
-# Schedule the task reminder to run every 30 minutes
-task_scheduler.schedule_overdue_task_check(scheduled_task_reminder, 30)
+def deliver_due_summaries():
+    """Send the daily and weekly summaries due this hour"""
+    # Scheduled in every worker, sent by one
+    if not task_scheduler.is_leader:
+        return
+    due = user_preferences_service.get_due_summary_recipients()
+    logger.info(f"Delivering {len(due['daily'])} daily and {len(due['weekly'])} weekly summaries")
+    
+    for frequency, user_ids in due.items():
+        # Summaries computed in one pass over the events, and sent chunk by chunk as they are ready
+        for summaries in analytics_service.iter_summaries(user_ids, frequency, task_scheduler.offload_map):
+            try:
+                notification_service.send_summary_notifications(summaries, frequency)
+            except Exception as e:
+                logger.error(f"Error sending {len(summaries)} {frequency} summaries: {e}")
+                continue
+            try:
+                event_hub.publish_many(
+                    (summary['user_id'], 'summary', {"reason": "delivered", "frequency": frequency})
+                    for summary in summaries
+                )
+            except Exception as e:
+                logger.error(f"Failed to publish {len(summaries)} {frequency} summary events: {e}")
+
+background_services_started = False
+background_services_lock = threading.Lock()
+
+def start_background_services():
+    """
+    Register the recurring jobs, which starts the task scheduler (runs once)
+    """
+    global background_services_started
+    with background_services_lock:
+        if background_services_started:
+            return
+        background_services_started = True
+    
+    try:
+        # Schedule the task reminder to run every 30 minutes
+        task_scheduler.schedule_overdue_task_check(scheduled_task_reminder, 30)
+        # Deliver summaries hourly to the users whose local delivery hour has come
+        task_scheduler.schedule_summary_delivery(deliver_due_summaries)
+        # Rebuild the jobs of the persisted scheduled tasks
+        scheduled_tasks_service.restore()
+    except Exception as e:
+        logger.error(f"Failed to start background services: {e}")
+
+@app.before_request
+def start_background_services_on_first_request():
+    if not state_snapshots.started:
+        # Restore this worker's in-memory state from its last snapshot before serving
+        # anything that adds to it, then keep snapshotting it
+        try:
+            state_snapshots.start()
+        except Exception as e:
+            logger.error(f"Failed to start state snapshots: {e}")
+    # Started off the request thread so the first response does not wait for APScheduler
+    if not background_services_started:
+        threading.Thread(target=start_background_services, name='background-services', daemon=True).start()
+
+@app.after_request
+def record_first_response(response):
+    if startup_timer.first_response_seconds is None:
+        startup_timer.mark_first_response()
+    return response
 
 # Error handlers
 @app.errorhandler(404)
@@ -419,5 +844,10 @@ def internal_error(error):
     logger.error(f"Internal server error: {error}")
     return jsonify({"error": "Internal server error"}), 500
 
+# Instrument every route registered above
+metrics.init_app(app)
+startup_timer.checkpoint('app_setup')
+
 if __name__ == '__main__':
+    start_background_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
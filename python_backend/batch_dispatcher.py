@@ -0,0 +1,191 @@
+"""
+Batch Request Dispatcher for TaskFlow Python Backend
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from flask import g, request
+from werkzeug.exceptions import HTTPException
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+FORWARDED_HEADERS = ('Authorization', 'Accept-Language', 'If-None-Match')
+DROPPED_RESPONSE_HEADERS = {'Content-Length', 'Content-Type', 'Vary', 'Access-Control-Allow-Origin'}
+
+
+class BatchDispatcher:
+    def __init__(self, app=None):
+        """Initialize the batch dispatcher"""
+        self.app = app
+        self.max_requests = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+        self.max_workers = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+        self._executor = None
+        self.excluded_endpoints = set()
+        # Code objects of the wrappers the batch request has already run; sub-requests record their own latency
+        self._applied_wrappers = {metrics.instrument_view('batch', lambda: None).__code__}
+        self._views = {}  # endpoint -> view function with those wrappers removed
+
+    def init_app(self, app, excluded_endpoints=(), applied_decorators=()):
+        """
+        Bind the dispatcher to a Flask app
+
+        Args:
+            app: Flask application
+            excluded_endpoints: Endpoints that cannot be called inside a batch
+            applied_decorators: Decorators the batch endpoint applies itself, e.g. jwt_required();
+                sub-requests skip their layers and run every other decorator of the view
+        """
+        self.app = app
+        self.excluded_endpoints.update(excluded_endpoints)
+        for decorator in applied_decorators:
+            # Every wrapper a decorator returns shares its code object
+            self._applied_wrappers.add(decorator(lambda: None).__code__)
+        self._views.clear()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch')
+        return self._executor
+
+    def validate(self, sub_requests: Any) -> Optional[str]:
+        """
+        Validate a list of sub-requests
+
+        Args:
+            sub_requests: Sub-requests from the batch body
+
+        Returns:
+            Error message, or None if the batch is valid
+        """
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return "requests must be a non-empty list"
+        if len(sub_requests) > self.max_requests:
+            return f"A batch may contain at most {self.max_requests} requests"
+        for index, sub_request in enumerate(sub_requests):
+            if not isinstance(sub_request, dict) or not isinstance(sub_request.get('path'), str):
+                return f"Request {index} must be an object with a path"
+            if not sub_request['path'].startswith('/'):
+                return f"Request {index} path must start with /"
+            if sub_request.get('method', 'GET').upper() not in ALLOWED_METHODS:
+                return f"Request {index} has an unsupported method"
+        return None
+
+    def view_function(self, endpoint: str):
+        """
+        The view function a sub-request calls
+
+        Only the outer layers added by applied_decorators are removed; other
+        decorators, such as admin checks, still run for the sub-request.
+
+        Args:
+            endpoint: Endpoint name
+
+        Returns:
+            The view function
+        """
+        view = self._views.get(endpoint)
+        if view is None:
+            view = self.app.view_functions[endpoint]
+            while getattr(view, '__code__', None) in self._applied_wrappers and hasattr(view, '__wrapped__'):
+                view = view.__wrapped__
+            self._views[endpoint] = view
+        return view
+
+    def dispatch(self, sub_requests: List[Dict[str, Any]], parallel: bool = False) -> List[Dict[str, Any]]:
+        """
+        Dispatch sub-requests through the app's URL map
+
+        Must be called inside the batch request. The batch itself has already
+        been authenticated and rate limited, so sub-requests skip those
+        decorators of the view functions and share the batch's JWT identity.
+
+        Args:
+            sub_requests: Validated sub-requests
+            parallel: Run the sub-requests concurrently
+
+        Returns:
+            One result per sub-request, in request order
+        """
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        remote_addr = request.remote_addr
+        shared_state = {name: value for name, value in g.__dict__.items() if name.startswith('_jwt_extended')}
+
+        def run(sub_request):
+            return self._dispatch_one(sub_request, headers, remote_addr, shared_state)
+
+        if parallel and len(sub_requests) > 1:
+            return list(self.executor.map(run, sub_requests))
+        return [run(sub_request) for sub_request in sub_requests]
+
+    def _dispatch_one(self, sub_request: Dict[str, Any], headers: Dict[str, str],
+                      remote_addr: str, shared_state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a single sub-request in its own request context
+
+        Args:
+            sub_request: Sub-request with method, path, query, body and headers
+            headers: Headers inherited from the batch request
+            remote_addr: Client address of the batch request
+            shared_state: JWT state of the batch request
+
+        Returns:
+            Sub-request result
+        """
+        start = time.perf_counter()
+        method = sub_request.get('method', 'GET').upper()
+        request_headers = dict(headers)
+        request_headers.update(sub_request.get('headers') or {})
+
+        with self.app.app_context():
+            g.__dict__.update(shared_state)
+            with self.app.test_request_context(
+                sub_request['path'],
+                method=method,
+                query_string=sub_request.get('query'),
+                json=sub_request.get('body'),
+                headers=request_headers,
+                environ_base={'REMOTE_ADDR': remote_addr}
+            ):
+                endpoint = None
+                try:
+                    if request.routing_exception is not None:
+                        raise request.routing_exception
+                    endpoint = request.url_rule.endpoint
+                    if endpoint in self.excluded_endpoints:
+                        response = self.app.make_response(
+                            ({"error": f"{sub_request['path']} cannot be called in a batch"}, 400)
+                        )
+                    else:
+                        view = self.view_function(endpoint)
+                        response = self.app.make_response(view(**request.view_args))
+                except HTTPException as e:
+                    response = self.app.make_response(self.app.handle_user_exception(e))
+                except Exception as e:
+                    logger.error(f"Batch sub-request {method} {sub_request['path']} failed: {e}")
+                    response = self.app.make_response(({"error": str(e)}, 500))
+                metrics.observe_request(endpoint, method, response.status_code, time.perf_counter() - start)
+
+                result = {"id": sub_request['id']} if 'id' in sub_request else {}
+                result.update({
+                    "status": response.status_code,
+                    "headers": {
+                        name: value for name, value in response.headers.items()
+                        if name not in DROPPED_RESPONSE_HEADERS
+                    },
+                    "body": response.get_json(silent=True)
+                })
+                if result["body"] is None and response.status_code != 304:
+                    result["body"] = response.get_data(as_text=True)
+                return result
+
+
+# Global instance
+batch_dispatcher = BatchDispatcher()
@@ -0,0 +1,960 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for TaskFlow Python Backend
+
+Drives the Flask app in-process or through a local gunicorn with Firebase Auth
+and FCM faked, micro-benchmarks the services, and saves the results as JSON so
+runs can be compared.
+"""
+
+import argparse
+import datetime
+import gzip
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider, orjson
+from metrics import Histogram, MetricsRegistry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BENCHMARK_USER = "benchmark_user"
+ADMIN_KEY = "benchmark-admin-key"
+CLIENT_HEADER = "X-Benchmark-Client"
+
+
+# Fakes
+
+def fake_verify_id_token(token):
+    """Accept 'fake:<uid>' tokens instead of calling Firebase Auth"""
+    if not token.startswith("fake:"):
+        raise ValueError("Not a benchmark token")
+    return {"uid": token[len("fake:"):]}
+
+
+class FakeMessaging:
+    """Stand-in for firebase_admin.messaging that accepts every message"""
+    Message = SimpleNamespace
+    MulticastMessage = SimpleNamespace
+    Notification = SimpleNamespace
+    _message_ids = itertools.count(1)
+
+    @classmethod
+    def send(cls, message):
+        return f"projects/taskflow-benchmark/messages/{next(cls._message_ids)}"
+
+    @staticmethod
+    def send_multicast(message):
+        return SimpleNamespace(success_count=len(message.tokens), failure_count=0)
+
+    @staticmethod
+    def send_each(messages):
+        return SimpleNamespace(success_count=len(messages), failure_count=0)
+
+
+class FakeFirestore:
+    """In-memory stand-in for a Firestore client: documents by path, with synchronous on_snapshot listeners"""
+
+    def __init__(self):
+        self.documents = {}  # path -> data
+        self.collections = {}  # collection path -> document paths
+        self.listeners = {}  # collection or document path -> callbacks
+        self.reads = 0
+        self.lock = threading.Lock()
+
+    def document(self, path):
+        return FakeFirestoreReference(self, path)
+
+    collection = document
+
+    def get_all(self, references):
+        return [reference.get() for reference in references]
+
+    def set(self, path, data):
+        """Write a document and notify the listeners of it and of its collection"""
+        self.documents[path] = data
+        self.collections.setdefault(path.rsplit("/", 1)[0], {})[path] = None
+        self._notify(path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def delete(self, path):
+        self.documents.pop(path, None)
+        self.collections.get(path.rsplit("/", 1)[0], {}).pop(path, None)
+        self._notify(path)
+
+    def _notify(self, path):
+        snapshot = self.document(path).get()
+        change = SimpleNamespace(document=snapshot, type=SimpleNamespace(name="MODIFIED" if snapshot.exists else "REMOVED"))
+        for watched in (path, path.rsplit("/", 1)[0]):
+            for callback in list(self.listeners.get(watched, ())):
+                callback([], [change], None)
+
+
+class FakeWriteBatch:
+    """Batched write applied on commit; fails as a whole if it updates a missing document"""
+
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append(("set", reference.path, data))
+
+    def update(self, reference, data):
+        self.writes.append(("update", reference.path, data))
+
+    def delete(self, reference):
+        self.writes.append(("delete", reference.path, None))
+
+    def commit(self):
+        documents = self.client.documents
+        with self.client.lock:
+            for kind, path, _ in self.writes:
+                if kind == "update" and path not in documents:
+                    raise ValueError(f"404 No document to update: {path}")
+            for kind, path, data in self.writes:
+                if kind == "delete":
+                    self.client.delete(path)
+                else:
+                    self.client.set(path, {**documents[path], **data} if kind == "update" else dict(data))
+
+
+class FakeFirestoreReference:
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def get(self):
+        self.client.reads += 1
+        data = self.client.documents.get(self.path)
+        return SimpleNamespace(id=self.id, reference=self, exists=data is not None, to_dict=lambda: dict(data))
+
+    def stream(self):
+        return [self.client.document(path).get() for path in list(self.client.collections.get(self.path, ()))]
+
+    def where(self, filter):
+        """Query with a FieldFilter using == or array_contains"""
+        def matches(snapshot):
+            value = snapshot.to_dict().get(filter.field_path)
+            return value == filter.value if filter.op_string == "==" else filter.value in (value or ())
+
+        return SimpleNamespace(stream=lambda: [snapshot for snapshot in self.stream() if matches(snapshot)])
+
+    def on_snapshot(self, callback):
+        callbacks = self.client.listeners.setdefault(self.path, [])
+        callbacks.append(callback)
+        return SimpleNamespace(unsubscribe=lambda: callbacks.remove(callback))
+
+
+def seed_firestore(client, workspaces=3, projects=5, tasks=40):
+    """Give the benchmark user workspaces of projects of tasks, some assigned to them and some overdue"""
+    from firestore_store import project_path, task_path, workspace_path
+
+    statuses = ("todo", "in_progress", "done")
+    for w in range(workspaces):
+        workspace_id = f"workspace_{w}"
+        client.set(workspace_path(workspace_id), {"name": f"Workspace {w}", "ownerId": BENCHMARK_USER,
+                                                  "members": [BENCHMARK_USER, "user_1"]})
+        for p in range(projects):
+            project_id = f"project_{p}"
+            client.set(project_path(workspace_id, project_id), {"name": f"Project {p}", "workspaceId": workspace_id})
+            for member in (BENCHMARK_USER, "user_1"):
+                client.set(f"{project_path(workspace_id, project_id)}/members/{member}",
+                           {"userId": member, "role": "member", "status": "accepted"})
+            for t in range(tasks):
+                client.set(task_path(workspace_id, project_id, f"task_{t}"), {
+                    "title": f"Task {t}", "status": statuses[t % 3], "priority": "medium",
+                    "assigneeId": BENCHMARK_USER if t % 2 else "user_1",
+                    "dueDate": f"{2020 + t % 10}-01-01T00:00:00.000"
+                })
+    return client
+
+
+class BenchmarkClientMiddleware:
+    """Use the X-Benchmark-Client header as the client address, so the rate limiter sees many clients"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        client = environ.get("HTTP_" + CLIENT_HEADER.upper().replace("-", "_"))
+        if client:
+            environ["REMOTE_ADDR"] = client
+        return self.wsgi_app(environ, start_response)
+
+
+def install_fakes():
+    """
+    Import the app with Firebase Auth and FCM replaced by local fakes
+
+    Returns:
+        The app module
+    """
+    os.environ.setdefault("ADMIN_API_KEY", ADMIN_KEY)
+    # A throwaway database, shared with gunicorn workers through the environment
+    os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="taskflow-benchmark-"), "taskflow.db"))
+    import app as backend
+    import firebase_app
+    import firestore_store
+    import notification_service
+
+    firebase_app.verify_id_token = fake_verify_id_token
+    backend.verify_id_token = fake_verify_id_token
+    notification_service._messaging = lambda: FakeMessaging
+    notification_service.notification_service._initialized = True
+    firestore_store.firestore_store._client = seed_firestore(FakeFirestore())
+    return backend
+
+
+def create_benchmark_app():
+    """App factory for gunicorn: gunicorn 'benchmark:create_benchmark_app()'"""
+    logging.disable(logging.INFO)
+    backend = install_fakes()
+    backend.app.wsgi_app = BenchmarkClientMiddleware(backend.app.wsgi_app)
+    return backend.app
+
+
+# Helpers
+
+def time_call(func, iterations):
+    """Return the mean time per call in microseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def client_address(n):
+    """Distinct client address for request n"""
+    return f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def parse_counts(value):
+    """Parse '1,8' or '1e4,1e5' into a list of ints"""
+    return [int(float(part)) for part in value.split(",") if part]
+
+
+def make_scheduled_tasks_payload(count):
+    """Build a payload shaped like GET /api/scheduled-tasks"""
+    return {"tasks": [
+        {
+            "taskId": f"scheduled_task_{i}",
+            "taskType": "daily_summary" if i % 2 else "weekly_report",
+            "schedule": "0 9 * * *",
+            "parameters": {"userId": f"user_{i}", "timezone": "America/New_York", "hour": 9, "minute": 0},
+            "description": "Send daily summary email",
+            "enabled": True,
+            "createdAt": "2023-07-15T10:30:00",
+            "job_id": f"scheduled_task_{i}"
+        }
+        for i in range(count)
+    ]}
+
+
+def make_user_summary_payload():
+    """Build a payload shaped like GET /api/analytics/user-summary"""
+    return {
+        "user_id": "user_123",
+        "period": "weekly",
+        "summary": {"tasksCompleted": 15, "projectsActive": 3, "hoursWorked": 25.5, "productivityScore": 8.5},
+        "trends": {"completionRate": 0.85, "improvement": 0.12}
+    }
+
+
+# Endpoints
+
+def endpoint_cases():
+    """
+    One request per route: (name, method, path, json body[, headers])
+
+    Paths and bodies may be callables of the request number.
+    """
+    unchanged = {"If-None-Match": "*"}
+    user = BENCHMARK_USER
+    return [
+        ("home", "GET", "/", None),
+        ("health", "GET", "/api/health", None),
+        ("metrics", "GET", "/metrics", None),
+        ("login", "POST", "/api/login", {"firebase_token": f"fake:{user}"}),
+        ("send-notification", "POST", "/api/send-notification",
+         {"token": "device-token", "title": "Benchmark", "body": "Hello"}),
+        ("send-topic-notification", "POST", "/api/send-topic-notification",
+         {"topic": "benchmark", "title": "Benchmark", "body": "Hello"}),
+        ("notify-task-assignment", "POST", "/api/notify-task-assignment",
+         {"assigneeToken": "device-token", "taskTitle": "Write report", "projectName": "TaskFlow", "userId": user}),
+        ("send-bulk-notifications", "POST", "/api/send-bulk-notifications",
+         {"tokens": [f"device-token-{i}" for i in range(100)], "title": "Benchmark", "body": "Hello"}),
+        ("analytics-event", "POST", "/api/analytics/event",
+         lambda n: {"userId": f"user_{n % 100}", "eventType": "task_completed", "eventData": {"project_id": f"project_{n % 7}"}}),
+        ("user-summary", "GET", lambda n: f"/api/analytics/user-summary?userId=user_{n % 100}", None),
+        ("user-summary-unchanged", "GET", lambda n: f"/api/analytics/user-summary?userId=user_{n % 100}", None, unchanged),
+        ("dashboard", "GET", "/api/dashboard", None),
+        ("search-tasks", "GET", lambda n: f"/api/workspaces/workspace_{n % 3}/tasks/search?q=task+{n % 40}", None),
+        ("bulk-tasks", "POST", "/api/workspaces/workspace_0/tasks/bulk",
+         lambda n: {"operations": [{"type": "status", "projectId": "project_0", "taskId": f"task_{t}",
+                                    "status": ("todo", "in_progress", "done")[(n + t) % 3]} for t in range(40)]}),
+        ("get-preferences", "GET", lambda n: f"/api/users/user_{n % 100}/preferences", None),
+        ("get-preferences-unchanged", "GET", lambda n: f"/api/users/user_{n % 100}/preferences", None, unchanged),
+        ("update-preferences", "PUT", lambda n: f"/api/users/user_{n % 100}/preferences",
+         {"preferences": {"dailySummary": False}}),
+        ("create-scheduled-task", "POST", "/api/scheduled-tasks",
+         {"taskType": "custom", "schedule": "0 9 * * *", "parameters": {"timezone": "UTC"}}),
+        ("get-scheduled-tasks", "GET", "/api/scheduled-tasks", None),
+        ("get-scheduled-tasks-unchanged", "GET", "/api/scheduled-tasks", None, unchanged),
+        ("get-scheduled-tasks-next", "GET", "/api/scheduled-tasks?order=nextRun&limit=50", None),
+        ("batch", "POST", "/api/batch", {"requests": [
+            {"method": "GET", "path": f"/api/users/{user}/preferences"},
+            {"method": "GET", "path": f"/api/analytics/user-summary?userId={user}"},
+            {"method": "GET", "path": "/api/health"}
+        ]}),
+        ("admin-startup", "GET", "/api/admin/startup", None),
+        ("admin-profiles", "GET", "/api/admin/profiles", None),
+        # Path set to the tasks recreated before each run
+        ("delete-scheduled-task", "DELETE", None, None),
+    ]
+
+
+class InProcessTarget:
+    """Send requests through the Flask test client"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.local = threading.local()
+
+    def request(self, method, path, body, headers, n):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.backend.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers,
+                               environ_base={"REMOTE_ADDR": client_address(n)})
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """Send requests over HTTP to a local gunicorn running the faked app"""
+
+    def __init__(self, workers, threads):
+        import requests
+        self.requests = requests
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.local = threading.local()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--threads", str(threads),
+             "--bind", f"127.0.0.1:{self.port}", "--log-level", "warning", "benchmark:create_benchmark_app()"],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        self._wait_until_ready()
+
+    def _wait_until_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            try:
+                self.requests.get(f"{self.base_url}/", timeout=1)
+                return
+            except self.requests.ConnectionError:
+                time.sleep(0.1)
+        self.close()
+        raise RuntimeError("gunicorn did not start in time")
+
+    def request(self, method, path, body, headers, n):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.request(method, self.base_url + path, json=body,
+                                    headers={**headers, CLIENT_HEADER: client_address(n)})
+        return response.status_code
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_endpoint(target, case, headers, requests_count, concurrency, offset):
+    """Run one endpoint at one concurrency level and summarize the latencies"""
+    name, method, path, body, *extra_headers = case
+    if extra_headers:
+        headers = {**headers, **extra_headers[0]}
+    latencies = []
+    statuses = {}
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def worker():
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            with lock:
+                n = next(counter)
+            if n >= requests_count:
+                break
+            request_path = path(n) if callable(path) else path
+            request_body = body(n) if callable(body) else body
+            start = time.perf_counter()
+            status = target.request(method, request_path, request_body, headers, offset + n)
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "throughputRps": round(requests_count / elapsed, 1),
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def benchmark_endpoints(args):
+    """Throughput and p50/p99 latency for every endpoint at each concurrency level"""
+    mode = f"gunicorn, {args.workers} workers x {args.threads} threads" if args.gunicorn else "in-process"
+    print(f"Endpoints ({mode})")
+    backend = install_fakes()
+    from flask_jwt_extended import create_access_token
+
+    with backend.app.app_context():
+        token = create_access_token(identity=BENCHMARK_USER)
+    headers = {"Authorization": f"Bearer {token}", "X-Admin-Key": os.environ["ADMIN_API_KEY"]}
+    target = GunicornTarget(args.workers, args.threads) if args.gunicorn else InProcessTarget(backend)
+
+    cases = endpoint_cases()
+    create_case = next(case for case in cases if case[0] == "create-scheduled-task")
+    results = {}
+    offset = 0
+    try:
+        for case in cases:
+            if args.endpoints and case[0] not in args.endpoints:
+                continue
+            results[case[0]] = {}
+            for concurrency in args.concurrency:
+                # Recreate the tasks to delete
+                if case[0] == "delete-scheduled-task":
+                    for task in backend.scheduled_tasks_service.get_scheduled_tasks():
+                        backend.scheduled_tasks_service.delete_scheduled_task(task["taskId"])
+                    run_endpoint(target, create_case, headers, args.requests, 1, offset)
+                    task_ids = sorted(task["taskId"] for task in backend.scheduled_tasks_service.get_scheduled_tasks())
+                    case = (case[0], case[1], lambda n, task_ids=task_ids: f"/api/scheduled-tasks/{task_ids[n]}", None)
+                result = run_endpoint(target, case, headers, args.requests, concurrency, offset)
+                offset += args.requests
+                backend.request_counts.clear()
+                results[case[0]][str(concurrency)] = result
+                print(f"  {case[0]:<30} c={concurrency:<3} {result['throughputRps']:9.1f} req/s   "
+                      f"p50 {result['p50Ms']:8.3f}ms   p99 {result['p99Ms']:8.3f}ms   {result['statuses']}")
+    finally:
+        target.close()
+    return results
+
+
+# Services
+
+def make_events(count, users):
+    """Synthetic analytics events spread over the last 30 days"""
+    now = datetime.datetime.utcnow()
+    event_types = ("task_completed", "task_created", "task_updated", "comment_added")
+    rng = random.Random(0)
+    return [
+        {
+            "event_id": f"event_{i + 1}",
+            "user_id": f"user_{rng.randrange(users)}",
+            "event_type": event_types[i % len(event_types)],
+            "event_data": {"project_id": f"project_{i % 50}"},
+            "timestamp": (now - datetime.timedelta(seconds=rng.randrange(30 * 86400))).isoformat()
+        }
+        for i in range(count)
+    ]
+
+
+def benchmark_analytics_service(size):
+    from analytics_service import AnalyticsService
+
+    service = AnalyticsService()
+    service.events = make_events(size, users=max(1, size // 100))
+    user_ids = [f"user_{n}" for n in range(max(1, size // 100))]
+    iterations = max(3, min(1000, 10 ** 6 // size))
+    counter = itertools.count()
+    return {
+        "records": size,
+        "recordUserActivityUs": round(time_call(
+            lambda: service.record_user_activity(f"user_{next(counter) % 100}", "task_completed", {"project_id": "p"}),
+            1000), 3),
+        "getUserSummaryUs": round(time_call(
+            lambda: service.get_user_summary(f"user_{next(counter) % 100}", "weekly"), iterations), 3),
+        # Every user at once; the first call also encodes the events
+        "generateSummariesFirstUs": round(time_call(lambda: service.generate_summaries(user_ids, "monthly"), 1), 3),
+        "generateSummariesUs": round(time_call(
+            lambda: service.generate_summaries(user_ids, "monthly"), max(1, iterations // 10)), 3),
+    }
+
+
+def benchmark_rate_limiter(size, backend):
+    """Cost of one rate limit check with `size` tracked clients, each with a few recent requests"""
+    now = datetime.datetime.now().timestamp()
+    saved = dict(backend.request_counts)
+    backend.request_counts.clear()
+    backend.request_counts.update(
+        (client_address(n), [now - k for k in range(5)]) for n in range(size)
+    )
+    limited_view = backend.rate_limit(limit=10 ** 9)(lambda: "ok")
+    rng = random.Random(0)
+    addresses = [client_address(rng.randrange(size)) for _ in range(20000)]
+    address_iter = itertools.cycle(addresses)
+    from flask import request
+
+    def check():
+        request.remote_addr = next(address_iter)
+        limited_view()
+
+    try:
+        with backend.app.test_request_context("/"):
+            check_us = time_call(check, len(addresses))
+    finally:
+        backend.request_counts.clear()
+        backend.request_counts.update(saved)
+    return {"records": size, "checkUs": round(check_us, 3)}
+
+
+SUMMARY_TIMEZONES = ("UTC", "Europe/Berlin", "America/New_York", "Asia/Kolkata", "Asia/Tokyo")
+
+
+def benchmark_user_preferences_service(size):
+    from database import Database
+    from user_preferences_service import DEFAULT_PREFERENCES, UserPreferencesService
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = UserPreferencesService(Database(os.path.join(directory, "benchmark.db")))
+        for start in range(0, size, 100000):
+            service.store.put_many({
+                f"user_{n}": {**DEFAULT_PREFERENCES, "taskAssignment": n % 10 != 0,
+                              "timezone": SUMMARY_TIMEZONES[n % len(SUMMARY_TIMEZONES)], "summaryHour": n % 24}
+                for n in range(start, min(size, start + 100000))
+            })
+        rng = random.Random(0)
+        users = [f"user_{rng.randrange(size)}" for _ in range(20000)]
+        user_iter = itertools.cycle(users)
+        hot_users = itertools.cycle(users[:1000])
+        fan_out = [f"user_{n}" for n in range(min(size, 50000))]
+        for user_id in users[:1000]:
+            service.get_user_preferences(user_id)
+        return {
+            "records": size,
+            "getUserPreferencesUs": round(time_call(lambda: service.get_user_preferences(next(user_iter)), len(users)), 3),
+            "cachedGetUserPreferencesUs": round(time_call(lambda: service.get_user_preferences(next(hot_users)), len(users)), 3),
+            "updateUserPreferencesUs": round(time_call(
+                lambda: service.update_user_preferences(next(user_iter), {"dailySummary": False}), 2000), 3),
+            "shouldSendNotificationUs": round(time_call(
+                lambda: service.should_send_notification(next(user_iter), "task_assignment"), len(users)), 3),
+            "filterRecipientsUs": round(time_call(
+                lambda: service.filter_recipients(fan_out, "task_assignment"), 20), 3),
+            "dueSummaryRecipientsUs": round(time_call(service.get_due_summary_recipients, 20), 3),
+        }
+
+
+def benchmark_slot_scheduler(size):
+    from slot_scheduler import SlotScheduler
+    from task_scheduler import task_scheduler
+
+    triggers = [task_scheduler.cron_trigger(timezone, hour=hour, minute=minute)
+                for timezone in SUMMARY_TIMEZONES for hour in range(24) for minute in (0, 30)]
+    batches = []
+    slots = SlotScheduler("benchmark", batches.append, task_scheduler)
+    entries = [(f"task_{n}", triggers[n % len(triggers)], None, False) for n in range(size)]
+    start = time.perf_counter()
+    slots.add_many(entries)
+    add_us = (time.perf_counter() - start) / size * 1e6
+    fire_us = time_call(lambda: slots._fire(triggers[0]), 20)
+    jobs = len(slots._slot_jobs)
+    for entry_id, *_ in entries:
+        slots.remove(entry_id)
+    return {"entries": size, "jobs": jobs, "addUs": round(add_us, 3), "fireSlotUs": round(fire_us, 3)}
+
+
+def benchmark_firestore_store(size):
+    """FirestoreStore over FakeFirestore, with `size` tasks in projects of 100"""
+    from firestore_store import FirestoreStore, task_path
+
+    client = FakeFirestore()
+    keys = [("workspace_0", f"project_{n // 100}", f"task_{n}") for n in range(size)]
+    for key in keys:
+        client.set(task_path(*key), {"title": key[2], "status": "todo"})
+    # A listener per project, as in steady state
+    store = FirestoreStore(client, cache_size=size + size // 100 + 1, ttl=3600, max_listeners=size // 100 + 1)
+    rng = random.Random(0)
+    sample = [keys[rng.randrange(size)] for _ in range(1000)]
+    key_iter = itertools.cycle(sample)
+
+    start = time.perf_counter()
+    store.get_tasks(keys)
+    get_all_us = (time.perf_counter() - start) / size * 1e6
+    reads = client.reads
+    hit_us = time_call(lambda: store.get_task(*next(key_iter)), len(sample))
+    for key in sample:
+        store.get_project_tasks(*key[:2])
+    list_us = time_call(lambda: store.get_project_tasks(*next(key_iter)[:2]), len(sample))
+    # A write reaches the cache through the listener
+    client.set(task_path(*keys[0]), {"title": keys[0][2], "status": "done"})
+    assert store.get_task(*keys[0])["status"] == "done"
+    store.close()
+    return {"tasks": size, "getAllUs": round(get_all_us, 3), "cachedGetTaskUs": round(hit_us, 3),
+            "cachedProjectTasksUs": round(list_us, 3), "readsAfterGetAll": client.reads - reads}
+
+
+def benchmark_search(size):
+    """SearchService over FakeFirestore, with `size` tasks of one workspace in projects of 1000"""
+    from database import Database
+    from firestore_store import FirestoreStore, project_path, task_path
+    from search_service import SearchService
+
+    rng = random.Random(0)
+    # Words of a Zipf-like frequency, as in real text
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+                  for _ in range(20000)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def words(count):
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=count))
+
+    client = FakeFirestore()
+    projects = max(size // 1000, 1)
+    for p in range(projects):
+        client.set(project_path("workspace_0", f"project_{p}"), {"name": f"Project {p}"})
+    for n in range(size):
+        client.set(task_path("workspace_0", f"project_{n % projects}", f"task_{n}"), {
+            "title": words(4), "description": words(12),
+            "tags": rng.sample(("backend", "frontend", "bug", "feature"), 2), "status": "todo",
+            "assigneeId": f"user_{n % 50}"
+        })
+    database = Database(os.path.join(tempfile.mkdtemp(prefix="taskflow-benchmark-"), "search.db"))
+    store = FirestoreStore(client, cache_size=size + projects + 10, ttl=3600, max_listeners=projects + 10)
+    service = SearchService(store, database, snapshot_interval=0)
+
+    start = time.perf_counter()
+    service.search("workspace_0", vocabulary[0])
+    build_ms = (time.perf_counter() - start) * 1000
+    # Queries of distinctive words, of any frequency; the most common words match most tasks
+    queries = itertools.cycle([f"{rng.choice(vocabulary)} {words(1)}" for _ in range(100)])
+    query_us = time_call(lambda: service.search("workspace_0", next(queries)), 1000)
+    # Search as you type: the last word is a prefix
+    prefixes = itertools.cycle([rng.choice(vocabulary)[:3] for _ in range(100)]
+                               + [f"{rng.choice(vocabulary)} {words(1)[:3]}" for _ in range(100)])
+    prefix_us = time_call(lambda: service.search("workspace_0", next(prefixes)), 1000)
+    snapshot_bytes = service.save_snapshot("workspace_0")
+
+    # A restart: answered from the snapshot while catching up
+    restarted = SearchService(FirestoreStore(client, cache_size=size + projects + 10, ttl=3600,
+                                             max_listeners=projects + 10), database, snapshot_interval=0)
+    start = time.perf_counter()
+    restarted.search("workspace_0", vocabulary[0])
+    restore_ms = (time.perf_counter() - start) * 1000
+    restarted._executor.shutdown(wait=True)
+    return {"tasks": size, "buildMs": round(build_ms, 3), "queryUs": round(query_us, 3),
+            "prefixQueryUs": round(prefix_us, 3), "snapshotBytes": snapshot_bytes, "restoreMs": round(restore_ms, 3)}
+
+
+def benchmark_services(args):
+    """Micro-benchmarks of the services at each record count"""
+    print("\nServices")
+    backend = install_fakes()
+    results = {"analytics": {}, "rateLimiter": {}, "userPreferences": {}, "slotScheduler": {}, "firestoreStore": {},
+               "search": {}}
+    for size in args.sizes:
+        analytics = benchmark_analytics_service(size)
+        limiter = benchmark_rate_limiter(size, backend)
+        preferences = benchmark_user_preferences_service(size)
+        slots = benchmark_slot_scheduler(size)
+        firestore = benchmark_firestore_store(size)
+        search = benchmark_search(size)
+        results["analytics"][str(size)] = analytics
+        results["rateLimiter"][str(size)] = limiter
+        results["userPreferences"][str(size)] = preferences
+        results["slotScheduler"][str(size)] = slots
+        results["firestoreStore"][str(size)] = firestore
+        results["search"][str(size)] = search
+        print(f"  n={size:<9} analytics: record {analytics['recordUserActivityUs']:8.2f}us, "
+              f"summary {analytics['getUserSummaryUs']:12.1f}us, "
+              f"all {size // 100} summaries {analytics['generateSummariesUs'] / 1000:7.2f}ms   "
+              f"rate limit: {limiter['checkUs']:6.2f}us   "
+              f"preferences: get {preferences['getUserPreferencesUs']:6.2f}us "
+              f"(cached {preferences['cachedGetUserPreferencesUs']:6.2f}us), "
+              f"update {preferences['updateUserPreferencesUs']:6.2f}us, "
+              f"should send {preferences['shouldSendNotificationUs']:6.2f}us, "
+              f"filter {min(size, 50000)} {preferences['filterRecipientsUs'] / 1000:7.2f}ms, "
+              f"due summaries {preferences['dueSummaryRecipientsUs'] / 1000:7.2f}ms   "
+              f"slots: add {slots['addUs']:6.2f}us into {slots['jobs']} jobs, "
+              f"fire {size // slots['jobs']} {slots['fireSlotUs'] / 1000:7.2f}ms   "
+              f"firestore: get_all {firestore['getAllUs']:6.2f}us/task, cached {firestore['cachedGetTaskUs']:6.2f}us, "
+              f"cached list {firestore['cachedProjectTasksUs']:6.2f}us   "
+              f"search: build {search['buildMs']:8.1f}ms, query {search['queryUs']:7.1f}us, "
+              f"prefix {search['prefixQueryUs']:7.1f}us, snapshot {search['snapshotBytes'] // 1024}KiB "
+              f"restored in {search['restoreMs']:7.1f}ms")
+    return results
+
+
+# Serialization, compression and instrumentation
+
+def benchmark_json_providers(args):
+    """Compare the stdlib and orjson providers on endpoint-shaped payloads"""
+    print("\nJSON providers (mean per call)")
+    if orjson is None:
+        print("  orjson is not installed, skipping")
+        return {}
+
+    app = Flask(__name__)
+    providers = {"stdlib": DefaultJSONProvider(app), "orjson": OrjsonProvider(app)}
+    payloads = {
+        "user-summary": (make_user_summary_payload(), 20000),
+        "scheduled-tasks x100": (make_scheduled_tasks_payload(100), 2000),
+        "scheduled-tasks x5000": (make_scheduled_tasks_payload(5000), 20),
+    }
+
+    results = {}
+    with app.app_context():
+        for name, (payload, iterations) in payloads.items():
+            raw = json.dumps(payload).encode("utf-8")
+            results[name] = {}
+            for provider_name, provider in providers.items():
+                results[name][provider_name] = {
+                    "responseUs": round(time_call(lambda: provider.response(payload), iterations), 3),
+                    "loadsUs": round(time_call(lambda: provider.loads(raw), iterations), 3),
+                }
+            stdlib, fast = results[name]["stdlib"], results[name]["orjson"]
+            print(f"  {name:<22} response: {stdlib['responseUs']:9.1f}us -> {fast['responseUs']:9.1f}us "
+                  f"({stdlib['responseUs'] / fast['responseUs']:4.1f}x)"
+                  f"   loads: {stdlib['loadsUs']:9.1f}us -> {fast['loadsUs']:9.1f}us "
+                  f"({stdlib['loadsUs'] / fast['loadsUs']:4.1f}x)")
+    return results
+
+
+def benchmark_compression(args):
+    """Report size and cost of gzip/brotli on endpoint-shaped payloads"""
+    print("\nCompression")
+    results = {}
+    for count in (100, 5000):
+        data = json.dumps(make_scheduled_tasks_payload(count), separators=(",", ":")).encode("utf-8")
+        iterations = 200 if count == 100 else 5
+        result = {
+            "rawBytes": len(data),
+            "gzipBytes": len(gzip.compress(data, compresslevel=6)),
+            "gzipUs": round(time_call(lambda: gzip.compress(data, compresslevel=6), iterations), 3),
+        }
+        line = (f"  scheduled-tasks x{count:<5} {len(data):>9} B -> gzip {result['gzipBytes']:>8} B "
+                f"({result['gzipUs']:8.1f}us)")
+        if brotli is not None:
+            result["brotliBytes"] = len(brotli.compress(data, quality=4))
+            result["brotliUs"] = round(time_call(lambda: brotli.compress(data, quality=4), iterations), 3)
+            line += f", br {result['brotliBytes']:>8} B ({result['brotliUs']:8.1f}us)"
+        results[f"scheduled-tasks x{count}"] = result
+        print(line)
+    return results
+
+
+def benchmark_metrics_overhead(args):
+    """Measure request instrumentation overhead on the existing endpoints"""
+    print("\nMetrics instrumentation overhead")
+    backend = install_fakes()
+    from flask_jwt_extended import create_access_token
+
+    with backend.app.app_context():
+        token = create_access_token(identity=BENCHMARK_USER)
+    headers = {"Authorization": f"Bearer {token}"}
+    client = backend.app.test_client()
+    instrumented_views = dict(backend.app.view_functions)
+    plain_views = {endpoint: getattr(view, '__wrapped__', view) for endpoint, view in instrumented_views.items()}
+    endpoints = {
+        "health": "/api/health",
+        "preferences": f"/api/users/{BENCHMARK_USER}/preferences",
+        "user-summary": f"/api/analytics/user-summary?userId={BENCHMARK_USER}",
+    }
+    iterations = 1000
+    counter = itertools.count()
+
+    def get(path):
+        # Rotate client addresses so the rate limiter never rejects a request
+        client.get(path, headers=headers, environ_base={"REMOTE_ADDR": client_address(next(counter))})
+
+    results = {}
+    for name, path in endpoints.items():
+        best = {"plain": float('inf'), "instrumented": float('inf')}
+        for _ in range(10):
+            for mode, views in (("plain", plain_views), ("instrumented", instrumented_views)):
+                backend.app.view_functions.update(views)
+                best[mode] = min(best[mode], time_call(lambda: get(path), iterations))
+        overhead = (best["instrumented"] - best["plain"]) / best["plain"] * 100
+        results[name] = {"plainUs": round(best["plain"], 3), "instrumentedUs": round(best["instrumented"], 3)}
+        print(f"  {name:<14} {best['plain']:8.1f}us -> {best['instrumented']:8.1f}us per request ({overhead:+.2f}%)")
+    backend.app.view_functions.update(instrumented_views)
+    backend.request_counts.clear()
+
+    # The end-to-end numbers above are noisy; time the wrapper itself in isolation
+    def view():
+        return "ok"
+
+    registry = MetricsRegistry()
+    instrumented_view = registry.instrument_view("benchmark", view, "GET")
+    with backend.app.test_request_context("/"):
+        wrapper_us = time_call(instrumented_view, 200000) - time_call(view, 200000)
+    histogram = Histogram()
+    observe_us = time_call(lambda: histogram.observe(0.0042), 200000)
+    results["viewWrapperUs"] = round(wrapper_us, 3)
+    results["histogramObserveUs"] = round(observe_us, 4)
+    print(f"  view wrapper: {wrapper_us:.2f}us per request, Histogram.observe: {observe_us * 1000:.0f}ns per call")
+    return results
+
+
+SUITES = {
+    "endpoints": benchmark_endpoints,
+    "services": benchmark_services,
+    "json": benchmark_json_providers,
+    "compression": benchmark_compression,
+    "metrics": benchmark_metrics_overhead,
+}
+
+
+# Comparison
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {'a.b.metricUs': value} for the timing and throughput metrics"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and key.endswith(("Us", "Ms", "Rps")):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """
+    Print metrics that changed by more than threshold percent
+
+    Returns:
+        Number of regressions
+    """
+    print(f"\nComparison with {baseline['timestamp']} (threshold {threshold:g}%)")
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    regressions = 0
+    for path in sorted(old.keys() & new.keys()):
+        if not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path] * 100
+        # Throughput is better higher, everything else is a time
+        worse = -change if path.endswith("Rps") else change
+        if abs(change) < threshold:
+            continue
+        regressions += worse > 0
+        label = "REGRESSION" if worse > 0 else "improvement"
+        print(f"  {label:<11} {path}: {old[path]:g} -> {new[path]:g} ({change:+.1f}%)")
+    print(f"  {regressions} regression(s)")
+    return regressions
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="TaskFlow Python Backend benchmarks")
+    parser.add_argument("suites", nargs="*",
+                        help=f"Suites to run: {', '.join(SUITES)} (default: all)")
+    parser.add_argument("--concurrency", type=parse_counts, default=[1, 8],
+                        help="Comma-separated concurrency levels for the endpoint suite (default: 1,8)")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="Requests per endpoint and concurrency level (default: 1000)")
+    parser.add_argument("--endpoint", dest="endpoints", action="append",
+                        help="Only benchmark this endpoint (repeatable)")
+    parser.add_argument("--gunicorn", action="store_true",
+                        help="Drive a local gunicorn instead of the in-process test client")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers (default: 1)")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker (default: 8)")
+    parser.add_argument("--sizes", type=parse_counts, default=[10 ** 4, 10 ** 5],
+                        help="Comma-separated record counts for the service suite, e.g. 1e4,1e5,1e6,1e7 (default: 1e4,1e5)")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="Where to save the results (default: benchmark_results.json)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Percent change reported by --compare (default: 10)")
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    logging.disable(logging.INFO)
+    print("TaskFlow Python Backend Benchmarks")
+    print("=" * 40)
+
+    results = {}
+    for name in args.suites or SUITES:
+        results[name] = SUITES[name](args)
+
+    report = {
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "sizes": args.sizes,
+            "server": "gunicorn" if args.gunicorn else "in-process",
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 40)
+    print(f"Benchmarks completed, results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Bulk Task Service for TaskFlow Python Backend
+
+Applies many task changes in one call: status changes, reassignments, moves
+to another project of the workspace and deletes, written the way the app's
+TaskService writes them (an assignment sets the task's assigneeId and its
+assignments/{userId} document, as assignUserToTask does). The writes are grouped into Firestore batched
+writes of at most 500, which are committed concurrently; each batch is
+atomic, so an operation's writes (a move's copy and delete) always share
+one. Users assigned tasks get one notification each, however many tasks
+they were assigned, unless they turned task assignment notifications off.
+"""
+
+import datetime
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from firestore_store import GET_ALL_BATCH_SIZE, FirestoreStore, TaskKey, firestore_store, project_path, task_path
+from metrics import metrics
+from notification_service import NotificationService, notification_service
+from user_preferences_service import UserPreferencesService, user_preferences_service
+
+logger = logging.getLogger(__name__)
+
+OPERATION_TYPES = ('status', 'assign', 'move', 'delete')
+ASSIGNMENTS = 'assignments'
+MEMBERS = 'members'
+
+# Role of the assignment document written for a task's assigneeId
+ASSIGNEE_ROLE = 'assignee'
+
+# Writes per batched write (Firestore limit)
+MAX_BATCH_WRITES = 500
+
+# A write: ('set' | 'update' | 'delete', document path, data or None)
+Write = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def is_workspace_member(workspace: Dict[str, Any], user_id: str) -> bool:
+    """Whether a user owns or is a member of a workspace"""
+    return user_id == workspace.get("ownerId") or user_id in (workspace.get("members") or ())
+
+
+class BulkTaskService:
+    def __init__(self, store: Optional[FirestoreStore] = None, notifications: Optional[NotificationService] = None,
+                 preferences: Optional[UserPreferencesService] = None, max_operations: int = 2000,
+                 max_workers: int = 8):
+        """
+        Initialize the bulk task service
+
+        Args:
+            store: Firestore store, defaults to the global one
+            notifications: Notification service, defaults to the global one
+            preferences: User preferences service, defaults to the global one
+            max_operations: Maximum number of operations per call
+            max_workers: Maximum number of batches committed at once
+        """
+        self.store = store or firestore_store
+        self.notifications = notifications or notification_service
+        self.preferences = preferences or user_preferences_service
+        self.max_operations = max_operations
+        self.max_workers = max_workers
+        self._executor = None
+        self._operations = metrics.counter(
+            'taskflow_bulk_task_operations_total', 'Bulk task operations by type and result', ('type', 'result')
+        )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bulk-tasks')
+        return self._executor
+
+    def validate(self, operations: Any) -> Optional[str]:
+        """
+        Validate a list of operations
+
+        Args:
+            operations: Operations from the request body
+
+        Returns:
+            Error message, or None if the operations are valid
+        """
+        if not isinstance(operations, list) or not operations:
+            return "operations must be a non-empty list"
+        if len(operations) > self.max_operations:
+            return f"At most {self.max_operations} operations may be applied at once"
+        seen = set()
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or operation.get('type') not in OPERATION_TYPES:
+                return f"Operation {index} must be an object with a type of {', '.join(OPERATION_TYPES)}"
+            if not all(isinstance(operation.get(field), str) and operation[field]
+                       for field in ('projectId', 'taskId')):
+                return f"Operation {index} must have a projectId and a taskId"
+            key = (operation['projectId'], operation['taskId'])
+            if key in seen:
+                # Batches commit concurrently, so two writes to one task have no order
+                return f"Operation {index} changes a task already changed by another operation"
+            seen.add(key)
+            kind = operation['type']
+            if kind == 'status' and not isinstance(operation.get('status'), str):
+                return f"Operation {index} must have a status"
+            if kind == 'assign' and not isinstance(operation.get('assigneeId', 0), (str, type(None))):
+                return f"Operation {index} must have an assigneeId, or null to unassign"
+            if kind == 'move' and (not isinstance(operation.get('targetProjectId'), str)
+                                   or operation['targetProjectId'] in ('', operation['projectId'])):
+                return f"Operation {index} must have a targetProjectId other than its projectId"
+        return None
+
+    def _writes(self, workspace_id: str, operation: Dict[str, Any], task: Dict[str, Any],
+                assignments: List[Dict[str, Any]]) -> List[Write]:
+        """The writes of one operation, as TaskService makes them"""
+        from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+        path = task_path(workspace_id, operation['projectId'], operation['taskId'])
+        kind = operation['type']
+        if kind == 'status':
+            return [('update', path, {"status": operation['status'], "updatedAt": SERVER_TIMESTAMP})]
+        if kind == 'assign':
+            assignee = operation.get('assigneeId')
+            writes = [('update', path, {"assigneeId": assignee, "updatedAt": SERVER_TIMESTAMP})]
+            # The assignee document of the previous assignee goes, other roles stay
+            for assignment in assignments:
+                if assignment.get("role") == ASSIGNEE_ROLE and assignment["id"] != assignee:
+                    writes.append(('delete', f"{path}/{ASSIGNMENTS}/{assignment['id']}", None))
+            if assignee is not None:
+                writes.append(('set', f"{path}/{ASSIGNMENTS}/{assignee}", {
+                    "taskId": operation['taskId'],
+                    "userId": assignee,
+                    "role": ASSIGNEE_ROLE,
+                    "status": "accepted",
+                    "assignedAt": datetime.datetime.now().isoformat(),
+                    "invitedAt": None
+                }))
+            return writes
+        if kind == 'delete':
+            return [('delete', path, None)]
+
+        # A move copies the task and its assignments under the target project
+        target = task_path(workspace_id, operation['targetProjectId'], operation['taskId'])
+        data = {field: value for field, value in task.items() if field != "id"}
+        data.update(projectId=operation['targetProjectId'], updatedAt=SERVER_TIMESTAMP)
+        writes = [('set', target, data), ('delete', path, None)]
+        for assignment in assignments:
+            assignment = dict(assignment)
+            assignment_id = assignment.pop("id")
+            writes.append(('set', f"{target}/{ASSIGNMENTS}/{assignment_id}", assignment))
+            writes.append(('delete', f"{path}/{ASSIGNMENTS}/{assignment_id}", None))
+        return writes
+
+    def _project_members(self, workspace_id: str, members: Iterable[Tuple[str, str]]) -> set:
+        """
+        The (project ID, user ID) pairs of accepted project members among the given ones
+
+        Read with batched get_all calls, as ProjectService.isUserMemberOfProject reads them one by one.
+        """
+        client = self.store.client
+        paths = {f"{project_path(workspace_id, project_id)}/{MEMBERS}/{user_id}": (project_id, user_id)
+                 for project_id, user_id in members}
+        accepted = set()
+        references = [client.document(path) for path in paths]
+        for start in range(0, len(references), GET_ALL_BATCH_SIZE):
+            for snapshot in client.get_all(references[start:start + GET_ALL_BATCH_SIZE]):
+                if snapshot.exists and snapshot.to_dict().get("status") == "accepted":
+                    accepted.add(paths[snapshot.reference.path])
+        return accepted
+
+    def _read_assignments(self, path: str) -> List[Dict[str, Any]]:
+        return [
+            dict(snapshot.to_dict(), id=snapshot.id)
+            for snapshot in self.store.client.collection(f"{path}/{ASSIGNMENTS}").stream()
+        ]
+
+    def _commit(self, writes: List[Write]):
+        """Commit writes as one batched write"""
+        client = self.store.client
+        batch = client.batch()
+        for kind, path, data in writes:
+            reference = client.document(path)
+            if kind == 'set':
+                batch.set(reference, data)
+            elif kind == 'update':
+                batch.update(reference, data)
+            else:
+                batch.delete(reference)
+        batch.commit()
+
+    @metrics.timed('bulk_tasks')
+    def apply(self, workspace: Dict[str, Any], operations: List[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
+        """
+        Apply validated operations to a workspace's tasks
+
+        Args:
+            workspace: Workspace data, from FirestoreStore.get_workspace
+            operations: Operations, checked with validate
+            user_id: ID of the user making the changes, who is not notified
+
+        Returns:
+            The result of each operation, in order, with the number that
+            succeeded and failed, the number of batches and of users notified
+        """
+        workspace_id = workspace["id"]
+        results = [{"index": index, "status": "ok"} for index in range(len(operations))]
+
+        def fail(index: int, error: str):
+            results[index] = {"index": index, "status": "error", "error": error}
+
+        # Read fresh: moves write the tasks back
+        tasks = self.store.get_tasks(
+            [(workspace_id, operation['projectId'], operation['taskId']) for operation in operations], fresh=True
+        )
+        targets = {operation['targetProjectId'] for operation in operations if operation['type'] == 'move'}
+        missing_targets = {project_id for project_id in targets
+                           if self.store.get_project(workspace_id, project_id) is None}
+        members = self._project_members(workspace_id, {
+            (operation['projectId'], operation['assigneeId']) for operation in operations
+            if operation['type'] == 'assign' and operation.get('assigneeId') is not None
+        })
+        valid = []
+        for index, operation in enumerate(operations):
+            key: TaskKey = (workspace_id, operation['projectId'], operation['taskId'])
+            assignee = operation.get('assigneeId')
+            if tasks.get(key) is None:
+                fail(index, "Task not found")
+            elif operation['type'] == 'move' and operation['targetProjectId'] in missing_targets:
+                fail(index, "Target project not found")
+            elif operation['type'] == 'assign' and assignee is not None \
+                    and (operation['projectId'], assignee) not in members:
+                fail(index, "Assignee is not a member of the project")
+            else:
+                valid.append((index, operation, tasks[key]))
+
+        # Moves copy a task's assignments, assignments replace the previous assignee's
+        with_assignments = [task_path(workspace_id, operation['projectId'], operation['taskId'])
+                            for _, operation, _ in valid if operation['type'] in ('move', 'assign')]
+        assignments = dict(zip(with_assignments, self.executor.map(self._read_assignments, with_assignments)))
+
+        # Pack whole operations into batches of at most MAX_BATCH_WRITES writes
+        batches = []  # (operation indexes, writes)
+        for index, operation, task in valid:
+            path = task_path(workspace_id, operation['projectId'], operation['taskId'])
+            writes = self._writes(workspace_id, operation, task, assignments.get(path, ()))
+            if len(writes) > MAX_BATCH_WRITES:
+                fail(index, f"A task moved with its assignments must take at most {MAX_BATCH_WRITES} writes")
+                continue
+            if not batches or len(batches[-1][1]) + len(writes) > MAX_BATCH_WRITES:
+                batches.append(([], []))
+            batches[-1][0].append(index)
+            batches[-1][1].extend(writes)
+
+        def commit(batch: Tuple[List[int], List[Write]]) -> Optional[Exception]:
+            try:
+                self._commit(batch[1])
+                return None
+            except Exception as e:
+                return e
+
+        errors = list(self.executor.map(commit, batches))
+        for (indexes, writes), error in zip(batches, errors):
+            # Read-your-writes before the listeners catch up
+            paths = {path for _, path, _ in writes}
+            self.store.invalidate(*paths, *{path.rsplit('/', 1)[0] for path in paths})
+            if error is not None:
+                logger.error(f"Failed to commit a batch of {len(indexes)} task operations: {error}")
+                for index in indexes:
+                    fail(index, f"Batch failed: {error}")
+
+        # One notification per assignee for the assignments written
+        assigned = {}
+        for index, operation, task in valid:
+            assignee = operation.get('assigneeId')
+            if operation['type'] == 'assign' and results[index]["status"] == "ok" \
+                    and assignee is not None and assignee != user_id and assignee != task.get("assigneeId"):
+                assigned.setdefault(assignee, []).append(task.get("title") or operation['taskId'])
+        recipients = self.preferences.filter_recipients(assigned, "task_assignment")
+        assigned = {assignee: assigned[assignee] for assignee in recipients}
+        notified = 0
+        if assigned:
+            try:
+                notified = self.notifications.send_assignment_notifications(
+                    assigned, workspace.get("name") or workspace_id
+                )["success_count"]
+            except Exception as e:
+                # The writes stand; only the notifications are lost
+                logger.error(f"Failed to notify {len(assigned)} assignees: {e}")
+
+        failed = 0
+        for result, operation in zip(results, operations):
+            ok = result["status"] == "ok"
+            failed += not ok
+            self._operations.labels(operation['type'], 'ok' if ok else 'error').inc()
+        logger.info(f"Applied {len(operations) - failed} of {len(operations)} task operations "
+                    f"in workspace {workspace_id} with {len(batches)} batches")
+        return {
+            "results": results,
+            "succeeded": len(operations) - failed,
+            "failed": failed,
+            "batches": len(batches),
+            "notified": notified
+        }
+
+
+# Global instance
+bulk_task_service = BulkTaskService(
+    max_operations=int(os.getenv('BULK_TASKS_MAX_OPERATIONS', '2000')),
+    max_workers=int(os.getenv('BULK_TASKS_MAX_WORKERS', '8'))
+)
@@ -0,0 +1,123 @@
+"""
+Response Compression for TaskFlow Python Backend
+"""
+
+import gzip
+import logging
+import os
+from typing import Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the deployment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Encodings the compressor can produce, in order of preference
+CONTENT_ENCODINGS = ('br', 'gzip')
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/plain',
+    'text/html',
+    'text/csv',
+}
+
+
+class Compressor:
+    def __init__(self, app=None):
+        """Initialize the response compressor"""
+        self.min_size = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+        self.gzip_level = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+        self.brotli_quality = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the compressor on a Flask app
+
+        Args:
+            app: Flask application
+        """
+        app.after_request(self.compress_response)
+        logger.info(
+            f"Response compression enabled above {self.min_size} bytes "
+            f"(brotli {'available' if brotli is not None else 'not installed'})"
+        )
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """
+        Pick the best supported encoding from an Accept-Encoding header
+
+        Args:
+            accept_encoding: Raw Accept-Encoding header value
+
+        Returns:
+            'br', 'gzip' or None
+        """
+        accepted = {}
+        for part in accept_encoding.lower().split(','):
+            coding, _, params = part.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if coding:
+                accepted[coding] = quality
+
+        def allowed(coding):
+            return accepted.get(coding, accepted.get('*', 0.0)) > 0
+
+        if brotli is not None and allowed('br'):
+            return 'br'
+        if allowed('gzip'):
+            return 'gzip'
+        return None
+
+    def compress_response(self, response):
+        """
+        Compress a response body when the client accepts it and it is large enough
+
+        Args:
+            response: Outgoing Flask response
+
+        Returns:
+            The (possibly compressed) response
+        """
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < self.min_size:
+            return response
+
+        encoding = self.negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(data, compresslevel=self.gzip_level)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag identifies the exact bytes, so each encoding gets its own
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
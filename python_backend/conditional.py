@@ -0,0 +1,61 @@
+"""
+Conditional Requests for TaskFlow Python Backend
+
+Services keep version counters; views turn them into strong ETags and answer
+a matching If-None-Match with 304 before computing the response body.
+"""
+
+import uuid
+from typing import Optional
+
+from flask import Response, request
+
+from compression import CONTENT_ENCODINGS
+
+# Versions restart with the process and differ between workers, so every ETag
+# carries an epoch unique to this process
+ETAG_EPOCH = uuid.uuid4().hex[:12]
+
+
+def make_etag(*parts, epoch: str = ETAG_EPOCH) -> str:
+    """
+    Build an ETag value from version parts
+
+    Args:
+        parts: Version numbers identifying the representation
+        epoch: Scope of the versions; defaults to this process, pass a store
+            ID for versions that are shared by workers and survive restarts
+
+    Returns:
+        Unquoted ETag value
+    """
+    return '-'.join([epoch, *map(str, parts)])
+
+
+def not_modified_response(etag: str) -> Optional[Response]:
+    """
+    Answer If-None-Match for the current request
+
+    Args:
+        etag: ETag of the current representation
+
+    Returns:
+        A 304 response if the client already has it, otherwise None
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+
+    if if_none_match.star_tag:
+        matched = etag
+    else:
+        # The compressor suffixes the ETag with the content encoding
+        candidates = (etag, *(f"{etag}-{encoding}" for encoding in CONTENT_ENCODINGS))
+        matched = next((candidate for candidate in candidates if if_none_match.contains_weak(candidate)), None)
+        if matched is None:
+            return None
+
+    response = Response(status=304)
+    response.set_etag(matched)
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,242 @@
+"""
+Dashboard Service for TaskFlow Python Backend
+
+Builds a user's whole dashboard (task counts by status, overdue counts and
+per-workspace totals) in one call. Each project's task counts are computed
+once from its task list and then kept up to date from the Firestore
+listeners' changes, so a dashboard reads the counters rather than the tasks.
+Open tasks' due dates are kept sorted, so overdue counts follow the clock
+without any change. Assembled dashboards are cached per user for a few
+seconds.
+"""
+
+import bisect
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from firestore_store import FirestoreStore, TASKS, firestore_store, tasks_path
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUS = 'done'
+
+
+def _due_timestamp(due_date: Any) -> Optional[float]:
+    """Due date as a Unix timestamp; ISO strings without an offset are UTC"""
+    if not due_date:
+        return None
+    if isinstance(due_date, str):
+        try:
+            due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(due_date, datetime):
+        if due_date.tzinfo is None:
+            due_date = due_date.replace(tzinfo=timezone.utc)
+        return due_date.timestamp()
+    return None
+
+
+class TaskCounts:
+    """Task counts by status, and the sorted due dates of the open tasks"""
+
+    def __init__(self):
+        self.by_status = Counter()
+        self.open_due = []
+
+    def add(self, status: str, due: Optional[float]):
+        self.by_status[status] += 1
+        if due is not None and status != DONE_STATUS:
+            bisect.insort(self.open_due, due)
+
+    def remove(self, status: str, due: Optional[float]):
+        self.by_status[status] -= 1
+        if not self.by_status[status]:
+            del self.by_status[status]
+        if due is not None and status != DONE_STATUS:
+            del self.open_due[bisect.bisect_left(self.open_due, due)]
+
+    def overdue(self, now: float) -> int:
+        return bisect.bisect_left(self.open_due, now)
+
+
+class ProjectCounters:
+    def __init__(self):
+        """Initialize empty counters of a project's tasks"""
+        self.tasks = {}  # task path -> (status, due, assignee ID)
+        self.all = TaskCounts()
+        self.assignees = {}  # assignee ID -> TaskCounts
+        # ID of the listener the counters follow, None while building
+        self.listener_id = None
+        # Tasks changed while building, newer than the task list
+        self.changed = set()
+
+    def set_task(self, path: str, task: Optional[Dict[str, Any]]):
+        """Replace a task's contribution, removing it if task is None"""
+        previous = self.tasks.pop(path, None)
+        if previous is not None:
+            status, due, assignee = previous
+            self.all.remove(status, due)
+            counts = self.assignees[assignee]
+            counts.remove(status, due)
+            if not counts.by_status:
+                del self.assignees[assignee]
+        if task is not None:
+            status, due, assignee = task.get("status", "todo"), _due_timestamp(task.get("dueDate")), task.get("assigneeId")
+            self.tasks[path] = (status, due, assignee)
+            self.all.add(status, due)
+            self.assignees.setdefault(assignee, TaskCounts()).add(status, due)
+
+
+def _task_totals(counts: Counter, overdue: int) -> Dict[str, Any]:
+    return {"total": sum(counts.values()), "byStatus": dict(counts), "overdue": overdue}
+
+
+class DashboardService:
+    def __init__(self, store: Optional[FirestoreStore] = None, ttl: float = 15.0):
+        """
+        Initialize the dashboard service
+
+        Args:
+            store: Firestore store, defaults to the global one
+            ttl: Seconds a user's dashboard is served from the cache
+        """
+        self.store = store or firestore_store
+        self.ttl = ttl
+        self._projects = {}  # tasks collection path -> ProjectCounters
+        self._dashboards = OrderedDict()  # user ID -> (dashboard, version, expiry), in expiry order
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        # Builds read whole task lists; one at a time
+        self._build_lock = threading.Lock()
+        self.store.subscribe(self._on_change)
+        logger.info("Dashboard service initialized")
+
+    def _on_change(self, path: str, data: Optional[Dict[str, Any]]):
+        """Apply a task change seen by the Firestore listeners to its project's counters"""
+        collection_path, _, _ = path.rpartition('/')
+        if not collection_path.endswith(f"/{TASKS}"):
+            return
+        with self._lock:
+            project = self._projects.get(collection_path)
+            if project is None:
+                return
+            project.set_task(path, data)
+            if project.listener_id is None:
+                project.changed.add(path)
+
+    def _project(self, workspace_id: str, project_id: str) -> ProjectCounters:
+        """Counters of a project, built from its task list unless they follow its listener"""
+        path = tasks_path(workspace_id, project_id)
+        project = self._projects.get(path)
+        if project is not None and project.listener_id is not None \
+                and project.listener_id == self.store.listener_id(path):
+            return project
+
+        with self._build_lock:
+            project = self._projects.get(path)
+            if project is not None and project.listener_id is not None \
+                    and project.listener_id == self.store.listener_id(path):
+                return project
+            project = ProjectCounters()
+            with self._lock:
+                # Changes from here on are applied, and win over the task list
+                self._projects[path] = project
+            tasks = self.store.get_project_tasks(workspace_id, project_id)
+            with self._lock:
+                for task in tasks:
+                    task_path = f"{path}/{task['id']}"
+                    if task_path not in project.changed:
+                        project.set_task(task_path, task)
+                project.changed = set()
+                # Read after the task list, which starts the listener
+                project.listener_id = self.store.listener_id(path)
+                if len(self._projects) > self.store.max_listeners:
+                    # Counters whose listener was stopped are rebuilt when next needed
+                    for stale in [key for key, counters in self._projects.items()
+                                  if counters.listener_id is not None
+                                  and counters.listener_id != self.store.listener_id(key)]:
+                        del self._projects[stale]
+        return project
+
+    @metrics.timed('dashboard')
+    def get_dashboard(self, user_id: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Get a user's dashboard
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            The dashboard, and its version
+        """
+        cached = self._dashboards.get(user_id)
+        if cached is not None and cached[2] > time.monotonic():
+            return cached[0], cached[1]
+
+        now = time.time()
+        total = Counter()
+        assigned = Counter()
+        total_overdue = assigned_overdue = project_count = 0
+        workspaces = []
+        for workspace in self.store.get_user_workspaces(user_id):
+            workspace_total = Counter()
+            workspace_assigned = Counter()
+            workspace_overdue = workspace_assigned_overdue = 0
+            projects = self.store.get_workspace_projects(workspace["id"])
+            for project in projects:
+                counters = self._project(workspace["id"], project["id"])
+                with self._lock:
+                    workspace_total.update(counters.all.by_status)
+                    workspace_overdue += counters.all.overdue(now)
+                    mine = counters.assignees.get(user_id)
+                    if mine is not None:
+                        workspace_assigned.update(mine.by_status)
+                        workspace_assigned_overdue += mine.overdue(now)
+            workspaces.append({
+                "id": workspace["id"],
+                "name": workspace.get("name"),
+                "projects": len(projects),
+                "tasks": _task_totals(workspace_total, workspace_overdue),
+                "assigned": _task_totals(workspace_assigned, workspace_assigned_overdue)
+            })
+            total.update(workspace_total)
+            assigned.update(workspace_assigned)
+            total_overdue += workspace_overdue
+            assigned_overdue += workspace_assigned_overdue
+            project_count += len(projects)
+
+        dashboard = {
+            "userId": user_id,
+            "totals": {
+                "workspaces": len(workspaces),
+                "projects": project_count,
+                "tasks": _task_totals(total, total_overdue),
+                "assigned": _task_totals(assigned, assigned_overdue)
+            },
+            "workspaces": workspaces,
+            "generatedAt": datetime.fromtimestamp(now, timezone.utc).isoformat()
+        }
+        version = next(self._versions)
+        with self._lock:
+            self._dashboards.pop(user_id, None)
+            self._dashboards[user_id] = (dashboard, version, time.monotonic() + self.ttl)
+            # Every entry has the same TTL, so the expired ones come first
+            current = time.monotonic()
+            while self._dashboards and next(iter(self._dashboards.values()))[2] <= current:
+                self._dashboards.popitem(last=False)
+        logger.info(f"Built dashboard for user {user_id}: {len(workspaces)} workspaces, {project_count} projects")
+        return dashboard, version
+
+
+# Global instance
+dashboard_service = DashboardService(ttl=float(os.getenv('DASHBOARD_CACHE_TTL', '15')))
@@ -0,0 +1,129 @@
+"""
+SQLite Database for TaskFlow Python Backend
+
+One database file in WAL mode shared by every worker process, with one
+connection per thread. Under gevent's monkey-patching that is one per OS
+thread, shared by its greenlets, and waiting for the write lock lets the
+other greenlets run.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def default_database_path() -> str:
+    return os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taskflow.db'))
+
+
+def gevent_patched() -> bool:
+    """Whether gevent has monkey-patched threading, as in gunicorn's gevent workers"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def thread_local() -> threading.local:
+    """
+    Thread-local storage of the OS thread
+
+    Under gevent's monkey-patching threading.local is per greenlet, so state
+    kept per connection, e.g. its data version, would be lost with every request.
+    """
+    if gevent_patched():
+        from gevent import monkey
+        return monkey.get_original('threading', 'local')()
+    return threading.local()
+
+
+class Database:
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the database
+
+        Args:
+            path: Database file, defaults to DATABASE_PATH
+        """
+        self.path = path or default_database_path()
+        self.busy_timeout = float(os.getenv('DATABASE_BUSY_TIMEOUT', '5'))
+        self._local = thread_local()
+        self._cooperative = False  # Whether waits for the write lock yield to other greenlets
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; transactions are explicit, see transaction()
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # Durable across process crashes; only an OS crash can lose the last commits
+        connection.execute('PRAGMA synchronous=NORMAL')
+        # Checked here, as gunicorn patches its workers after the app may have been imported
+        self._cooperative = gevent_patched()
+        logger.info(f"Opened SQLite database {self.path}")
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, reopened after a fork"""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.connection = self._connect()
+            self._local.pid = pid
+        return self._local.connection
+
+    def _begin_immediate(self, connection: sqlite3.Connection):
+        if not self._cooperative:
+            connection.execute('BEGIN IMMEDIATE')
+            return
+        # SQLite's busy handler would block every greenlet of the thread while
+        # another worker holds the write lock, so poll for it and sleep in between.
+        # No transaction is open while sleeping, so the greenlets sharing the
+        # connection are unaffected, and statements themselves never yield.
+        from gevent import sleep
+
+        deadline = time.monotonic() + self.busy_timeout
+        delay = 0.001
+        while True:
+            connection.execute('PRAGMA busy_timeout = 0')
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() >= deadline:
+                    raise
+            finally:
+                connection.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+            sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run statements in a write transaction
+
+        The write lock is taken up front (BEGIN IMMEDIATE), so reads inside the
+        transaction see the latest committed state.
+        """
+        connection = self.connection
+        self._begin_immediate(connection)
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def data_version(self) -> int:
+        """
+        Get this connection's data version
+
+        Changes whenever another connection, in this or another process,
+        commits to the database.
+        """
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
@@ -0,0 +1,287 @@
+"""
+Event Hub for TaskFlow Python Backend
+
+Per-user change events (preference and scheduled task changes, summary
+updates, notification delivery status) streamed to clients over
+Server-Sent Events. Events are appended to an SQLite table shared by every
+worker, and one thread per worker reads the new rows and fans them out to
+the connections it holds, so an event reaches a user's connections
+whichever worker published it. Rows are kept for a few minutes, so a
+client reconnecting with Last-Event-ID gets the events it missed.
+
+Each connection only waits on a queue of its own. With gunicorn's gevent
+workers that makes an idle connection a parked greenlet, so a worker holds
+thousands of them; see Deployment in the README.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from database import Database
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_user ON events (user_id, id);
+CREATE INDEX IF NOT EXISTS events_created_at ON events (created_at);
+"""
+
+EVENT_TYPES = ('preferences', 'scheduled_task', 'summary', 'notification')
+
+# Rows read per poll, at most
+FAN_OUT_BATCH_SIZE = 10000
+
+# An event to publish: (user_id, event type, data)
+Event = Tuple[str, str, Dict[str, Any]]
+
+
+def format_event(event_id: int, event_type: str, data: str) -> str:
+    """An event in the text/event-stream format"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id: str, queue_size: int):
+        """Initialize a connection's subscription to a user's events"""
+        self.user_id = user_id
+        self.queue = queue.Queue(queue_size)
+        # Set when the queue overflowed; the stream ends and the client resumes from Last-Event-ID
+        self.closed = False
+
+    def put(self, message: str):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.closed = True
+
+
+class EventHub:
+    def __init__(self, database: Optional[Database] = None, poll_interval: float = 0.25,
+                 retention: float = 300.0, queue_size: int = 256, max_connections: int = 10000,
+                 heartbeat: float = 15.0, coalesce_interval: float = 2.0):
+        """
+        Initialize the event hub
+
+        Args:
+            database: SQLite database, defaults to DATABASE_PATH (opened on first use)
+            poll_interval: Seconds between reads of new events
+            retention: Seconds events are kept for reconnecting clients
+            queue_size: Events buffered per connection before it is closed as too slow
+            max_connections: Maximum number of open streams in this worker
+            heartbeat: Seconds between keep-alive comments on an idle stream
+            coalesce_interval: Seconds coalesced events are held, keeping the latest per user and type
+        """
+        self.database = database or Database()
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.heartbeat = heartbeat
+        self.coalesce_interval = coalesce_interval
+        self._subscribers = {}  # user ID -> subscriptions
+        self._connections = 0
+        self._pending = {}  # (user ID, event type) -> data of the latest coalesced event
+        self._last_id = None  # Highest event ID fanned out, read before the thread starts
+        self._lock = threading.Lock()
+        self._thread = None
+        self._schema_ready = False
+        self._published = metrics.counter(
+            'taskflow_events_published_total', 'Events published to the event streams', ('type',)
+        )
+        self._overflows = metrics.counter(
+            'taskflow_event_stream_overflows_total', 'Event streams closed for falling behind'
+        ).labels()
+        metrics.gauge(
+            'taskflow_event_stream_connections', 'Open event streams in this worker'
+        ).labels().set_function(lambda: self._connections)
+
+    def _ensure_started(self):
+        """Create the table and start the fan-out thread, once"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            if not self._schema_ready:
+                self.database.connection.executescript(SCHEMA)
+                self._schema_ready = True
+            # Before anything is published or subscribed here, so the thread
+            # fans out every later event and reconnects replay the earlier ones
+            self._last_id = self.database.connection.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+            self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+            self._thread.start()
+
+    def publish(self, user_id: str, event_type: str, data: Dict[str, Any]):
+        """
+        Publish an event to a user's streams, in every worker
+
+        Args:
+            user_id: User ID
+            event_type: One of EVENT_TYPES
+            data: JSON-serializable event data
+        """
+        self.publish_many(((user_id, event_type, data),))
+
+    def publish_many(self, events: Iterable[Event]):
+        """
+        Publish events with one write
+
+        Args:
+            events: (user_id, event type, data) of each event
+        """
+        self._ensure_started()
+        now = time.time()
+        rows = [(user_id, event_type, json.dumps(data, separators=(',', ':'), default=str), now)
+                for user_id, event_type, data in events]
+        if not rows:
+            return
+        with self.database.transaction() as connection:
+            connection.executemany('INSERT INTO events (user_id, type, data, created_at) VALUES (?, ?, ?, ?)', rows)
+        for _, event_type, _, _ in rows:
+            self._published.labels(event_type).inc()
+
+    def publish_coalesced(self, user_id: str, event_type: str, data: Dict[str, Any]):
+        """
+        Publish an event within coalesce_interval, replacing one of the same type still held for the user
+
+        For frequent changes where only the latest matters, e.g. summary updates.
+        """
+        self._ensure_started()
+        with self._lock:
+            self._pending[(user_id, event_type)] = data
+
+    def subscribe(self, user_id: str, last_event_id: Optional[int] = None) -> Optional[Subscription]:
+        """
+        Open a subscription to a user's events
+
+        Args:
+            user_id: User ID
+            last_event_id: ID of the last event the client received, to replay the ones after it
+
+        Returns:
+            The subscription, None if this worker has max_connections open already
+        """
+        self._ensure_started()
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            if self._connections >= self.max_connections:
+                return None
+            self._connections += 1
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            if last_event_id is not None:
+                # Under the lock, so the replay comes before any newer event
+                rows = self.database.connection.execute(
+                    'SELECT id, type, data FROM events WHERE user_id = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?',
+                    (user_id, last_event_id, self._last_id, self.queue_size)
+                ).fetchall()
+                for event_id, event_type, data in rows:
+                    subscription.put(format_event(event_id, event_type, data))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+            self._connections -= 1
+
+    def stream(self, subscription: Subscription) -> Iterator[str]:
+        """
+        Yield a subscription's events in the text/event-stream format, until the client goes away
+
+        Ends early if the client falls behind by queue_size events; it then
+        reconnects with Last-Event-ID and resumes.
+        """
+        try:
+            # Reconnect after 3 seconds
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    if subscription.closed:
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield message
+                if subscription.closed and subscription.queue.empty():
+                    self._overflows.inc()
+                    logger.warning(f"Closed a slow event stream of user {subscription.user_id}")
+                    break
+        finally:
+            self.unsubscribe(subscription)
+
+    def _run(self):
+        """Fan-out thread: publish coalesced events, deliver new events, drop expired ones"""
+        connection = self.database.connection
+        data_version = None
+        flushed_at = pruned_at = time.monotonic()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                now = time.monotonic()
+                if self._pending and now - flushed_at >= self.coalesce_interval:
+                    flushed_at = now
+                    with self._lock:
+                        pending, self._pending = self._pending, {}
+                    self.publish_many((user_id, event_type, data) for (user_id, event_type), data in pending.items())
+                    # Our own commits leave data_version as it is
+                    data_version = None
+                if now - pruned_at >= 60:
+                    pruned_at = now
+                    with self.database.transaction() as writer:
+                        writer.execute('DELETE FROM events WHERE created_at < ?', (time.time() - self.retention,))
+
+                # Only read when another connection, in any worker, has committed
+                current = self.database.data_version()
+                if current == data_version:
+                    continue
+                data_version = current
+                self._fan_out(connection)
+            except Exception as e:
+                logger.error(f"Event hub poll failed: {e}")
+
+    def _fan_out(self, connection):
+        while True:
+            rows = connection.execute(
+                'SELECT id, user_id, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?',
+                (self._last_id, FAN_OUT_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                return
+            with self._lock:
+                for event_id, user_id, event_type, data in rows:
+                    subscriptions = self._subscribers.get(user_id)
+                    if subscriptions:
+                        message = format_event(event_id, event_type, data)
+                        for subscription in subscriptions:
+                            subscription.put(message)
+                self._last_id = rows[-1][0]
+            if len(rows) < FAN_OUT_BATCH_SIZE:
+                return
+
+
+# Global instance
+event_hub = EventHub(
+    retention=float(os.getenv('EVENTS_RETENTION', '300')),
+    max_connections=int(os.getenv('EVENTS_MAX_CONNECTIONS', '10000')),
+    heartbeat=float(os.getenv('EVENTS_HEARTBEAT', '15'))
+)
@@ -0,0 +1,118 @@
+"""
+Firebase Admin SDK initialization for TaskFlow Python Backend
+
+The SDK is imported and initialized once, on first use, so importing the
+app does not pay for it.
+"""
+
+import logging
+import os
+import threading
+
+from startup import startup_timer
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_app = None
+
+
+def _service_account_info():
+    project_id = os.getenv('FIREBASE_PROJECT_ID')
+    private_key = os.getenv('FIREBASE_PRIVATE_KEY')
+    client_email = os.getenv('FIREBASE_CLIENT_EMAIL')
+    if not (project_id and private_key and client_email):
+        return None
+    return {
+        "type": "service_account",
+        "project_id": project_id,
+        "private_key": private_key.replace('\\n', '\n'),
+        "client_email": client_email,
+        "client_id": os.getenv('FIREBASE_CLIENT_ID', ''),
+        "auth_uri": os.getenv('FIREBASE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
+        "token_uri": os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
+        "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_X509_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs'),
+        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_X509_CERT_URL', '')
+    }
+
+
+def _init_gevent_grpc():
+    """Let gRPC, which Firestore uses, cooperate with gevent in gunicorn's gevent workers"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if monkey.is_module_patched('socket'):
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+        logger.info("Initialized gRPC for gevent")
+
+
+def get_firebase_app():
+    """
+    Get the default Firebase app, initializing the Admin SDK on first use
+
+    Uses serviceAccountKey.json if present, then the FIREBASE_* environment
+    variables, then application default credentials.
+
+    Returns:
+        Firebase app
+    """
+    global _app
+    if _app is not None:
+        return _app
+
+    with _lock:
+        if _app is not None:
+            return _app
+
+        with startup_timer.phase('firebase'):
+            # Before any gRPC channel is created
+            _init_gevent_grpc()
+            import firebase_admin
+            from firebase_admin import credentials
+
+            if firebase_admin._apps:
+                _app = firebase_admin.get_app()
+                return _app
+
+            service_account_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serviceAccountKey.json')
+            if os.path.exists(service_account_path):
+                _app = firebase_admin.initialize_app(credentials.Certificate(service_account_path))
+                logger.info("Firebase Admin SDK initialized successfully with service account key")
+            elif _service_account_info() is not None:
+                _app = firebase_admin.initialize_app(credentials.Certificate(_service_account_info()))
+                logger.info("Firebase Admin SDK initialized successfully with environment variables")
+            else:
+                logger.warning("Service account key not found and environment variables not set, using default credentials")
+                _app = firebase_admin.initialize_app()
+        return _app
+
+
+def verify_id_token(token: str) -> dict:
+    """
+    Verify a Firebase ID token
+
+    Args:
+        token: Firebase ID token
+
+    Returns:
+        Decoded token claims
+    """
+    get_firebase_app()
+    from firebase_admin import auth
+    return auth.verify_id_token(token)
+
+
+def is_invalid_id_token_error(error: Exception) -> bool:
+    """
+    Check whether an exception is a Firebase invalid ID token error
+
+    Args:
+        error: Raised exception
+
+    Returns:
+        Whether the token itself was rejected
+    """
+    from firebase_admin import auth
+    return isinstance(error, auth.InvalidIdTokenError)
@@ -0,0 +1,421 @@
+"""
+Firestore Store for TaskFlow Python Backend
+
+Read access to the workspaces, projects and tasks the app keeps in Firestore
+(workspaces/{id}/projects/{id}/tasks/{id}), behind a bounded LRU cache whose
+entries expire after a TTL. Reading a path also starts an on_snapshot
+listener on it (a project's tasks, a workspace's projects, a project or
+workspace document), which evicts the cached entries its changes touch, so
+within a worker the cache follows writes made by the apps, and passes the
+changes on to subscribers. The number of listeners is bounded too; paths
+without one rely on the TTL. Set FIRESTORE_EMULATOR_HOST to use the
+Firestore emulator.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from firebase_app import get_firebase_app
+from memory_tracker import memory_tracker
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKSPACES = 'workspaces'
+PROJECTS = 'projects'
+TASKS = 'tasks'
+
+# Documents per get_all call
+GET_ALL_BATCH_SIZE = 300
+
+# A task, by its path IDs
+TaskKey = Tuple[str, str, str]
+
+_MISSING = object()
+
+
+def _firestore_client():
+    """Create a Firestore client, importing the SDK on first use"""
+    from firebase_admin import firestore
+    return firestore.client(get_firebase_app())
+
+
+def workspace_path(workspace_id: str) -> str:
+    return f"{WORKSPACES}/{workspace_id}"
+
+
+def project_path(workspace_id: str, project_id: str) -> str:
+    return f"{workspace_path(workspace_id)}/{PROJECTS}/{project_id}"
+
+
+def tasks_path(workspace_id: str, project_id: str) -> str:
+    return f"{project_path(workspace_id, project_id)}/{TASKS}"
+
+
+def task_path(workspace_id: str, project_id: str, task_id: str) -> str:
+    return f"{tasks_path(workspace_id, project_id)}/{task_id}"
+
+
+def _document_data(snapshot) -> Optional[Dict[str, Any]]:
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    data.setdefault("id", snapshot.id)
+    return data
+
+
+class FirestoreStore:
+    def __init__(self, client=None, cache_size: int = 10000, ttl: float = 60.0, max_listeners: int = 100):
+        """
+        Initialize the Firestore store
+
+        Args:
+            client: Firestore client, created on first use by default
+            cache_size: Maximum number of documents and task lists kept in the cache
+            ttl: Seconds a cached entry is served, at most
+            max_listeners: Maximum number of on_snapshot listeners
+        """
+        self._client = client
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.max_listeners = max_listeners
+        self._cache = OrderedDict()  # path -> (document data or task list, None if missing; expiry)
+        self._listeners = OrderedDict()  # watched path -> watch
+        self._listener_ids = {}  # watched path -> ID, new for every listener started
+        self._next_listener_id = itertools.count(1)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        # Path -> token of the read in progress, dropped by an invalidation so the read is not cached
+        self._pending = {}
+        requests = metrics.counter(
+            'taskflow_firestore_cache_requests_total', 'Firestore store reads by cache result', ('result',)
+        )
+        self._hits = requests.labels('hit')
+        self._misses = requests.labels('miss')
+        memory_tracker.track('firestore_cache', lambda: self._cache)
+
+    @property
+    def client(self):
+        """The Firestore client, created on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = _firestore_client()
+        return self._client
+
+    def _cached(self, path: str) -> Any:
+        # Caller holds the lock
+        entry = self._cache.get(path)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[path]
+            return _MISSING
+        self._cache.move_to_end(path)
+        return value
+
+    def _cache_put(self, path: str, value: Any):
+        # Caller holds the lock
+        self._cache[path] = (value, time.monotonic() + self.ttl)
+        self._cache.move_to_end(path)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read_through(self, path: str, watched_path: Optional[str], read):
+        """Serve path from the cache, else read it and cache it"""
+        with self._lock:
+            value = self._cached(path)
+            if value is _MISSING:
+                token = self._pending[path] = object()
+        if value is not _MISSING:
+            self._hits.inc()
+            return value
+
+        self._misses.inc()
+        if watched_path is not None:
+            self._watch(watched_path)
+        value = read()
+        with self._lock:
+            if self._pending.get(path) is token:
+                del self._pending[path]
+                self._cache_put(path, value)
+        return value
+
+    def _watch(self, path: str):
+        """Listen to a collection or document, if not already listening"""
+        with self._lock:
+            if path in self._listeners:
+                self._listeners.move_to_end(path)
+                return
+            # Reserved, so concurrent readers start one listener
+            self._listeners[path] = None
+            listener_id = self._listener_ids[path] = next(self._next_listener_id)
+            evicted = []
+            while len(self._listeners) > self.max_listeners:
+                evicted.append(self._listeners.popitem(last=False))
+                self._listener_ids.pop(evicted[-1][0], None)
+
+        for evicted_path, watch in evicted:
+            if watch is not None:
+                watch.unsubscribe()
+            self.invalidate(evicted_path)
+        try:
+            reference = self._reference(path)
+            watch = reference.on_snapshot(self._on_snapshot)
+        except Exception as e:
+            # Served with the TTL alone
+            logger.error(f"Failed to listen to {path}: {e}")
+            watch = None
+            with self._lock:
+                if self._listener_ids.get(path) == listener_id:
+                    del self._listener_ids[path]
+        with self._lock:
+            if path in self._listeners:
+                self._listeners[path] = watch
+                return
+        # Evicted while starting
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _reference(self, path: str):
+        segments = path.split('/')
+        if len(segments) % 2:
+            return self.client.collection(path)
+        return self.client.document(path)
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        """Listener callback: evict every document changed and the list holding it, then tell the subscribers"""
+        # The first snapshot lists every document as added, which also evicts
+        # anything read between starting the listener and its first snapshot
+        documents = {}
+        for change in changes:
+            snapshot = change.document
+            documents[snapshot.reference.path] = None if change.type.name == 'REMOVED' else _document_data(snapshot)
+        if not documents:
+            return
+        self.invalidate(*documents, *{path.rsplit('/', 1)[0] for path in documents})
+        for subscriber in self._subscribers:
+            for path, data in documents.items():
+                try:
+                    subscriber(path, data)
+                except Exception as e:
+                    logger.error(f"Firestore change subscriber failed on {path}: {e}")
+
+    def subscribe(self, callback: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """
+        Call a function with every document change the listeners see
+
+        Args:
+            callback: Called with the document path and its data, None if it was deleted
+        """
+        self._subscribers.append(callback)
+
+    def listener_id(self, path: str) -> Optional[int]:
+        """
+        ID of the listener on a path, None if there is none
+
+        A different ID means changes may have been missed in between.
+        """
+        return self._listener_ids.get(path)
+
+    def invalidate(self, *paths: str):
+        """
+        Evict cached entries, e.g. after writing to Firestore
+
+        Args:
+            paths: Document paths, or task collection paths for task lists
+        """
+        with self._lock:
+            for path in paths:
+                self._cache.pop(path, None)
+                self._pending.pop(path, None)
+
+    @metrics.timed('firestore')
+    def get_workspace(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a workspace
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Args:
+            workspace_id: Workspace ID
+
+        Returns:
+            Workspace data, None if it does not exist
+        """
+        path = workspace_path(workspace_id)
+        return self._read_through(path, path, lambda: _document_data(self.client.document(path).get()))
+
+    @metrics.timed('firestore')
+    def get_project(self, workspace_id: str, project_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a project
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Args:
+            workspace_id: Workspace ID
+            project_id: Project ID
+
+        Returns:
+            Project data, None if it does not exist
+        """
+        path = project_path(workspace_id, project_id)
+        return self._read_through(path, path, lambda: _document_data(self.client.document(path).get()))
+
+    @metrics.timed('firestore')
+    def get_task(self, workspace_id: str, project_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a task
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Args:
+            workspace_id: Workspace ID
+            project_id: Project ID
+            task_id: Task ID
+
+        Returns:
+            Task data, None if it does not exist
+        """
+        path = task_path(workspace_id, project_id, task_id)
+        return self._read_through(path, tasks_path(workspace_id, project_id),
+                                  lambda: _document_data(self.client.document(path).get()))
+
+    @metrics.timed('firestore')
+    def get_project_tasks(self, workspace_id: str, project_id: str) -> List[Dict[str, Any]]:
+        """
+        Get every task of a project
+
+        The returned list and dicts are shared with the cache and must not be modified.
+
+        Args:
+            workspace_id: Workspace ID
+            project_id: Project ID
+
+        Returns:
+            Task data
+        """
+        path = tasks_path(workspace_id, project_id)
+        return self._read_through(path, path, lambda: [
+            _document_data(snapshot) for snapshot in self.client.collection(path).stream()
+        ])
+
+    @metrics.timed('firestore')
+    def get_user_workspaces(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the workspaces a user owns or is a member of
+
+        Cached with the TTL alone, as the queries span every workspace.
+        The returned list and dicts are shared with the cache and must not be modified.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Workspace data
+        """
+        def read():
+            from google.cloud.firestore_v1.base_query import FieldFilter
+
+            workspaces = {}
+            collection = self.client.collection(WORKSPACES)
+            for query_filter in (FieldFilter('ownerId', '==', user_id), FieldFilter('members', 'array_contains', user_id)):
+                for snapshot in collection.where(filter=query_filter).stream():
+                    workspaces.setdefault(snapshot.id, _document_data(snapshot))
+            return list(workspaces.values())
+
+        return self._read_through(f"{WORKSPACES}?user={user_id}", None, read)
+
+    @metrics.timed('firestore')
+    def get_workspace_projects(self, workspace_id: str) -> List[Dict[str, Any]]:
+        """
+        Get every project of a workspace
+
+        The returned list and dicts are shared with the cache and must not be modified.
+
+        Args:
+            workspace_id: Workspace ID
+
+        Returns:
+            Project data
+        """
+        path = f"{workspace_path(workspace_id)}/{PROJECTS}"
+        return self._read_through(path, path, lambda: [
+            _document_data(snapshot) for snapshot in self.client.collection(path).stream()
+        ])
+
+    @metrics.timed('firestore')
+    def get_tasks(self, keys: Iterable[TaskKey], fresh: bool = False) -> Dict[TaskKey, Optional[Dict[str, Any]]]:
+        """
+        Get many tasks, reading the ones not cached with batched get_all calls
+
+        The returned dicts are shared with the cache and must not be modified.
+
+        Args:
+            keys: (workspace ID, project ID, task ID) of each task
+            fresh: Read every task from Firestore, e.g. before writing it back
+
+        Returns:
+            Task data by key, None for tasks that do not exist
+        """
+        tasks = {}
+        missing = {}
+        token = object()
+        with self._lock:
+            for key in keys:
+                path = task_path(*key)
+                value = _MISSING if fresh else self._cached(path)
+                if value is _MISSING:
+                    missing[path] = key
+                    self._pending[path] = token
+                else:
+                    tasks[key] = value
+        if tasks:
+            self._hits.inc(len(tasks))
+        if not missing:
+            return tasks
+
+        self._misses.inc(len(missing))
+        for workspace_id, project_id in {key[:2] for key in missing.values()}:
+            self._watch(tasks_path(workspace_id, project_id))
+        paths = list(missing)
+        read = {}
+        for start in range(0, len(paths), GET_ALL_BATCH_SIZE):
+            references = [self.client.document(path) for path in paths[start:start + GET_ALL_BATCH_SIZE]]
+            for snapshot in self.client.get_all(references):
+                read[snapshot.reference.path] = _document_data(snapshot)
+        with self._lock:
+            for path, key in missing.items():
+                value = read.get(path)
+                tasks[key] = value
+                if self._pending.get(path) is token:
+                    del self._pending[path]
+                    self._cache_put(path, value)
+        return tasks
+
+    def close(self):
+        """Stop every listener"""
+        with self._lock:
+            listeners = list(self._listeners.values())
+            self._listeners.clear()
+            self._listener_ids.clear()
+            self._cache.clear()
+            self._pending.clear()
+        for watch in listeners:
+            if watch is not None:
+                watch.unsubscribe()
+
+
+# Global instance
+firestore_store = FirestoreStore(
+    cache_size=int(os.getenv('FIRESTORE_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('FIRESTORE_CACHE_TTL', '60')),
+    max_listeners=int(os.getenv('FIRESTORE_MAX_LISTENERS', '100'))
+)
@@ -0,0 +1,108 @@
+"""
+JSON Provider for TaskFlow Python Backend
+"""
+
+import logging
+import os
+from collections.abc import Mapping
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the deployment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _taskflow_default(o: Any) -> Any:
+    # Read-only mappings such as UserPreferences serialize as objects
+    if isinstance(o, Mapping):
+        return dict(o)
+    return _default(o)
+
+
+class TaskFlowJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib JSON provider, also serializing any Mapping as an object"""
+
+    default = staticmethod(_taskflow_default)
+
+
+class OrjsonProvider(TaskFlowJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    Used for both ``request.get_json`` and ``jsonify`` responses. Types orjson
+    does not handle natively (and datetimes, to keep the HTTP date format of
+    the stdlib provider) go through Flask's default serializer.
+    """
+
+    sort_keys = False
+
+    def _options(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Serialize data as JSON to a string
+
+        Args:
+            obj: The data to serialize
+            kwargs: Only ``indent`` is honoured, the rest are stdlib-specific
+
+        Returns:
+            JSON string
+        """
+        option = self._options(indent=bool(kwargs.get("indent")))
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        """
+        Deserialize data as JSON from a string or bytes
+
+        Args:
+            s: Text or UTF-8 bytes
+
+        Returns:
+            Deserialized data
+        """
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        """
+        Serialize the given arguments straight to response bytes
+
+        Skips the str round trip of the default provider.
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        option = self._options(indent=indent) | orjson.OPT_APPEND_NEWLINE
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option),
+            mimetype=self.mimetype
+        )
+
+
+def get_json_provider_class():
+    """
+    Select the JSON provider from the JSON_PROVIDER environment variable
+
+    Falls back to the stdlib provider when orjson is not installed or
+    JSON_PROVIDER is set to ``stdlib``.
+
+    Returns:
+        JSON provider class
+    """
+    requested = os.getenv('JSON_PROVIDER', 'orjson').lower()
+    if requested == 'orjson':
+        if orjson is not None:
+            return OrjsonProvider
+        logger.warning("orjson is not installed, falling back to the stdlib JSON provider")
+    return TaskFlowJSONProvider
@@ -0,0 +1,56 @@
+"""
+Leader Lock for TaskFlow Python Backend
+
+Every worker process schedules the same jobs, but only the one holding an
+exclusive lock on a file runs them. The lock is released when its process
+exits, and the next worker to check takes over.
+"""
+
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    def __init__(self, path: str):
+        """
+        Initialize the leader lock
+
+        Args:
+            path: Lock file, shared by every worker
+        """
+        self.path = path
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        """Whether this process is the leader, trying to become it if nobody is"""
+        if fcntl is None:
+            return True
+        if self._file is not None and self._pid == os.getpid():
+            return True
+
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                return True
+            # A lock inherited through fork belongs to the parent
+            self._file = None
+            lock_file = open(self.path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+            self._pid = os.getpid()
+            logger.info(f"Process {self._pid} is now the scheduler leader")
+            return True
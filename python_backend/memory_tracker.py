@@ -0,0 +1,348 @@
+"""
+Memory Tracker for TaskFlow Python Backend
+
+Accounts for the memory held by the in-memory stores (analytics events,
+preference caches and indexes, scheduled tasks, rate limiter windows, search
+indexes), exported as per-store item and byte gauges next to the process
+RSS. Byte counts are estimates: each container is measured on a sample of
+its items, extrapolated to its length, so a scrape costs the same at 10^3
+or 10^7 items.
+
+For growth the gauges do not explain, tracemalloc snapshots taken through
+the admin endpoints are kept as per-line statistics and diffed, grouped by
+the module that allocated the memory. Both are per worker.
+"""
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Items of each container measured to estimate its size
+SAMPLE_SIZE = 64
+
+# Containers are measured this many levels deep; deeper objects count at their shallow size
+MAX_DEPTH = 10
+
+# Snapshots kept per worker; the oldest are dropped
+MAX_SNAPSHOTS = 10
+
+# Most frames tracemalloc may store per allocation
+MAX_FRAMES = 25
+
+GROUP_BY = ('module', 'line')
+
+_ATOMIC = (str, bytes, int, float, bool, type(None))
+
+# Allocations of the import machinery and of tracemalloc itself are left out
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def estimate_size(obj: Any, sample_size: int = SAMPLE_SIZE) -> int:
+    """
+    Estimate the bytes held by an object and everything it references
+
+    Containers are measured on up to sample_size items (spread over
+    sequences, the first ones of mappings and sets) and the result scaled to
+    their length. Objects shared between items are counted once per sample.
+
+    Args:
+        obj: Object to measure
+        sample_size: Items measured per container
+
+    Returns:
+        Estimated size in bytes
+    """
+    return _estimate(obj, sample_size, set(), 0)
+
+
+def _estimate(obj: Any, sample_size: int, seen: set, depth: int) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        # NumPy arrays; views do not count their base's data in getsizeof
+        return max(size, nbytes)
+    if isinstance(obj, _ATOMIC) or depth >= MAX_DEPTH:
+        return size
+
+    if isinstance(obj, Mapping):
+        count = len(obj)
+        sample = [item for pair in itertools.islice(obj.items(), sample_size) for item in pair]
+        per_item = 2
+    elif isinstance(obj, (list, tuple, deque)):
+        count = len(obj)
+        step = max(1, count // sample_size)
+        sample = [obj[index] for index in range(0, count, step)][:sample_size]
+        per_item = 1
+    elif isinstance(obj, (set, frozenset)):
+        count = len(obj)
+        sample = list(itertools.islice(obj, sample_size))
+        per_item = 1
+    elif hasattr(obj, '__dict__') and not callable(obj) and not isinstance(obj, ModuleType):
+        # Instances, not the functions, classes and modules they refer to
+        return size + _estimate(vars(obj), sample_size, seen, depth + 1)
+    elif hasattr(type(obj), '__slots__'):
+        values = [getattr(obj, name) for name in type(obj).__slots__ if hasattr(obj, name)]
+        return size + sum(_estimate(value, sample_size, seen, depth + 1) for value in values)
+    else:
+        return size
+
+    if not sample:
+        return size
+    measured = sum(_estimate(item, sample_size, seen, depth + 1) for item in sample)
+    return size + measured * count * per_item // len(sample)
+
+
+def resident_memory() -> int:
+    """Resident set size of this process in bytes, its peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@lru_cache(maxsize=4096)
+def module_name(filename: str) -> str:
+    """The dotted module name of a source file, by the sys.path entry it is under"""
+    for entry in sorted((os.path.abspath(path) for path in sys.path), key=len, reverse=True):
+        if filename.startswith(entry + os.sep):
+            relative = os.path.splitext(filename[len(entry) + 1:])[0]
+            parts = relative.split(os.sep)
+            if parts[-1] == '__init__':
+                parts.pop()
+            return '.'.join(parts) or filename
+    if filename.startswith('<'):
+        return filename
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+class TrackedStore:
+    def __init__(self, name: str, containers: Callable[[], Any], items: Optional[Callable[[], int]]):
+        """Initialize a tracked store"""
+        self.name = name
+        self.containers = containers
+        self.items = items or (lambda: len(containers()))
+        # Last estimate, reported while the store changes under a measurement
+        self.bytes = 0
+
+    def estimate(self) -> int:
+        try:
+            self.bytes = estimate_size(self.containers())
+        except (RuntimeError, IndexError):
+            # Resized by another thread while sampled
+            pass
+        return self.bytes
+
+
+class MemorySnapshot:
+    def __init__(self, snapshot_id: int, snapshot: tracemalloc.Snapshot):
+        """Keep the per-line statistics of a tracemalloc snapshot, not its traces"""
+        self.id = snapshot_id
+        self.taken_at = time.time()
+        self.frames = snapshot.traceback_limit
+        self.lines = {}  # (filename, line number) -> (bytes, blocks)
+        for statistic in snapshot.filter_traces(_SNAPSHOT_FILTERS).statistics('lineno'):
+            frame = statistic.traceback[0]
+            self.lines[(frame.filename, frame.lineno)] = (statistic.size, statistic.count)
+        self.size = sum(size for size, _ in self.lines.values())
+
+    def grouped(self, group_by: str) -> Dict[str, Tuple[int, int]]:
+        """Bytes and blocks allocated per module, or per line"""
+        if group_by == 'line':
+            return {f"{filename}:{lineno}": value for (filename, lineno), value in self.lines.items()}
+        groups = {}
+        for (filename, _), (size, count) in self.lines.items():
+            name = module_name(filename)
+            total_size, total_count = groups.get(name, (0, 0))
+            groups[name] = (total_size + size, total_count + count)
+        return groups
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "takenAt": self.taken_at,
+            "frames": self.frames,
+            "size": self.size
+        }
+
+
+class MemoryTracker:
+    def __init__(self):
+        """Initialize the memory tracker"""
+        self.stores = {}  # name -> TrackedStore
+        self.snapshots = {}  # snapshot ID -> MemorySnapshot, oldest first
+        self._snapshot_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._items = metrics.gauge(
+            'taskflow_memory_store_items', 'Items held by an in-memory store', ('store',)
+        )
+        self._bytes = metrics.gauge(
+            'taskflow_memory_store_bytes', 'Estimated bytes held by an in-memory store', ('store',)
+        )
+        metrics.gauge(
+            'taskflow_process_resident_memory_bytes', 'Resident set size of this worker'
+        ).labels().set_function(resident_memory)
+
+    def track(self, name: str, containers: Callable[[], Any], items: Optional[Callable[[], int]] = None):
+        """
+        Account for the memory of an in-memory store
+
+        Args:
+            name: Store name, the store label of the gauges; tracking a name again replaces it
+            containers: Returns what the store holds, e.g. a dict or a tuple of its containers
+            items: Returns the number of items in the store, defaults to len(containers())
+        """
+        store = TrackedStore(name, containers, items)
+        self.stores[name] = store
+        self._items.labels(name).set_function(store.items)
+        self._bytes.labels(name).set_function(store.estimate)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Report the memory of this worker
+
+        Returns:
+            RSS, each store's items and estimated bytes, largest first, and
+            tracemalloc's traced memory when it is tracing
+        """
+        stores = []
+        for store in list(self.stores.values()):
+            try:
+                stores.append({"store": store.name, "items": store.items(), "bytes": store.estimate()})
+            except Exception as e:
+                logger.error(f"Failed to measure store {store.name}: {e}")
+        stores.sort(key=lambda store: store["bytes"], reverse=True)
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "pid": os.getpid(),
+            "residentBytes": resident_memory(),
+            "stores": stores,
+            "tracemalloc": {
+                "tracing": tracemalloc.is_tracing(),
+                "frames": tracemalloc.get_traceback_limit(),
+                "tracedBytes": traced,
+                "peakBytes": peak,
+                "snapshots": len(self.snapshots)
+            }
+        }
+
+    def take_snapshot(self, frames: int = 1) -> Dict[str, Any]:
+        """
+        Take a tracemalloc snapshot, starting tracing first if needed
+
+        Memory allocated before tracing started is not traced, so the first
+        snapshot is a baseline to diff later ones against.
+
+        Args:
+            frames: Frames stored per allocation when tracing starts (1 to MAX_FRAMES)
+
+        Returns:
+            The snapshot's description with its 20 largest modules, and
+            whether tracing started with it
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(max(1, min(frames, MAX_FRAMES)))
+            logger.info(f"Started tracing memory allocations with {tracemalloc.get_traceback_limit()} frames")
+        snapshot = MemorySnapshot(next(self._snapshot_ids), tracemalloc.take_snapshot())
+        with self._lock:
+            self.snapshots[snapshot.id] = snapshot
+            while len(self.snapshots) > MAX_SNAPSHOTS:
+                del self.snapshots[next(iter(self.snapshots))]
+        modules = sorted(snapshot.grouped('module').items(), key=lambda item: item[1][0], reverse=True)
+        return dict(
+            snapshot.describe(),
+            pid=os.getpid(),
+            tracingStarted=started,
+            modules=[{"group": name, "size": size, "count": count} for name, (size, count) in modules[:20]]
+        )
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """
+        List the snapshots kept, oldest first
+
+        Returns:
+            Snapshot descriptions
+        """
+        with self._lock:
+            return [snapshot.describe() for snapshot in self.snapshots.values()]
+
+    def diff(self, snapshot_id: int, base_id: Optional[int] = None, group_by: str = 'module',
+             limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Compare a snapshot with an earlier one
+
+        Args:
+            snapshot_id: Snapshot ID
+            base_id: ID of the snapshot to compare with, defaults to the one taken before
+            group_by: 'module' or 'line'
+            limit: Maximum number of groups returned
+
+        Returns:
+            The groups that changed most, by the absolute change in bytes, and
+            the total change; None if either snapshot is not kept
+        """
+        with self._lock:
+            snapshot = self.snapshots.get(snapshot_id)
+            if base_id is None:
+                base_id = max((other for other in self.snapshots if other < snapshot_id), default=None)
+            base = self.snapshots.get(base_id)
+        if snapshot is None or base is None:
+            return None
+
+        after, before = snapshot.grouped(group_by), base.grouped(group_by)
+        changes = []
+        for name in after.keys() | before.keys():
+            size, count = after.get(name, (0, 0))
+            base_size, base_count = before.get(name, (0, 0))
+            if size != base_size or count != base_count:
+                changes.append({
+                    "group": name,
+                    "size": size,
+                    "sizeDiff": size - base_size,
+                    "count": count,
+                    "countDiff": count - base_count
+                })
+        changes.sort(key=lambda change: abs(change["sizeDiff"]), reverse=True)
+        return {
+            "pid": os.getpid(),
+            "snapshot": snapshot.id,
+            "base": base.id,
+            "groupBy": group_by,
+            "sizeDiff": snapshot.size - base.size,
+            "groups": changes[:limit]
+        }
+
+    def stop(self):
+        """Stop tracing and drop the snapshots"""
+        tracemalloc.stop()
+        with self._lock:
+            self.snapshots.clear()
+
+
+# Global instance
+memory_tracker = MemoryTracker()
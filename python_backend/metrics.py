@@ -0,0 +1,461 @@
+"""
+Metrics for TaskFlow Python Backend
+
+Latency histograms, counters and gauges rendered in the Prometheus text
+exposition format.
+"""
+
+import inspect
+import logging
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import after_this_request, request
+
+logger = logging.getLogger(__name__)
+
+# Histograms use HDR-style log-linear buckets over whole microseconds:
+# exact buckets below 2**SUB_BUCKET_BITS, then 2**SUB_BUCKET_BITS linear
+# sub-buckets per power of two (at most 12.5% relative error).
+SUB_BUCKET_BITS = 3
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 36  # ~19 hours in microseconds
+BUCKET_COUNT = (MAX_EXPONENT - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+MAX_MICROS = (1 << (MAX_EXPONENT + 1)) - 1
+
+# Bucket boundaries exported to Prometheus, in seconds: powers of two from 16us to ~67s
+EXPORTED_BOUNDS = [(1 << exponent) / 1e6 for exponent in range(4, 27)]
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < SUB_BUCKET_COUNT:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + (micros >> shift) - SUB_BUCKET_COUNT
+
+
+def _bucket_upper_bound(index: int) -> int:
+    """Exclusive upper bound of a bucket, in microseconds"""
+    if index < SUB_BUCKET_COUNT:
+        return index + 1
+    shift = index // SUB_BUCKET_COUNT - 1
+    mantissa = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+    return (mantissa + 1) << shift
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the gauge value from a callback at scrape time"""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception as e:
+                logger.error(f"Failed to read gauge callback: {e}")
+                return float('nan')
+        return self._value
+
+
+class Histogram:
+    def __init__(self):
+        self._counts = [0] * BUCKET_COUNT
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """
+        Record a duration
+
+        Args:
+            seconds: Duration in seconds
+        """
+        micros = int(seconds * 1e6)
+        if micros < SUB_BUCKET_COUNT:
+            index = micros if micros > 0 else 0
+        else:
+            if micros > MAX_MICROS:
+                micros = MAX_MICROS
+            shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+            index = (shift + 1) * SUB_BUCKET_COUNT + (micros >> shift) - SUB_BUCKET_COUNT
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            if seconds > self._max:
+                self._max = seconds
+
+    def time(self):
+        """Context manager that observes the duration of its block"""
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile from the bucket counts
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            Upper bound of the bucket holding the quantile, in seconds
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if total == 0:
+            return 0.0
+        rank = max(1, int(q * total + 0.5))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_upper_bound(index) / 1e6, self._max)
+        return self._max
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Summarize the histogram
+
+        Returns:
+            Count, sum, mean, max and p50/p90/p99 in seconds
+        """
+        count = self._count
+        return {
+            "count": count,
+            "sum": round(self._sum, 6),
+            "mean": round(self._sum / count, 6) if count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self._max, 6)
+        }
+
+    def cumulative_buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative counts at the exported bucket boundaries"""
+        with self._lock:
+            counts = list(self._counts)
+        result = []
+        cumulative = 0
+        index = 0
+        for bound in EXPORTED_BOUNDS:
+            bound_micros = int(bound * 1e6)
+            while index < BUCKET_COUNT and _bucket_upper_bound(index) <= bound_micros:
+                cumulative += counts[index]
+                index += 1
+            result.append((bound, cumulative))
+        return result
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class MetricFamily:
+    def __init__(self, name: str, documentation: str, metric_type: str, labelnames: Sequence[str]):
+        """Initialize a metric family"""
+        self.name = name
+        self.documentation = documentation
+        self.type = metric_type
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._factory = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}[metric_type]
+
+    def labels(self, *values):
+        """
+        Get the child metric for a set of label values
+
+        Args:
+            values: Label values, in the order of the family's label names
+
+        Returns:
+            Counter, Gauge or Histogram
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._factory()
+                    self._children[values] = child
+        return child
+
+    def items(self):
+        return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self.items(), key=lambda item: item[0]):
+            if self.type == 'histogram':
+                for bound, cumulative in child.cumulative_buckets():
+                    labels = _format_labels(self.labelnames, values, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {child.count}")
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(child._sum)}")
+                lines.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}{labels} {_format_value(child.value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize the metrics registry"""
+        self._families = {}
+        self._lock = threading.Lock()
+
+        self.http_duration = self.histogram(
+            'taskflow_http_request_duration_seconds', 'HTTP request latency by endpoint',
+            ('endpoint', 'method', 'status')
+        )
+        self.http_in_flight = self.gauge(
+            'taskflow_http_requests_in_flight', 'HTTP requests currently being handled', ('endpoint',)
+        )
+        self.service_duration = self.histogram(
+            'taskflow_service_call_duration_seconds', 'Service method latency', ('component', 'method')
+        )
+        self.service_errors = self.counter(
+            'taskflow_service_call_errors_total', 'Service method calls that raised', ('component', 'method')
+        )
+
+    def _family(self, name: str, documentation: str, metric_type: str, labelnames: Sequence[str]) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, documentation, metric_type, labelnames)
+                self._families[name] = family
+            return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        """Get or create a counter family"""
+        return self._family(name, documentation, 'counter', labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        """Get or create a gauge family"""
+        return self._family(name, documentation, 'gauge', labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        """Get or create a histogram family"""
+        return self._family(name, documentation, 'histogram', labelnames)
+
+    def timed(self, component: str):
+        """
+        Decorator recording the latency and errors of a service method
+
+        A generator function is timed over its whole iteration, leaving out
+        the caller's time between items.
+
+        Args:
+            component: Component label, e.g. 'notification'
+        """
+        def decorator(f):
+            histogram = self.service_duration.labels(component, f.__name__)
+            errors = self.service_errors.labels(component, f.__name__)
+
+            if inspect.isgeneratorfunction(f):
+                @wraps(f)
+                def decorated_generator(*args, **kwargs):
+                    generator = f(*args, **kwargs)
+                    elapsed = 0.0
+                    try:
+                        while True:
+                            start = time.perf_counter()
+                            try:
+                                item = next(generator)
+                            except StopIteration:
+                                return
+                            except Exception:
+                                errors.inc()
+                                raise
+                            finally:
+                                elapsed += time.perf_counter() - start
+                            yield item
+                    finally:
+                        generator.close()
+                        histogram.observe(elapsed)
+                return decorated_generator
+
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return decorated_function
+        return decorator
+
+    def observe_request(self, endpoint: Optional[str], method: str, status: int, seconds: float):
+        """
+        Record a handled HTTP request
+
+        Args:
+            endpoint: Flask endpoint name, or None for unmatched URLs
+            method: HTTP method
+            status: Response status code
+            seconds: Handling time in seconds
+        """
+        self.http_duration.labels(endpoint or 'unmatched', method, str(status)).observe(seconds)
+
+    def instrument_view(self, endpoint: str, view: Callable, method: Optional[str] = None) -> Callable:
+        """
+        Wrap a view function with latency, status and in-flight accounting
+
+        Args:
+            endpoint: Flask endpoint name
+            view: View function, including its auth and rate-limit decorators
+            method: The endpoint's only HTTP method, if it has exactly one
+
+        Returns:
+            Instrumented view function
+        """
+        in_flight = self.http_in_flight.labels(endpoint)
+        histograms = {}
+
+        def histogram_for(status):
+            request_method = method or request.method
+            key = (request_method, status)
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = self.http_duration.labels(endpoint, request_method, str(status))
+                histograms[key] = histogram
+            return histogram
+
+        @wraps(view)
+        def instrumented_view(*args, **kwargs):
+            start = time.perf_counter()
+            in_flight.inc()
+            try:
+                rv = view(*args, **kwargs)
+            except Exception:
+                # Flask's error handlers turn it into a response, e.g. a 401 from
+                # flask_jwt_extended or an abort(404); record the status that is sent
+                @after_this_request
+                def observe_error(response):
+                    histogram_for(response.status_code).observe(time.perf_counter() - start)
+                    return response
+                raise
+            finally:
+                in_flight.dec()
+            if type(rv) is tuple:
+                status = rv[1] if len(rv) > 1 and isinstance(rv[1], int) else getattr(rv[0], 'status_code', 200)
+            else:
+                status = getattr(rv, 'status_code', 200)
+            histogram_for(status).observe(time.perf_counter() - start)
+            return rv
+        return instrumented_view
+
+    def init_app(self, app):
+        """
+        Instrument every route of a Flask app
+
+        Must be called after all routes have been registered.
+
+        Args:
+            app: Flask application
+        """
+        methods = {}
+        for rule in app.url_map.iter_rules():
+            methods.setdefault(rule.endpoint, set()).update(rule.methods - {'HEAD', 'OPTIONS'})
+
+        for endpoint, view in list(app.view_functions.items()):
+            if endpoint == 'static':
+                continue
+            endpoint_methods = methods.get(endpoint, set())
+            method = next(iter(endpoint_methods)) if len(endpoint_methods) == 1 else None
+            app.view_functions[endpoint] = self.instrument_view(endpoint, view, method)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Returns:
+            Exposition text
+        """
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global instance
+metrics = MetricsRegistry()
@@ -2,71 +2,39 @@
 Notification Service for TaskFlow Python Backend
 """
 
-import firebase_admin
-from firebase_admin import credentials, messaging
-from typing import List, Optional
-import os
-import json
+from typing import Dict, List, Optional
 import logging
+from metrics import metrics
+from firebase_app import get_firebase_app
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUMMARY_TITLES = {"daily": "Your Daily Summary", "weekly": "Your Weekly Summary"}
+
+
+def _messaging():
+    """Import firebase_admin.messaging on first use"""
+    from firebase_admin import messaging
+    return messaging
+
+
 class NotificationService:
     def __init__(self):
         """Initialize the notification service"""
-        self.initialized = False
-        self._initialize_firebase()
+        self._initialized = False
     
-    def _initialize_firebase(self):
-        """Initialize Firebase Admin SDK with better error handling"""
-        try:
-            if firebase_admin._apps:
-                logger.info("Firebase Admin SDK already initialized")
-                self.initialized = True
-                return
-            
-            # Try to initialize with service account key
-            service_account_path = os.path.join(os.path.dirname(__file__), 'serviceAccountKey.json')
-            
-            if os.path.exists(service_account_path):
-                cred = credentials.Certificate(service_account_path)
-                firebase_admin.initialize_app(cred)
-                logger.info("Firebase Admin SDK initialized successfully with service account key")
-                self.initialized = True
-            else:
-                # Try to initialize with environment variables
-                project_id = os.getenv('FIREBASE_PROJECT_ID')
-                private_key = os.getenv('FIREBASE_PRIVATE_KEY')
-                client_email = os.getenv('FIREBASE_CLIENT_EMAIL')
-                
-                if project_id and private_key and client_email:
-                    service_account_info = {
-                        "type": "service_account",
-                        "project_id": project_id,
-                        "private_key": private_key.replace('\\n', '\n'),
-                        "client_email": client_email,
-                        "client_id": os.getenv('FIREBASE_CLIENT_ID', ''),
-                        "auth_uri": os.getenv('FIREBASE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth'),
-                        "token_uri": os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
-                        "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_X509_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs'),
-                        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_X509_CERT_URL', '')
-                    }
-                    cred = credentials.Certificate(service_account_info)
-                    firebase_admin.initialize_app(cred)
-                    logger.info("Firebase Admin SDK initialized successfully with environment variables")
-                    self.initialized = True
-                else:
-                    # Fallback to default credentials (for development)
-                    logger.warning("Service account key not found and environment variables not set, using default credentials")
-                    firebase_admin.initialize_app()
-                    self.initialized = True
-                    
-        except Exception as e:
-            logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
-            self.initialized = False
+    @property
+    def initialized(self) -> bool:
+        """Whether the Firebase Admin SDK is ready, initializing it on first use"""
+        if not self._initialized:
+            try:
+                get_firebase_app()
+                self._initialized = True
+            except Exception as e:
+                logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
+        return self._initialized
     
+    @metrics.timed('notification')
     def send_notification_to_user(self, token: str, title: str, body: str, data: Optional[dict] = None) -> str:
         """
         Send a notification to a specific user
@@ -84,6 +52,7 @@ class NotificationService:
             raise Exception("Notification service not initialized")
         
         try:
+            messaging = _messaging()
             message = messaging.Message(
                 notification=messaging.Notification(
                     title=title,
@@ -101,6 +70,7 @@ class NotificationService:
             logger.error(f"Failed to send notification: {e}")
             raise Exception(f"Failed to send notification: {e}")
     
+    @metrics.timed('notification')
     def send_notification_to_topic(self, topic: str, title: str, body: str, data: Optional[dict] = None) -> str:
         """
         Send a notification to a topic
@@ -118,6 +88,7 @@ class NotificationService:
             raise Exception("Notification service not initialized")
         
         try:
+            messaging = _messaging()
             message = messaging.Message(
                 notification=messaging.Notification(
                     title=title,
@@ -135,6 +106,7 @@ class NotificationService:
             logger.error(f"Failed to send notification to topic {topic}: {e}")
             raise Exception(f"Failed to send notification to topic: {e}")
     
+    @metrics.timed('notification')
     def send_bulk_notifications(self, tokens: List[str], title: str, body: str, data: Optional[dict] = None) -> dict:
         """
         Send notifications to multiple users
@@ -152,6 +124,7 @@ class NotificationService:
             raise Exception("Notification service not initialized")
         
         try:
+            messaging = _messaging()
             # Split tokens into batches of 500 (FCM limit)
             batch_size = 500
             success_count = 0
@@ -183,6 +156,106 @@ class NotificationService:
             logger.error(f"Failed to send bulk notifications: {e}")
             raise Exception(f"Failed to send bulk notifications: {e}")
 
+    @staticmethod
+    def _send_each(messages: list) -> tuple:
+        """Send messages with send_each, returning the success and failure counts"""
+        messaging = _messaging()
+        # Split messages into batches of 500 (FCM limit)
+        batch_size = 500
+        success_count = 0
+        failure_count = 0
+        
+        for i in range(0, len(messages), batch_size):
+            response = messaging.send_each(messages[i:i + batch_size])
+            success_count += response.success_count
+            failure_count += response.failure_count
+        return success_count, failure_count
+
+    @metrics.timed('notification')
+    def send_summary_notifications(self, summaries: List[dict], frequency: str) -> dict:
+        """
+        Send summaries to their users' topics
+        
+        Args:
+            summaries: User summaries, e.g. one chunk from AnalyticsService.iter_summaries
+            frequency: Summary frequency (daily, weekly)
+            
+        Returns:
+            Dictionary with success and failure counts
+        """
+        if not self.initialized:
+            raise Exception("Notification service not initialized")
+        
+        try:
+            messaging = _messaging()
+            messages = [
+                messaging.Message(
+                    notification=messaging.Notification(
+                        title=SUMMARY_TITLES[frequency],
+                        body=f"You completed {summary['summary']['tasksCompleted']} tasks",
+                    ),
+                    data={"type": f"{frequency}_summary"},
+                    topic=f"user-{summary['user_id']}",
+                )
+                for summary in summaries
+            ]
+            success_count, failure_count = self._send_each(messages)
+            logger.info(f"{frequency.capitalize()} summaries sent - Success: {success_count}, Failures: {failure_count}")
+            return {
+                "success_count": success_count,
+                "failure_count": failure_count
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to send {frequency} summaries: {e}")
+            raise Exception(f"Failed to send {frequency} summaries: {e}")
+    
+    @metrics.timed('notification')
+    def send_assignment_notifications(self, assignments: Dict[str, List[str]], workspace_name: str) -> dict:
+        """
+        Tell users about the tasks they were assigned, one notification per user
+        
+        Args:
+            assignments: Titles of the tasks assigned, by assignee user ID
+            workspace_name: Name of the workspace the tasks belong to
+            
+        Returns:
+            Dictionary with success and failure counts
+        """
+        if not self.initialized:
+            raise Exception("Notification service not initialized")
+        
+        try:
+            messaging = _messaging()
+            messages = []
+            for user_id, task_titles in assignments.items():
+                if len(task_titles) == 1:
+                    title = "New Task Assigned"
+                    body = f"You have been assigned a new task: {task_titles[0]} in {workspace_name}"
+                else:
+                    title = "New Tasks Assigned"
+                    body = f"You have been assigned {len(task_titles)} tasks in {workspace_name}"
+                messages.append(messaging.Message(
+                    notification=messaging.Notification(
+                        title=title,
+                        body=body,
+                    ),
+                    data={"type": "task_assignment", "task_count": str(len(task_titles))},
+                    topic=f"user-{user_id}",
+                ))
+            success_count, failure_count = self._send_each(messages)
+            
+            logger.info(f"Assignment notifications sent - Success: {success_count}, Failures: {failure_count}")
+            return {
+                "success_count": success_count,
+                "failure_count": failure_count
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to send assignment notifications: {e}")
+            raise Exception(f"Failed to send assignment notifications: {e}")
+    
+    @metrics.timed('notification')
     def send_task_assignment_notification(self, user_token: str, task_title: str, project_name: str, due_date: str = None) -> str:
         """
         Send a task assignment notification to a user
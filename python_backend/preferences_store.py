@@ -0,0 +1,434 @@
+"""
+Preferences Store for TaskFlow Python Backend
+
+User preferences persisted in SQLite behind a bounded, write-through LRU
+cache. Only each user's overrides of the shared defaults are stored. Every
+write stamps its row with a database-wide version; when another connection
+commits, the cache evicts the entries whose rows now carry a newer version
+than the cached copy.
+
+Boolean preferences are also packed into bit flags per user, and indexed in
+memory as, per flag, the set of users that differ from the default, so
+recipients can be filtered without reading preferences. Likewise users can
+be grouped into delivery slots derived from their preferences, e.g. the
+hour and timezone of their daily summary, so a slot's users are found
+without scanning everyone.
+"""
+
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from database import Database, thread_local
+from memory_tracker import memory_tracker
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_preferences (
+    user_id TEXT PRIMARY KEY,
+    preferences TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    flags INTEGER
+);
+CREATE INDEX IF NOT EXISTS user_preferences_version ON user_preferences (version);
+"""
+
+MAX_FLAGS = 63
+
+# Cache entry of every user without stored preferences
+NO_OVERRIDES = (None, 0)
+
+
+class PreferencesStore:
+    def __init__(self, database: Database, defaults: Mapping[str, Any],
+                 flag_keys: Sequence[str], cache_size: int = 10000,
+                 slot_fn: Optional[Callable[[Mapping[str, Any]], Tuple[Hashable, ...]]] = None):
+        """
+        Initialize the preferences store
+
+        Args:
+            database: SQLite database
+            defaults: Preferences of users with no overrides
+            flag_keys: Boolean preferences packed into bit flags, at most MAX_FLAGS
+            cache_size: Maximum number of users kept in the LRU cache
+            slot_fn: Maps a user's overrides to the delivery slots they belong to
+        """
+        if len(flag_keys) > MAX_FLAGS:
+            raise ValueError(f"At most {MAX_FLAGS} flag preferences are supported")
+        self.database = database
+        self.defaults = defaults
+        self.flag_bits = {key: 1 << bit for bit, key in enumerate(flag_keys)}
+        self.default_flags = self.pack_flags({})
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # user_id -> (overrides or None, version)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._local = thread_local()
+        self._seen_version = 0  # Highest row version the cache has been reconciled with
+        self._store_id = None
+        self._non_default = None  # flag bit -> users whose flag differs from the default, loaded on first use
+        self.slot_fn = slot_fn
+        self._user_slots = None  # user_id -> slots, loaded on first use
+        self._slots = {}  # slot -> users
+        memory_tracker.track('preferences_cache', lambda: self._cache)
+        memory_tracker.track('preferences_flag_index', lambda: self._non_default or {},
+                             lambda: sum(len(users) for users in (self._non_default or {}).values()))
+        memory_tracker.track('preferences_slot_index', lambda: (self._user_slots or {}, self._slots),
+                             lambda: len(self._user_slots or {}))
+
+    def pack_flags(self, overrides: Mapping[str, Any]) -> int:
+        """
+        Pack boolean preferences into bit flags
+
+        Args:
+            overrides: A user's overrides of the defaults
+
+        Returns:
+            Bit flags, one bit per flag key
+        """
+        flags = 0
+        for key, bit in self.flag_bits.items():
+            if overrides.get(key, self.defaults.get(key, True)):
+                flags |= bit
+        return flags
+
+    def sparse(self, preferences: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Reduce preferences to the values that differ from the defaults
+
+        Args:
+            preferences: Complete or partial preferences
+
+        Returns:
+            Overrides
+        """
+        missing = object()
+        return {
+            key: value for key, value in preferences.items()
+            if self.defaults.get(key, missing) != value
+        }
+
+    def _ensure_schema(self):
+        if self._store_id is not None:
+            return
+        with self._lock:
+            if self._store_id is not None:
+                return
+            connection = self.database.connection
+            connection.executescript(SCHEMA)
+            with self.database.transaction() as connection:
+                connection.execute("INSERT OR IGNORE INTO metadata VALUES ('preferences_version', 0)")
+                connection.execute("INSERT OR IGNORE INTO metadata VALUES ('store_id', ?)", (uuid.uuid4().hex[:12],))
+                self._backfill_flags(connection)
+                self._seen_version = self._metadata(connection, 'preferences_version')
+                self._store_id = self._metadata(connection, 'store_id')
+
+    def _backfill_flags(self, connection):
+        # Rows written before the flags column existed
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(user_preferences)')}
+        if 'flags' not in columns:
+            connection.execute('ALTER TABLE user_preferences ADD COLUMN flags INTEGER')
+        rows = connection.execute(
+            'SELECT user_id, preferences FROM user_preferences WHERE flags IS NULL'
+        ).fetchall()
+        connection.executemany(
+            'UPDATE user_preferences SET flags = ? WHERE user_id = ?',
+            ((self.pack_flags(json.loads(preferences)), user_id) for user_id, preferences in rows)
+        )
+        if rows:
+            logger.info(f"Backfilled preference flags for {len(rows)} users")
+
+    @staticmethod
+    def _metadata(connection, key: str) -> Any:
+        return connection.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()[0]
+
+    @property
+    def store_id(self) -> str:
+        """Random ID of the database, stable across restarts and shared by workers"""
+        self._ensure_schema()
+        return self._store_id
+
+    def _sync(self, force: bool = False):
+        """
+        Apply rows written since the last sync to the cache and the indexes
+
+        Runs when this thread's connection sees another connection's commit,
+        or when forced after a write of our own. Syncs are serialized and each
+        reads a newer snapshot than the last, so the index never goes back in time.
+        """
+        data_version = self.database.data_version()
+        if not force and getattr(self._local, 'data_version', None) == data_version:
+            return
+        self._local.data_version = data_version
+
+        with self._sync_lock:
+            rows = self.database.connection.execute(
+                'SELECT user_id, version, flags, preferences FROM user_preferences WHERE version > ? ORDER BY version',
+                (self._seen_version,)
+            ).fetchall()
+            if not rows:
+                return
+            with self._lock:
+                for user_id, version, flags, overrides in rows:
+                    cached = self._cache.get(user_id)
+                    if cached is not None and cached[1] < version:
+                        del self._cache[user_id]
+                    self._index_flags(user_id, flags)
+                    if self._user_slots is not None:
+                        try:
+                            self._index_slots(user_id, json.loads(overrides))
+                        except Exception as e:
+                            # Skip the row rather than fail every later sync on it
+                            logger.error(f"Failed to index delivery slots of user {user_id}: {e}")
+                    self._seen_version = max(self._seen_version, version)
+
+    def _index_flags(self, user_id: str, flags: int):
+        # Caller holds the lock
+        if self._non_default is None:
+            return
+        non_default = flags ^ self.default_flags
+        for bit, users in self._non_default.items():
+            if non_default & bit:
+                users.add(user_id)
+            else:
+                users.discard(user_id)
+
+    def _load_flags(self):
+        with self._sync_lock:
+            if self._non_default is not None:
+                return
+            # Only non-default rows; rows newer than this snapshot are applied by the next sync
+            rows = self.database.connection.execute(
+                'SELECT user_id, flags FROM user_preferences WHERE flags != ?', (self.default_flags,)
+            ).fetchall()
+            with self._lock:
+                self._non_default = {bit: set() for bit in self.flag_bits.values()}
+                for user_id, flags in rows:
+                    self._index_flags(user_id, flags)
+            logger.info(f"Loaded preference flags for {len(rows)} users with non-default flags")
+
+    def _index_slots(self, user_id: str, overrides: Mapping[str, Any]):
+        # Caller holds the lock
+        slots = self.slot_fn(overrides)
+        hash(slots)  # Unhashable slots fail here, before the index is changed
+        old_slots = self._user_slots.get(user_id, ())
+        if slots == old_slots:
+            return
+        for slot in old_slots:
+            users = self._slots[slot]
+            users.discard(user_id)
+            if not users:
+                del self._slots[slot]
+        for slot in slots:
+            self._slots.setdefault(slot, set()).add(user_id)
+        if slots:
+            self._user_slots[user_id] = slots
+        else:
+            self._user_slots.pop(user_id, None)
+
+    def _load_slots(self):
+        with self._sync_lock:
+            if self._user_slots is not None:
+                return
+            rows = self.database.connection.execute(
+                'SELECT user_id, preferences FROM user_preferences'
+            ).fetchall()
+            with self._lock:
+                self._user_slots = {}
+                for user_id, overrides in rows:
+                    try:
+                        self._index_slots(user_id, json.loads(overrides))
+                    except Exception as e:
+                        logger.error(f"Failed to index delivery slots of user {user_id}: {e}")
+            logger.info(f"Loaded delivery slots for {len(rows)} users into {len(self._slots)} slots")
+
+    def _cache_put(self, user_id: str, entry: Tuple[Optional[Dict[str, Any]], int]):
+        # Caller holds the lock
+        self._cache[user_id] = entry
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Get a user's overrides
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Overrides (None if the user has none stored) and their version
+        """
+        self._ensure_schema()
+        self._sync()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                self._cache.move_to_end(user_id)
+                return entry
+            seen_version = self._seen_version
+
+        row = self.database.connection.execute(
+            'SELECT preferences, version FROM user_preferences WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        entry = (json.loads(row[0]), row[1]) if row is not None else NO_OVERRIDES
+        with self._lock:
+            # A newer write may have been reconciled while reading; let the next read fetch it
+            if self._seen_version == seen_version:
+                self._cache_put(user_id, entry)
+        return entry
+
+    def _next_versions(self, connection, count: int) -> int:
+        """Reserve count versions inside a write transaction and return the first"""
+        connection.execute(
+            "UPDATE metadata SET value = value + ? WHERE key = 'preferences_version'", (count,)
+        )
+        return self._metadata(connection, 'preferences_version') - count + 1
+
+    def update(self, user_id: str, changes: Mapping[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """
+        Merge changes into a user's overrides and persist them
+
+        Args:
+            user_id: User ID
+            changes: Preferences to set
+
+        Returns:
+            The new overrides and their version
+        """
+        self._ensure_schema()
+        with self.database.transaction() as connection:
+            version = self._next_versions(connection, 1)
+            row = connection.execute(
+                'SELECT preferences FROM user_preferences WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            overrides = json.loads(row[0]) if row is not None else {}
+            overrides.update(changes)
+            overrides = self.sparse(overrides)
+            connection.execute(
+                'INSERT OR REPLACE INTO user_preferences (user_id, preferences, version, flags) VALUES (?, ?, ?, ?)',
+                (user_id, json.dumps(overrides), version, self.pack_flags(overrides))
+            )
+
+        entry = (overrides, version)
+        with self._lock:
+            self._cache_put(user_id, entry)
+        self._sync(force=True)
+        return entry
+
+    def put_many(self, preferences_by_user: Mapping[str, Mapping[str, Any]]):
+        """
+        Replace the preferences of many users in one transaction, e.g. for an import
+
+        Args:
+            preferences_by_user: Complete preferences per user ID
+        """
+        self._ensure_schema()
+        with self.database.transaction() as connection:
+            first_version = self._next_versions(connection, len(preferences_by_user))
+            rows = []
+            for offset, (user_id, preferences) in enumerate(preferences_by_user.items()):
+                overrides = self.sparse(preferences)
+                rows.append((user_id, json.dumps(overrides), first_version + offset, self.pack_flags(overrides)))
+            connection.executemany(
+                'INSERT OR REPLACE INTO user_preferences (user_id, preferences, version, flags) VALUES (?, ?, ?, ?)',
+                rows
+            )
+        self._sync(force=True)
+        logger.info(f"Stored preferences for {len(preferences_by_user)} users")
+
+    def changes_since(self, version: int, limit: int = 1000) -> Tuple[List[Tuple[str, Dict[str, Any], int]], int, bool]:
+        """
+        Read the change log: users whose preferences changed after a version
+
+        The log is compacted to each user's latest write, which is all a
+        consumer replacing cached overrides needs.
+
+        Args:
+            version: Last version the consumer has applied
+            limit: Maximum number of changes to return
+
+        Returns:
+            Changes as (user_id, overrides, version) in version order, the
+            version to resume from, and whether more changes are pending
+        """
+        self._ensure_schema()
+        connection = self.database.connection
+        # One read transaction, so the changes and the current version agree
+        connection.execute('BEGIN')
+        try:
+            rows = connection.execute(
+                'SELECT user_id, preferences, version FROM user_preferences WHERE version > ? '
+                'ORDER BY version LIMIT ?', (version, limit + 1)
+            ).fetchall()
+            current_version = self._metadata(connection, 'preferences_version')
+        finally:
+            connection.execute('COMMIT')
+
+        has_more = len(rows) > limit
+        changes = [(user_id, json.loads(overrides), row_version) for user_id, overrides, row_version in rows[:limit]]
+        resume_version = changes[-1][2] if has_more else max(current_version, version)
+        return changes, resume_version, has_more
+
+    def filter_users(self, user_ids: Iterable[str], key: str) -> List[str]:
+        """
+        Keep the users whose boolean preference is set
+
+        Args:
+            user_ids: User IDs, order and duplicates are preserved
+            key: Flag preference key
+
+        Returns:
+            The users with the flag set
+        """
+        self._ensure_schema()
+        if self._non_default is None:
+            self._load_flags()
+        self._sync()
+        bit = self.flag_bits[key]
+        # One set membership test per user; only users differing from the default are in the set
+        non_default = self._non_default[bit]
+        if self.default_flags & bit:
+            return [user_id for user_id in user_ids if user_id not in non_default]
+        return [user_id for user_id in user_ids if user_id in non_default]
+
+    def slots(self) -> List[Hashable]:
+        """
+        Get the delivery slots that have users
+
+        Returns:
+            Slots, as returned by slot_fn
+        """
+        self._ensure_schema()
+        if self._user_slots is None:
+            self._load_slots()
+        self._sync()
+        with self._lock:
+            return list(self._slots)
+
+    def slot_users(self, slot: Hashable) -> List[str]:
+        """
+        Get the users in a delivery slot
+
+        Args:
+            slot: Delivery slot
+
+        Returns:
+            User IDs, in no particular order
+        """
+        self._ensure_schema()
+        if self._user_slots is None:
+            self._load_slots()
+        self._sync()
+        with self._lock:
+            return list(self._slots.get(slot, ()))
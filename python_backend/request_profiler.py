@@ -0,0 +1,243 @@
+"""
+Request Profiler for TaskFlow Python Backend
+
+Opt-in per-request profiling with cProfile or a sampling profiler, stored in
+a bounded on-disk ring of profile files. The directory is the ring: every
+worker lists, serves and prunes the same files, so profiles written by any
+worker are found by all of them and the limit holds across workers.
+"""
+
+import cProfile
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = {'cprofile': '.prof', 'sample': '.folded'}
+PROFILE_ID_PATTERN = re.compile(r'^[\w-]+\.(prof|folded)$')
+# <created ms>-<endpoint>-<duration µs>us-<random>.<ext>; profiles saved before durations were named lack them
+PROFILE_NAME_PATTERN = re.compile(r'^\d+-(?P<endpoint>\w+?)(?:-(?P<duration>\d+)us)?-[0-9a-f]{8}\.(prof|folded)$')
+LOCK_FILE = '.lock'
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval: float):
+        """Initialize a sampling profiler for one thread"""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Samples as flamegraph-ready collapsed stacks"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    def __init__(self):
+        """Initialize the request profiler"""
+        self.profile_dir = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+        self.max_profiles = int(os.getenv('PROFILE_MAX_FILES', '50'))
+        self.sample_rate = int(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.sampling_interval = float(os.getenv('PROFILE_SAMPLING_INTERVAL_MS', '5')) / 1000
+        self._request_counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._authorize = None
+
+    def init_app(self, app, authorize: Callable[[], bool]):
+        """
+        Register the profiling hooks on a Flask app
+
+        Args:
+            app: Flask application
+            authorize: Returns whether the current request may ask for a profile
+        """
+        self._authorize = authorize
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._enforce_limit()
+        app.before_request(self._start_profile)
+        app.after_request(self._finish_profile)
+        app.teardown_request(self._abandon_profile)
+        if self.sample_rate:
+            logger.info(f"Continuous profiling enabled for 1 in {self.sample_rate} requests")
+
+    def _describe(self, profile_id: str) -> Optional[Dict[str, object]]:
+        """A profile's description from its file, None if it was removed meanwhile"""
+        path = os.path.join(self.profile_dir, profile_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        match = PROFILE_NAME_PATTERN.match(profile_id)
+        duration = match.group('duration') if match else None
+        return {
+            "profileId": profile_id,
+            "mode": 'cprofile' if profile_id.endswith('.prof') else 'sample',
+            "endpoint": match.group('endpoint') if match else None,
+            "durationMs": int(duration) / 1000 if duration is not None else None,
+            "createdAt": stat.st_mtime,
+            "sizeBytes": stat.st_size
+        }
+
+    def _profiles(self) -> List[Dict[str, object]]:
+        """Descriptions of the profiles in the directory, oldest first"""
+        profiles = [self._describe(name) for name in os.listdir(self.profile_dir) if PROFILE_ID_PATTERN.match(name)]
+        return sorted((profile for profile in profiles if profile is not None),
+                      key=lambda profile: (profile["createdAt"], profile["profileId"]))
+
+    def _requested_mode(self) -> Tuple[Optional[str], bool]:
+        """Profiling mode for the current request, and whether it was explicitly requested"""
+        mode = request.headers.get('X-Profile') or request.args.get('profile')
+        if mode:
+            mode = 'cprofile' if mode in ('1', 'true') else mode
+            if mode in PROFILE_MODES and self._authorize is not None and self._authorize():
+                return mode, True
+        if self.sample_rate and next(self._request_counter) % self.sample_rate == 0:
+            return 'sample', False
+        return None, False
+
+    def _start_profile(self):
+        mode, explicit = self._requested_mode()
+        if mode is None:
+            return
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = SamplingProfiler(threading.get_ident(), self.sampling_interval)
+            profiler.start()
+        g._profile = (mode, profiler, explicit, time.perf_counter())
+
+    def _stop(self):
+        state = g.pop('_profile', None)
+        if state is None:
+            return None
+        mode, profiler, explicit, start = state
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        return mode, profiler, explicit, time.perf_counter() - start
+
+    def _finish_profile(self, response):
+        stopped = self._stop()
+        if stopped is None:
+            return response
+        mode, profiler, explicit, duration = stopped
+        if mode == 'sample' and not explicit and not profiler.stacks:
+            # Continuous sampling of a request too fast to catch a sample
+            return response
+        try:
+            profile_id = self.save(mode, profiler, request.endpoint, duration)
+            response.headers['X-Profile-Id'] = profile_id
+        except Exception as e:
+            logger.error(f"Failed to save request profile: {e}")
+        return response
+
+    def _abandon_profile(self, exc):
+        # Only reached with a running profiler when after_request did not run
+        self._stop()
+
+    def save(self, mode: str, profiler, endpoint: Optional[str], duration: float) -> str:
+        """
+        Write a profile into the ring
+
+        Args:
+            mode: 'cprofile' or 'sample'
+            profiler: Stopped cProfile.Profile or SamplingProfiler
+            endpoint: Profiled endpoint
+            duration: Request duration in seconds
+
+        Returns:
+            Profile ID
+        """
+        profile_id = (f"{int(time.time() * 1000)}-{endpoint or 'unmatched'}-{round(duration * 1e6)}us-"
+                      f"{uuid.uuid4().hex[:8]}{PROFILE_MODES[mode]}")
+        path = os.path.join(self.profile_dir, profile_id)
+        if mode == 'cprofile':
+            profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                f.write(profiler.collapsed())
+
+        self._enforce_limit()
+        logger.info(f"Saved {mode} profile {profile_id} ({duration * 1000:.1f} ms)")
+        return profile_id
+
+    def _enforce_limit(self):
+        """Remove the oldest profiles beyond max_profiles, whichever worker wrote them"""
+        with self._lock, open(os.path.join(self.profile_dir, LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                # Held while pruning, so workers pruning at once do not remove too many
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            profiles = self._profiles()
+            for profile in profiles[:max(0, len(profiles) - self.max_profiles)]:
+                try:
+                    os.remove(os.path.join(self.profile_dir, profile["profileId"]))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Failed to remove old profile {profile['profileId']}: {e}")
+
+    def list_profiles(self) -> List[Dict[str, object]]:
+        """
+        List stored profiles, newest first
+
+        Returns:
+            Profile descriptions
+        """
+        return list(reversed(self._profiles()))
+
+    def get_profile_path(self, profile_id: str) -> Optional[str]:
+        """
+        Get the file path of a stored profile
+
+        Args:
+            profile_id: Profile ID
+
+        Returns:
+            File path, or None if the profile does not exist
+        """
+        path = os.path.join(self.profile_dir, profile_id)
+        if not PROFILE_ID_PATTERN.match(profile_id) or not os.path.isfile(path):
+            return None
+        return path
+
+
+# Global instance
+request_profiler = RequestProfiler()
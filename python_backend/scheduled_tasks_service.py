@@ -1,105 +1,354 @@
 """
 Scheduled Tasks Service for TaskFlow Python Backend
+
+Tasks are persisted as specs naming a task type; the handler registered for
+the type runs when the task fires. Tasks on the same schedule are grouped
+into one slot job, rebuilt from the specs at startup.
 """
 
+import bisect
 import logging
-from typing import Dict, List, Any
-import json
-from datetime import datetime
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from datetime import datetime, timezone as dt_timezone
+from analytics_service import analytics_service
+from database import Database, thread_local
+from memory_tracker import memory_tracker
+from notification_service import notification_service
+from scheduled_tasks_store import TASK_ID_PREFIX, ScheduledTasksStore, row_id
+from slot_scheduler import SlotScheduler
 from task_scheduler import task_scheduler
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class ScheduledTasksService:
+# Task type -> handler, called with the task when its job fires
+TASK_HANDLERS: Dict[str, Callable[[Any], None]] = {}
+# Task types whose handler is called once with every due task of the type
+BATCH_TASK_TYPES = set()
+
+def task_handler(task_type: str, batch: bool = False):
+    """Register the handler of a task type, called with a list of tasks if batch is set"""
+    def decorator(func):
+        TASK_HANDLERS[task_type] = func
+        if batch:
+            BATCH_TASK_TYPES.add(task_type)
+        return func
+    return decorator
+
+def send_summaries(tasks: List[Dict[str, Any]], frequency: str):
+    """Summarize the owners of tasks in one pass over the events and send the summaries chunk by chunk"""
+    owner_ids = [task["ownerId"] for task in tasks if task.get("ownerId")]
+    if len(owner_ids) < len(tasks):
+        logger.warning(f"Skipping {len(tasks) - len(owner_ids)} {frequency} summary tasks without an owner")
+    for summaries in analytics_service.iter_summaries(owner_ids, frequency, task_scheduler.offload_map):
+        notification_service.send_summary_notifications(summaries, frequency)
+
+@task_handler("daily_summary", batch=True)
+def daily_summary_handler(tasks: List[Dict[str, Any]]):
+    logger.info(f"Running daily summary job for {len(tasks)} tasks")
+    send_summaries(tasks, "daily")
+
+@task_handler("weekly_report", batch=True)
+def weekly_report_handler(tasks: List[Dict[str, Any]]):
+    logger.info(f"Running weekly report job for {len(tasks)} tasks")
+    send_summaries(tasks, "weekly")
+
+@task_handler("custom")
+def custom_handler(task: Dict[str, Any]):
+    # This would contain custom logic
+    logger.info(f"Running custom job for task {task['taskId']}")
+
+def task_trigger(task: Dict[str, Any]):
+    """
+    Build the trigger of a task from its spec
+    
+    Args:
+        task: Task spec
+        
+    Returns:
+        Trigger, or None for task types that are stored but not scheduled
+    """
+    parameters = task["parameters"]
+    timezone = parameters.get("timezone", "UTC")
+    if task["taskType"] == "daily_summary":
+        return task_scheduler.cron_trigger(
+            timezone, hour=parameters.get("hour", 9), minute=parameters.get("minute", 0)
+        )
+    if task["taskType"] == "weekly_report":
+        return task_scheduler.cron_trigger(
+            timezone, day_of_week=parameters.get("dayOfWeek", "mon"),
+            hour=parameters.get("hour", 9), minute=parameters.get("minute", 0)
+        )
+    if task["taskType"] == "custom":
+        return task_scheduler.cron_trigger(timezone, cron_expression=task["schedule"])
+    return None
+
+class TaskIndex:
+    """Task numbers in creation order, overall and per value of each indexed field"""
+    
+    FIELDS = ("taskType", "enabled", "ownerId")
+    
     def __init__(self):
-        """Initialize the scheduled tasks service"""
-        # In a real implementation, this would be a database
+        self.all = []
+        self.by_value = {}  # (field, value) -> sorted task numbers
+    
+    def add(self, number: int, task: Dict[str, Any]):
+        bisect.insort(self.all, number)
+        for field in self.FIELDS:
+            bisect.insort(self.by_value.setdefault((field, task.get(field)), []), number)
+    
+    def remove(self, number: int, task: Dict[str, Any]):
+        self._discard(self.all, number)
+        for field in self.FIELDS:
+            key = (field, task.get(field))
+            self._discard(self.by_value[key], number)
+            if not self.by_value[key]:
+                del self.by_value[key]
+    
+    @staticmethod
+    def _discard(numbers: List[int], number: int):
+        index = bisect.bisect_left(numbers, number)
+        if index < len(numbers) and numbers[index] == number:
+            del numbers[index]
+    
+    def candidates(self, filters: Dict[str, Any]) -> List[int]:
+        """The shortest list of task numbers that holds every match of the filters"""
+        if not filters:
+            return self.all
+        return min((self.by_value.get(item, []) for item in filters.items()), key=len)
+
+def run_scheduled_tasks(task_ids: List[str]):
+    """Run a batch of due tasks; called by the slot scheduler"""
+    scheduled_tasks_service.run_tasks(task_ids)
+
+class ScheduledTasksService:
+    def __init__(self, database: Optional[Database] = None):
+        """
+        Initialize the scheduled tasks service
+        
+        Args:
+            database: SQLite database, defaults to DATABASE_PATH (opened on first use)
+        """
+        self.store = ScheduledTasksStore(database or Database())
+        # Tasks on the same schedule share one job, which runs them in batches
+        self.slots = SlotScheduler(
+            'scheduled_tasks', run_scheduled_tasks, task_scheduler,
+            batch_size=int(os.getenv('SCHEDULED_TASKS_BATCH_SIZE', '500'))
+        )
+        # Tasks as of the last sync with the store
         self.scheduled_tasks = {}
+        self.index = TaskIndex()
+        # Version of the last change applied, bumped whenever a task is created, deleted, paused or resumed
+        self.version = 0
+        self._sync_lock = threading.RLock()
+        self._local = thread_local()
+        memory_tracker.track('scheduled_tasks', lambda: self.scheduled_tasks)
+        memory_tracker.track('scheduled_tasks_index', lambda: (self.index.all, self.index.by_value),
+                             lambda: len(self.index.all))
+        memory_tracker.track('scheduled_tasks_slots', self.slots.containers, lambda: len(self.slots))
         logger.info("Scheduled tasks service initialized")
     
-    def create_scheduled_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+    def sync(self, force: bool = False):
+        """
+        Apply the task changes written since the last sync, by any worker
+        
+        The first sync restores every task into its schedule slot. Runs when
+        this thread's connection sees another connection's commit, or when
+        forced after a write of our own.
+        """
+        data_version = self.store.database.data_version()
+        if not force and getattr(self._local, 'data_version', None) == data_version:
+            return
+        self._local.data_version = data_version
+        
+        with self._sync_lock:
+            changes = self.store.changes_since(self.version)
+            if not changes:
+                return
+            
+            entries = []
+            for task_id, task, version, last_run_at in changes:
+                try:
+                    previous = self.scheduled_tasks.pop(task_id, None)
+                    if previous is not None:
+                        self.index.remove(row_id(task_id), previous)
+                    if task is None:
+                        self.slots.remove(task_id)
+                        continue
+                    
+                    self.scheduled_tasks[task_id] = task
+                    self.index.add(row_id(task_id), task)
+                    if previous is not None and "job_id" in previous:
+                        # Only paused or resumed
+                        task["job_id"] = previous["job_id"]
+                        self.slots.set_paused(task_id, not task["enabled"])
+                        continue
+                    trigger = task_trigger(task)
+                    if trigger is not None:
+                        last_run_time = datetime.fromtimestamp(last_run_at, dt_timezone.utc) if last_run_at else None
+                        entries.append((task_id, trigger, last_run_time, not task["enabled"]))
+                
+                except Exception as e:
+                    logger.error(f"Failed to apply change of scheduled task {task_id}: {e}")
+            
+            if entries:
+                self.slots.add_many(entries)
+                for task_id, *_ in entries:
+                    self.scheduled_tasks[task_id]["job_id"] = self.slots.job_id(task_id)
+            self.version = changes[-1][2]
+    
+    def restore(self):
+        """Restore the persisted tasks and keep following changes made by other workers"""
+        self.sync(force=True)
+        task_scheduler.schedule_interval_job(self.sync, 'scheduled_tasks_sync', seconds=10)
+    
+    def run_tasks(self, task_ids: List[str]):
+        """
+        Run the handlers of due tasks, in the scheduler leader only
+        
+        Args:
+            task_ids: Task IDs
+        """
+        if not task_scheduler.is_leader:
+            return
+        tasks_by_type = {}
+        for task_id in task_ids:
+            task = self.scheduled_tasks.get(task_id)
+            if task is not None:
+                tasks_by_type.setdefault(task["taskType"], []).append(task)
+        
+        ran = []
+        for task_type, tasks in tasks_by_type.items():
+            handler = TASK_HANDLERS[task_type]
+            if task_type in BATCH_TASK_TYPES:
+                try:
+                    handler(tasks)
+                    ran.extend(task["taskId"] for task in tasks)
+                except Exception as e:
+                    logger.error(f"Scheduled {task_type} batch of {len(tasks)} tasks failed: {e}")
+                continue
+            for task in tasks:
+                try:
+                    handler(task)
+                    ran.append(task["taskId"])
+                except Exception as e:
+                    logger.error(f"Scheduled task {task['taskId']} failed: {e}")
+        # One write for the whole batch, none if nothing ran
+        if ran:
+            self.store.record_runs(ran, time.time())
+    
+    def create_scheduled_task(self, task_data: Dict[str, Any], owner_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Create a new scheduled task
         
         Args:
             task_data: Task data including type, schedule, parameters, description
+            owner_id: ID of the user creating the task
             
         Returns:
             Created task information
         """
         try:
-            task_id = f"scheduled_task_{len(self.scheduled_tasks) + 1}"
-            
             # Create task object
             task = {
-                "taskId": task_id,
+                "ownerId": owner_id,
                 "taskType": task_data.get("taskType"),
                 "schedule": task_data.get("schedule"),
                 "parameters": task_data.get("parameters", {}),
                 "description": task_data.get("description", ""),
-                "enabled": True,
                 "createdAt": datetime.utcnow().isoformat()
             }
             
-            # Schedule the task
-            if task["taskType"] == "daily_summary":
-                hour = task["parameters"].get("hour", 9)
-                minute = task["parameters"].get("minute", 0)
-                timezone = task["parameters"].get("timezone", "UTC")
-                
-                def daily_summary_job():
-                    # This would contain logic to generate and send daily summary
-                    logger.info(f"Running daily summary job for task {task_id}")
-                
-                job = task_scheduler.schedule_daily_task_reminders(
-                    daily_summary_job, hour, minute, timezone
-                )
-                task["job_id"] = job.id
-                
-            elif task["taskType"] == "weekly_report":
-                day_of_week = task["parameters"].get("dayOfWeek", "mon")
-                hour = task["parameters"].get("hour", 9)
-                minute = task["parameters"].get("minute", 0)
-                timezone = task["parameters"].get("timezone", "UTC")
-                
-                def weekly_report_job():
-                    # This would contain logic to generate and send weekly report
-                    logger.info(f"Running weekly report job for task {task_id}")
-                
-                job = task_scheduler.schedule_weekly_report(
-                    weekly_report_job, day_of_week, hour, minute, timezone
-                )
-                task["job_id"] = job.id
-                
-            elif task["taskType"] == "custom":
-                cron_expression = task["schedule"]
-                timezone = task["parameters"].get("timezone", "UTC")
-                
-                def custom_job():
-                    # This would contain custom logic
-                    logger.info(f"Running custom job for task {task_id}")
-                
-                job = task_scheduler.schedule_custom_task(
-                    custom_job, cron_expression, task_id, timezone
-                )
-                task["job_id"] = job.id
+            # Reject invalid schedules before storing the task
+            task_trigger(task)
             
-            # Store the task
-            self.scheduled_tasks[task_id] = task
+            # Store the task; the sync schedules its job
+            task_id = self.store.insert(task)
+            self.sync(force=True)
             
             logger.info(f"Created scheduled task {task_id}")
             return {
                 "success": True,
                 "taskId": task_id,
-                "nextRun": "Not implemented"  # In a real implementation, this would calculate next run time
+                "nextRun": self._next_run(task_id)
             }
             
         except Exception as e:
             logger.error(f"Failed to create scheduled task: {e}")
             raise Exception(f"Failed to create scheduled task: {e}")
     
+    def get_version(self) -> str:
+        """
+        Get the version of the task list and its next run times
+        
+        Returns:
+            Version string, equal in the workers that computed the same next run times
+        """
+        self.sync()
+        return f"{self.version}.{self.slots.next_runs_version()}"
+    
+    def _next_run(self, task_id: str) -> Optional[str]:
+        next_run_time = self.slots.next_run_time(task_id)
+        return next_run_time.isoformat() if next_run_time is not None else None
+    
+    def list_scheduled_tasks(self, filters: Optional[Dict[str, Any]] = None, cursor: Optional[str] = None,
+                             limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get a page of scheduled tasks in creation order
+        
+        Walks the shortest secondary index among the filters, starting after
+        the cursor, and stops once the page is full.
+        
+        Args:
+            filters: Values to match, by field (taskType, enabled, ownerId)
+            cursor: Task ID of the last task of the previous page
+            limit: Maximum number of tasks
+            
+        Returns:
+            The tasks, each with its next run time, and the cursor of the next
+            page (None on the last page)
+        """
+        filters = filters or {}
+        after = row_id(cursor) if cursor else 0
+        if after is None:
+            raise ValueError(f"Invalid cursor {cursor}")
+        
+        self.sync()
+        with self._sync_lock:
+            candidates = self.index.candidates(filters)
+            tasks = []
+            for position in range(bisect.bisect_right(candidates, after), len(candidates)):
+                task = self.scheduled_tasks[f"{TASK_ID_PREFIX}{candidates[position]}"]
+                if all(task.get(field) == value for field, value in filters.items()):
+                    if len(tasks) == limit:
+                        return tasks, tasks[-1]["taskId"]
+                    tasks.append({**task, "nextRun": self._next_run(task["taskId"])})
+        return tasks, None
+    
+    def get_next_scheduled_tasks(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Get the tasks that run next
+        
+        Args:
+            limit: Maximum number of tasks
+            
+        Returns:
+            Tasks with their next run times, soonest first
+        """
+        self.sync()
+        with self._sync_lock:
+            return [
+                {**self.scheduled_tasks[task_id], "nextRun": next_run_time.isoformat()}
+                for task_id, next_run_time in self.slots.next_entries(limit)
+            ]
+    
+    @property
+    def store_id(self) -> str:
+        """ID of the tasks database, shared by all workers"""
+        return self.store.store_id
+    
     def get_scheduled_tasks(self) -> List[Dict[str, Any]]:
         """
         Get all scheduled tasks
@@ -108,8 +357,10 @@ class ScheduledTasksService:
             List of scheduled tasks
         """
         try:
-            tasks = list(self.scheduled_tasks.values())
-            logger.info(f"Retrieved {len(tasks)} scheduled tasks")
+            self.sync()
+            with self._sync_lock:
+                tasks = [{**task, "nextRun": self._next_run(task["taskId"])} for task in self.scheduled_tasks.values()]
+            logger.debug(f"Retrieved {len(tasks)} scheduled tasks")
             return tasks
             
         except Exception as e:
@@ -127,16 +378,10 @@ class ScheduledTasksService:
             Success status
         """
         try:
-            if task_id not in self.scheduled_tasks:
+            # The sync removes the job
+            if not self.store.delete(task_id):
                 raise Exception(f"Task {task_id} not found")
-            
-            # Remove the job from scheduler
-            task = self.scheduled_tasks[task_id]
-            if "job_id" in task:
-                task_scheduler.remove_job(task["job_id"])
-            
-            # Remove from storage
-            del self.scheduled_tasks[task_id]
+            self.sync(force=True)
             
             logger.info(f"Deleted scheduled task {task_id}")
             return True
@@ -156,14 +401,10 @@ class ScheduledTasksService:
             Success status
         """
         try:
-            if task_id not in self.scheduled_tasks:
+            # The sync pauses the job
+            if not self.store.set_enabled(task_id, False):
                 raise Exception(f"Task {task_id} not found")
-            
-            task = self.scheduled_tasks[task_id]
-            if "job_id" in task:
-                task_scheduler.pause_job(task["job_id"])
-            
-            task["enabled"] = False
+            self.sync(force=True)
             logger.info(f"Paused scheduled task {task_id}")
             return True
             
@@ -182,14 +423,10 @@ class ScheduledTasksService:
             Success status
         """
         try:
-            if task_id not in self.scheduled_tasks:
+            # The sync resumes the job
+            if not self.store.set_enabled(task_id, True):
                 raise Exception(f"Task {task_id} not found")
-            
-            task = self.scheduled_tasks[task_id]
-            if "job_id" in task:
-                task_scheduler.resume_job(task["job_id"])
-            
-            task["enabled"] = True
+            self.sync(force=True)
             logger.info(f"Resumed scheduled task {task_id}")
             return True
             
@@ -198,4 +435,4 @@ class ScheduledTasksService:
             raise Exception(f"Failed to resume scheduled task: {e}")
 
 # Global instance
-scheduled_tasks_service = ScheduledTasksService()
\ No newline at end of file
+scheduled_tasks_service = ScheduledTasksService()
@@ -0,0 +1,185 @@
+"""
+Scheduled Tasks Store for TaskFlow Python Backend
+
+Scheduled task specs persisted in SQLite, so they survive restarts. A spec
+is plain JSON (task type, schedule and parameters) naming a registered
+handler, never a callable. Every write stamps its row with a database-wide
+version and deleted tasks are kept as tombstones, so each worker can apply
+the changes made by the others.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scheduled_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    enabled INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL,
+    last_run_at REAL
+);
+CREATE INDEX IF NOT EXISTS scheduled_tasks_version ON scheduled_tasks (version);
+"""
+
+TASK_ID_PREFIX = 'scheduled_task_'
+
+
+def row_id(task_id: str) -> Optional[int]:
+    """Row ID of a task ID, None if it is not one of ours"""
+    if not task_id.startswith(TASK_ID_PREFIX):
+        return None
+    try:
+        return int(task_id[len(TASK_ID_PREFIX):])
+    except ValueError:
+        return None
+
+
+class ScheduledTasksStore:
+    def __init__(self, database: Database):
+        """
+        Initialize the scheduled tasks store
+
+        Args:
+            database: SQLite database
+        """
+        self.database = database
+        self._lock = threading.Lock()
+        self._store_id = None
+
+    def _ensure_schema(self):
+        if self._store_id is not None:
+            return
+        with self._lock:
+            if self._store_id is not None:
+                return
+            self.database.connection.executescript(SCHEMA)
+            with self.database.transaction() as connection:
+                connection.execute("INSERT OR IGNORE INTO metadata VALUES ('scheduled_tasks_version', 0)")
+                connection.execute("INSERT OR IGNORE INTO metadata VALUES ('store_id', ?)", (uuid.uuid4().hex[:12],))
+                self._store_id = self._metadata(connection, 'store_id')
+
+    @staticmethod
+    def _metadata(connection, key: str) -> Any:
+        return connection.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()[0]
+
+    def _next_version(self, connection) -> int:
+        # Inside a write transaction
+        connection.execute("UPDATE metadata SET value = value + 1 WHERE key = 'scheduled_tasks_version'")
+        return self._metadata(connection, 'scheduled_tasks_version')
+
+    @property
+    def store_id(self) -> str:
+        """Random ID of the database, stable across restarts and shared by workers"""
+        self._ensure_schema()
+        return self._store_id
+
+    def insert(self, task: Dict[str, Any]) -> str:
+        """
+        Persist a new task
+
+        Its last run is set to now, so runs missed before the first one are
+        caught up like any other.
+
+        Args:
+            task: Task spec, without taskId
+
+        Returns:
+            The new task ID
+        """
+        self._ensure_schema()
+        with self.database.transaction() as connection:
+            version = self._next_version(connection)
+            cursor = connection.execute(
+                'INSERT INTO scheduled_tasks (task, enabled, version, last_run_at) VALUES (?, ?, ?, ?)',
+                (json.dumps(task), int(task.get("enabled", True)), version, time.time())
+            )
+        return f"{TASK_ID_PREFIX}{cursor.lastrowid}"
+
+    def _update(self, task_id: str, column: str, value: int) -> bool:
+        self._ensure_schema()
+        number = row_id(task_id)
+        if number is None:
+            return False
+        with self.database.transaction() as connection:
+            version = self._next_version(connection)
+            cursor = connection.execute(
+                f'UPDATE scheduled_tasks SET {column} = ?, version = ? WHERE id = ? AND deleted = 0',
+                (value, version, number)
+            )
+        return cursor.rowcount > 0
+
+    def set_enabled(self, task_id: str, enabled: bool) -> bool:
+        """
+        Pause or resume a task
+
+        Returns:
+            Whether the task exists
+        """
+        return self._update(task_id, 'enabled', int(enabled))
+
+    def delete(self, task_id: str) -> bool:
+        """
+        Delete a task, leaving a tombstone for the other workers
+
+        Returns:
+            Whether the task existed
+        """
+        return self._update(task_id, 'deleted', 1)
+
+    def record_runs(self, task_ids: Iterable[str], run_time: float):
+        """
+        Record when tasks last ran, for catching up on missed runs after a restart
+
+        Not a change of the tasks, so their versions are left alone.
+
+        Args:
+            task_ids: Task IDs
+            run_time: Run time as a Unix timestamp
+        """
+        self._ensure_schema()
+        with self.database.transaction() as connection:
+            connection.executemany(
+                'UPDATE scheduled_tasks SET last_run_at = ? WHERE id = ?',
+                ((run_time, row_id(task_id)) for task_id in task_ids)
+            )
+
+    def changes_since(self, version: int) -> List[Tuple[str, Optional[Dict[str, Any]], int, Optional[float]]]:
+        """
+        Read the tasks changed after a version
+
+        Args:
+            version: Last version applied
+
+        Returns:
+            Changes as (task_id, task or None if deleted, version, last_run_at) in version order
+        """
+        self._ensure_schema()
+        rows = self.database.connection.execute(
+            'SELECT id, task, enabled, deleted, version, last_run_at FROM scheduled_tasks '
+            'WHERE version > ? ORDER BY version', (version,)
+        ).fetchall()
+        changes = []
+        for number, task, enabled, deleted, row_version, last_run_at in rows:
+            task_id = f"{TASK_ID_PREFIX}{number}"
+            if deleted:
+                changes.append((task_id, None, row_version, last_run_at))
+                continue
+            task = json.loads(task)
+            task["taskId"] = task_id
+            task["enabled"] = bool(enabled)
+            changes.append((task_id, task, row_version, last_run_at))
+        return changes
@@ -0,0 +1,151 @@
+"""
+Scheduler Telemetry for TaskFlow Python Backend
+
+Listens to APScheduler's job events to record how late each job starts, how
+long it runs, and how often it misfires, fails or overlaps its previous run.
+Jobs are labelled by ID with any trailing number dropped, so the slot jobs
+of one slot scheduler share a label and the label count stays bounded.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Runs slower, or starting later, than these many seconds are logged as warnings; 0 disables
+SLOW_JOB_SECONDS = float(os.getenv('SCHEDULER_SLOW_JOB_SECONDS', '0'))
+LATE_JOB_SECONDS = float(os.getenv('SCHEDULER_LATE_JOB_SECONDS', '0'))
+
+_JOB_NUMBER = re.compile(r'-\d+$')
+
+
+def job_label(job_id: str) -> str:
+    """Metric label of a job, e.g. 'scheduled_tasks-slot' for 'scheduled_tasks-slot-12'"""
+    return _JOB_NUMBER.sub('', job_id)
+
+
+class SchedulerTelemetry:
+    def __init__(self):
+        """Initialize the scheduler telemetry"""
+        self.duration = metrics.histogram(
+            'taskflow_scheduler_job_duration_seconds', 'Time from submitting a job run to its completion', ('job',)
+        )
+        self.lag = metrics.histogram(
+            'taskflow_scheduler_job_lag_seconds', 'Time from the scheduled run time to submitting the run', ('job',)
+        )
+        self.misfires = metrics.counter(
+            'taskflow_scheduler_job_misfires_total', 'Runs skipped for starting past the misfire grace time', ('job',)
+        )
+        self.errors = metrics.counter(
+            'taskflow_scheduler_job_errors_total', 'Runs that raised an exception', ('job',)
+        )
+        self.overlaps = metrics.counter(
+            'taskflow_scheduler_job_overlaps_total', 'Runs skipped as the previous run was still going', ('job',)
+        )
+        self.in_flight = metrics.gauge(
+            'taskflow_scheduler_jobs_in_flight', 'Runs submitted and not yet finished', ('job',)
+        )
+        self._labels = set()
+        # (job ID, scheduled run time) -> submission time, for runs in flight
+        self._runs = {}
+        # Runs finishing before their submission event is dispatched, which
+        # APScheduler does once it has submitted every due job: key -> missed
+        self._finished = {}
+        self._lock = threading.Lock()
+
+    def attach(self, scheduler):
+        """
+        Register the event listeners with a scheduler
+
+        Args:
+            scheduler: APScheduler scheduler
+        """
+        from apscheduler.events import (EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES,
+                                        EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED)
+
+        self._codes = {EVENT_JOB_ERROR: self.errors, EVENT_JOB_MISSED: self.misfires}
+        scheduler.add_listener(self._on_submitted, EVENT_JOB_SUBMITTED)
+        scheduler.add_listener(self._on_finished, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+        scheduler.add_listener(self._on_overlap, EVENT_JOB_MAX_INSTANCES)
+
+    def _label(self, job_id: str) -> str:
+        label = job_label(job_id)
+        if label not in self._labels:
+            with self._lock:
+                self._labels.add(label)
+        return label
+
+    def _on_submitted(self, event):
+        import pytz
+
+        now = time.perf_counter()
+        label = self._label(event.job_id)
+        lag = (datetime.now(pytz.utc) - event.scheduled_run_times[-1]).total_seconds()
+        self.lag.labels(label).observe(max(lag, 0.0))
+        if LATE_JOB_SECONDS and lag > LATE_JOB_SECONDS:
+            logger.warning(f"Job {event.job_id} started {lag:.1f}s after its scheduled time")
+
+        with self._lock:
+            for run_time in event.scheduled_run_times:
+                key = (event.job_id, run_time)
+                missed = self._finished.pop(key, None)
+                if missed is None:
+                    self._runs[key] = now
+                    self.in_flight.labels(label).inc()
+                elif not missed:
+                    # Finished before it was seen being submitted
+                    self.duration.labels(label).observe(0.0)
+
+    def _on_finished(self, event):
+        now = time.perf_counter()
+        label = self._label(event.job_id)
+        counter = self._codes.get(event.code)
+        if counter is not None:
+            counter.labels(label).inc()
+
+        key = (event.job_id, event.scheduled_run_time)
+        with self._lock:
+            submitted_at = self._runs.pop(key, None)
+            if submitted_at is None:
+                self._finished[key] = counter is self.misfires
+                return
+            self.in_flight.labels(label).dec()
+        if counter is self.misfires:
+            return
+        duration = now - submitted_at
+        self.duration.labels(label).observe(duration)
+        if SLOW_JOB_SECONDS and duration > SLOW_JOB_SECONDS:
+            logger.warning(f"Job {event.job_id} took {duration:.1f}s")
+
+    def _on_overlap(self, event):
+        self.overlaps.labels(self._label(event.job_id)).inc()
+        logger.warning(f"Skipped a run of job {event.job_id}: its previous run is still going")
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Get the telemetry of every job seen so far
+
+        Returns:
+            Per job label: duration and lag summaries in seconds, misfire,
+            error and overlap counts, and the runs in flight
+        """
+        with self._lock:
+            labels = sorted(self._labels)
+        return {
+            label: {
+                "duration": self.duration.labels(label).snapshot(),
+                "lag": self.lag.labels(label).snapshot(),
+                "misfires": int(self.misfires.labels(label).value),
+                "errors": int(self.errors.labels(label).value),
+                "overlaps": int(self.overlaps.labels(label).value),
+                "inFlight": int(self.in_flight.labels(label).value)
+            }
+            for label in labels
+        }
@@ -0,0 +1,220 @@
+"""
+Search Index for TaskFlow Python Backend
+
+An in-memory inverted index over a workspace's tasks: every word of a
+task's title, tags and description maps to the tasks containing it, with a
+weight favouring titles over tags over descriptions. The words are also
+kept sorted, so the last word of a query matches as a prefix (search as you
+type) by bisecting rather than scanning. Results are ranked by the summed
+weights of the matched words, each scaled by how rare the word is.
+"""
+
+import bisect
+import heapq
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Weight of a word by the field it occurs in
+FIELD_WEIGHTS = (('title', 3.0), ('tags', 2.0), ('description', 1.0))
+
+# Task fields kept by the index, enough to show a result and to rebuild the index
+STORED_FIELDS = ('projectId', 'title', 'description', 'tags', 'status', 'assigneeId')
+
+# Words a query's last word expands to as a prefix, at most
+MAX_PREFIX_TERMS = 64
+
+# Prefix matches count for less than whole words
+PREFIX_WEIGHT = 0.5
+
+# Up to this many tasks matching the rest of a query, the last word is
+# looked for among their words instead of expanding it over the index
+PREFIX_SCAN_TASKS = 2000
+
+_WORD = re.compile(r'\w+')
+
+
+def _text(value: Any) -> str:
+    """A string field, or the strings of a list field joined"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ' '.join(item for item in value if isinstance(item, str))
+    return ''
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercased words of a string, or of the strings in a list"""
+    return _WORD.findall(_text(text).lower())
+
+
+def task_terms(task: Dict[str, Any]) -> Dict[str, float]:
+    """Weight of each word of a task"""
+    terms = {}
+    get = terms.get
+    for field, weight in FIELD_WEIGHTS:
+        for word in _WORD.findall(_text(task.get(field)).lower()):
+            terms[word] = get(word, 0.0) + weight
+    return terms
+
+
+class WorkspaceIndex:
+    def __init__(self):
+        """Initialize an empty index"""
+        self.tasks = {}  # task path -> stored fields
+        self._terms = {}  # task path -> word -> weight
+        self.postings = {}  # word -> task path -> weight
+        self.words = []  # every word in postings, sorted
+        self.projects = {}  # project ID -> task paths
+        self.assignees = {}  # assignee ID -> task paths
+        # Set while rebuilding, when words are sorted once at the end
+        self._unsorted = False
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def set_task(self, path: str, task: Optional[Dict[str, Any]]):
+        """Index a task, replacing its previous version, or remove it if task is None"""
+        previous = self._terms.pop(path, None)
+        if previous is not None:
+            for word in previous:
+                posting = self.postings[word]
+                del posting[path]
+                if not posting:
+                    del self.postings[word]
+                    if not self._unsorted:
+                        del self.words[bisect.bisect_left(self.words, word)]
+            stored = self.tasks.pop(path)
+            for groups, key in ((self.projects, stored['projectId']), (self.assignees, stored['assigneeId'])):
+                paths = groups[key]
+                paths.discard(path)
+                if not paths:
+                    del groups[key]
+        if task is None:
+            return
+
+        stored = {field: task.get(field) for field in STORED_FIELDS}
+        stored['id'] = path.rsplit('/', 1)[-1]
+        # The path is authoritative: tasks moved by copying may carry a stale projectId
+        stored['projectId'] = path.split('/')[3]
+        terms = task_terms(stored)
+        self.tasks[path] = stored
+        self._terms[path] = terms
+        self.projects.setdefault(stored['projectId'], set()).add(path)
+        self.assignees.setdefault(stored['assigneeId'], set()).add(path)
+        for word, weight in terms.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                if not self._unsorted:
+                    bisect.insort(self.words, word)
+            posting[path] = weight
+
+    def remove_project(self, project_id: str):
+        """Remove every task of a project"""
+        for path in list(self.projects.get(project_id, ())):
+            self.set_task(path, None)
+
+    def _idf(self, word: str) -> float:
+        return math.log(1.0 + len(self.tasks) / len(self.postings[word]))
+
+    def _matches(self, word: str, prefix: bool) -> Dict[str, float]:
+        """Score of each task matching one query word"""
+        scores = {}
+        if word in self.postings:
+            idf = self._idf(word)
+            scores = {path: weight * idf for path, weight in self.postings[word].items()}
+        if not prefix:
+            return scores
+        start = bisect.bisect_left(self.words, word)
+        for expansion in self.words[start:start + MAX_PREFIX_TERMS + 1]:
+            if not expansion.startswith(word):
+                break
+            if expansion == word:
+                continue
+            idf = self._idf(expansion) * PREFIX_WEIGHT
+            for path, weight in self.postings[expansion].items():
+                score = weight * idf
+                if score > scores.get(path, 0.0):
+                    scores[path] = score
+        return scores
+
+    def _prefix_score(self, path: str, word: str) -> float:
+        """Score of a task for a query word matched as a prefix, 0 if it does not match"""
+        best = 0.0
+        for term, weight in self._terms[path].items():
+            if term.startswith(word):
+                score = weight * self._idf(term) * (1.0 if term == word else PREFIX_WEIGHT)
+                if score > best:
+                    best = score
+        return best
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True,
+               filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Find the tasks containing every word of a query
+
+        Args:
+            query: Words to find; the last one also matches as a prefix. May be
+                empty when filtering by assigneeId, to list the assignee's tasks
+                by title
+            limit: Maximum number of results
+            prefix: Whether the last word matches as a prefix
+            filters: Stored fields the tasks must equal, e.g. {"status": "todo"}
+
+        Returns:
+            Up to limit tasks, best first, each with its score, and the number of matches
+        """
+        filters = dict(filters or {})
+        words = list(dict.fromkeys(tokenize(query)))
+        last = words.pop() if prefix and words else None
+        # (tasks, idf) to intersect, tasks mapping paths to weights
+        matches = [(self.postings.get(word, {}), self._idf(word) if word in self.postings else 0.0) for word in words]
+        if 'assigneeId' in filters:
+            matches.append((self.assignees.get(filters.pop('assigneeId'), set()), 0.0))
+        if matches:
+            # Intersect from the rarest word, so only its tasks are looked at
+            matches.sort(key=lambda match: len(match[0]))
+            tasks, idf = matches[0]
+            scores = {path: (tasks[path] * idf if idf else 0.0) for path in tasks}
+            for tasks, idf in matches[1:]:
+                if not scores:
+                    break
+                if idf:
+                    scores = {path: score + tasks[path] * idf for path, score in scores.items() if path in tasks}
+                else:
+                    scores = {path: score for path, score in scores.items() if path in tasks}
+            if last is not None and len(scores) <= PREFIX_SCAN_TASKS:
+                # Look for the prefix among the few candidates' words rather than expanding it
+                scores = {path: score + extra for path, score in scores.items()
+                          for extra in (self._prefix_score(path, last),) if extra}
+            elif last is not None:
+                other = self._matches(last, True)
+                scores = {path: score + other[path] for path, score in scores.items() if path in other}
+        elif last is not None:
+            scores = self._matches(last, True)
+        else:
+            return [], 0
+        if filters:
+            scores = {path: score for path, score in scores.items()
+                      if all(self.tasks[path].get(field) == value for field, value in filters.items())}
+        if words or last is not None:
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        else:
+            best = heapq.nsmallest(limit, scores.items(), key=lambda item: (str(self.tasks[item[0]]['title'] or ''), item[0]))
+        return [dict(self.tasks[path], score=round(score, 4)) for path, score in best], len(scores)
+
+    def snapshot(self) -> List[List[Any]]:
+        """The indexed tasks as rows of their path and STORED_FIELDS, to rebuild the index from"""
+        return [[path, *(stored[field] for field in STORED_FIELDS)] for path, stored in self.tasks.items()]
+
+    @classmethod
+    def from_snapshot(cls, rows: List[List[Any]]) -> 'WorkspaceIndex':
+        """Rebuild an index from snapshot rows"""
+        index = cls()
+        index._unsorted = True
+        for path, *values in rows:
+            index.set_task(path, dict(zip(STORED_FIELDS, values)))
+        index.words = sorted(index.postings)
+        index._unsorted = False
+        return index
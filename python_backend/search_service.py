@@ -0,0 +1,265 @@
+"""
+Search Service for TaskFlow Python Backend
+
+Task search per workspace over an in-memory inverted index (see
+search_index.py). Each project's tasks are indexed once from its task list,
+like the dashboard's counters, and then kept up to date from the Firestore
+listeners' changes. Indexes are saved to SQLite as compressed snapshots;
+after a restart, a workspace's first search is answered from its snapshot
+while the index catches up with Firestore in the background. Only the most
+recently searched workspaces keep their index; the others are dropped, and
+rebuilt from their snapshot when searched again.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from database import Database
+from firestore_store import FirestoreStore, TASKS, firestore_store, tasks_path
+from memory_tracker import memory_tracker
+from metrics import metrics
+from search_index import WorkspaceIndex
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_snapshots (
+    workspace_id TEXT PRIMARY KEY,
+    snapshot BLOB NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+class WorkspaceSearch:
+    def __init__(self, index: WorkspaceIndex, saved_at: float):
+        """Initialize the search state of a workspace"""
+        self.index = index
+        # Project ID -> ID of the listener its tasks follow, None while indexing them
+        self.projects = {}
+        # Tasks changed while their project is indexed, newer than its task list
+        self.changed = set()
+        self.syncing = False
+        self.dirty = False
+        self.saved_at = saved_at
+
+
+class SearchService:
+    def __init__(self, store: Optional[FirestoreStore] = None, database: Optional[Database] = None,
+                 snapshot_interval: float = 300.0, max_workspaces: int = 100):
+        """
+        Initialize the search service
+
+        Args:
+            store: Firestore store, defaults to the global one
+            database: SQLite database for the snapshots, defaults to DATABASE_PATH (opened on first use)
+            snapshot_interval: Seconds between snapshots of a changed index, 0 to never save them
+            max_workspaces: Maximum number of workspace indexes kept, least recently searched dropped first
+        """
+        self.store = store or firestore_store
+        self.database = database or Database()
+        self.snapshot_interval = snapshot_interval
+        self.max_workspaces = max_workspaces
+        self._workspaces = OrderedDict()  # workspace ID -> WorkspaceSearch, least recently searched first
+        self._lock = threading.Lock()
+        # Indexing reads whole task lists; one at a time
+        self._build_lock = threading.Lock()
+        self._schema_ready = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search')
+        self.store.subscribe(self._on_change)
+        memory_tracker.track('search_indexes', lambda: self._workspaces,
+                             lambda: sum(len(search.index) for search in list(self._workspaces.values())))
+        logger.info("Search service initialized")
+
+    def _on_change(self, path: str, data: Optional[Dict[str, Any]]):
+        """Index a task change seen by the Firestore listeners"""
+        collection_path, _, _ = path.rpartition('/')
+        if not collection_path.endswith(f"/{TASKS}"):
+            return
+        segments = path.split('/')
+        with self._lock:
+            search = self._workspaces.get(segments[1])
+            if search is None or segments[3] not in search.projects:
+                return
+            search.index.set_task(path, data)
+            search.dirty = True
+            if search.projects[segments[3]] is None:
+                search.changed.add(path)
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            self.database.connection.executescript(SCHEMA)
+            self._schema_ready = True
+
+    def _load_snapshot(self, workspace_id: str) -> Optional[WorkspaceIndex]:
+        try:
+            self._ensure_schema()
+            row = self.database.connection.execute(
+                'SELECT snapshot FROM search_snapshots WHERE workspace_id = ?', (workspace_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return WorkspaceIndex.from_snapshot(json.loads(zlib.decompress(row[0])))
+        except Exception as e:
+            logger.error(f"Failed to load the search snapshot of workspace {workspace_id}: {e}")
+            return None
+
+    def save_snapshot(self, workspace_id: str) -> int:
+        """
+        Save a workspace's index to SQLite
+
+        Args:
+            workspace_id: Workspace ID
+
+        Returns:
+            Size of the snapshot in bytes, 0 if the workspace is not indexed
+        """
+        with self._lock:
+            search = self._workspaces.get(workspace_id)
+        if search is None:
+            return 0
+        return self._save(workspace_id, search)
+
+    def _save(self, workspace_id: str, search: WorkspaceSearch) -> int:
+        with self._lock:
+            rows = search.index.snapshot()
+            search.dirty = False
+            search.saved_at = time.monotonic()
+        snapshot = zlib.compress(json.dumps(rows, separators=(',', ':'), default=str).encode(), 6)
+        self._ensure_schema()
+        with self.database.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO search_snapshots VALUES (?, ?, ?)',
+                               (workspace_id, snapshot, time.time()))
+        logger.info(f"Saved the search index of workspace {workspace_id}: {len(rows)} tasks, {len(snapshot)} bytes")
+        return len(snapshot)
+
+    def _sync(self, workspace_id: str, search: WorkspaceSearch):
+        """Index the projects whose tasks do not follow a listener, and drop deleted projects"""
+        project_ids = [project["id"] for project in self.store.get_workspace_projects(workspace_id)]
+        with self._lock:
+            for project_id in (set(search.index.projects) | set(search.projects)) - set(project_ids):
+                search.index.remove_project(project_id)
+                search.projects.pop(project_id, None)
+                search.dirty = True
+
+        for project_id in project_ids:
+            path = tasks_path(workspace_id, project_id)
+            if search.projects.get(project_id) is not None \
+                    and search.projects[project_id] == self.store.listener_id(path):
+                continue
+            with self._build_lock:
+                if search.projects.get(project_id) is not None \
+                        and search.projects[project_id] == self.store.listener_id(path):
+                    continue
+                with self._lock:
+                    # Changes from here on are applied, and win over the task list
+                    search.projects[project_id] = None
+                tasks = self.store.get_project_tasks(workspace_id, project_id)
+                with self._lock:
+                    # Replace what was indexed before, e.g. from a snapshot, in one step
+                    paths = {f"{path}/{task['id']}": task for task in tasks}
+                    for task_path in search.index.projects.get(project_id, set()) - paths.keys() - search.changed:
+                        search.index.set_task(task_path, None)
+                    for task_path, task in paths.items():
+                        if task_path not in search.changed:
+                            search.index.set_task(task_path, task)
+                    search.changed = {task_path for task_path in search.changed if not task_path.startswith(f"{path}/")}
+                    search.dirty = True
+                    # Read after the task list, which starts the listener
+                    search.projects[project_id] = self.store.listener_id(path)
+
+    def _sync_in_background(self, workspace_id: str, search: WorkspaceSearch):
+        try:
+            self._sync(workspace_id, search)
+        except Exception as e:
+            logger.error(f"Failed to update the search index of workspace {workspace_id}: {e}")
+        finally:
+            search.syncing = False
+
+    def _evict(self):
+        """Drop the least recently searched indexes beyond max_workspaces, saving the changed ones"""
+        evicted = []
+        with self._lock:
+            while len(self._workspaces) > self.max_workspaces:
+                evicted.append(self._workspaces.popitem(last=False))
+        for workspace_id, search in evicted:
+            logger.info(f"Dropped the search index of workspace {workspace_id}: {len(search.index)} tasks")
+            if search.dirty and self.snapshot_interval > 0:
+                self._executor.submit(self._save_in_background, workspace_id, search)
+
+    def _workspace(self, workspace_id: str) -> WorkspaceSearch:
+        """A workspace's search state, brought up to date unless that is under way"""
+        with self._lock:
+            search = self._workspaces.get(workspace_id)
+            if search is not None:
+                self._workspaces.move_to_end(workspace_id)
+        if search is None:
+            index = self._load_snapshot(workspace_id)
+            with self._lock:
+                search = self._workspaces.get(workspace_id)
+                if search is None:
+                    # A new index is saved once built, a restored one after the interval
+                    search = WorkspaceSearch(index or WorkspaceIndex(), time.monotonic() if index else 0.0)
+                    search.syncing = index is not None
+                    self._workspaces[workspace_id] = search
+            self._evict()
+            if index is not None and search.syncing:
+                logger.info(f"Restored the search index of workspace {workspace_id}: {len(index)} tasks")
+                self._executor.submit(self._sync_in_background, workspace_id, search)
+                return search
+        if not search.syncing:
+            self._sync(workspace_id, search)
+        return search
+
+    @metrics.timed('search')
+    def search(self, workspace_id: str, query: str, limit: int = 20, prefix: bool = True,
+               filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Search a workspace's tasks
+
+        Args:
+            workspace_id: Workspace ID
+            query: Words to find in task titles, tags and descriptions; the
+                last one also matches as a prefix
+            limit: Maximum number of results
+            prefix: Whether the last word matches as a prefix
+            filters: Task fields to match exactly: projectId, status, assigneeId
+
+        Returns:
+            The best matching tasks with their scores, the number of matches,
+            and whether the index is still catching up after a restart
+        """
+        search = self._workspace(workspace_id)
+        with self._lock:
+            results, total = search.index.search(query, limit, prefix, filters)
+            save = search.dirty and self.snapshot_interval > 0 \
+                and time.monotonic() - search.saved_at >= self.snapshot_interval
+            if save:
+                # Only one save is queued
+                search.saved_at = time.monotonic()
+        if save:
+            self._executor.submit(self._save_in_background, workspace_id)
+        return {"results": results, "total": total, "stale": search.syncing}
+
+    def _save_in_background(self, workspace_id: str, search: Optional[WorkspaceSearch] = None):
+        try:
+            if search is None:
+                self.save_snapshot(workspace_id)
+            else:
+                self._save(workspace_id, search)
+        except Exception as e:
+            logger.error(f"Failed to save the search index of workspace {workspace_id}: {e}")
+
+
+# Global instance
+search_service = SearchService(
+    snapshot_interval=float(os.getenv('SEARCH_SNAPSHOT_INTERVAL', '300')),
+    max_workspaces=int(os.getenv('SEARCH_MAX_WORKSPACES', '100'))
+)
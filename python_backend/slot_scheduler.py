@@ -0,0 +1,253 @@
+"""
+Slot Scheduler for TaskFlow Python Backend
+
+Groups per-user schedules into slots: all entries on the same schedule
+share one APScheduler job, which runs the slot's entries in batches when it
+fires. APScheduler then holds one job per distinct schedule rather than one
+per user, and adding or removing an entry is a dict operation. Slots are
+also kept sorted by their next fire time, so the next entries to run are
+found without looking at the others.
+"""
+
+import bisect
+import hashlib
+import itertools
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from task_scheduler import TaskScheduler
+
+logger = logging.getLogger(__name__)
+
+# An entry to add: (entry_id, trigger, last_run_time or None, paused)
+SlotEntry = Tuple[str, Any, Optional[datetime], bool]
+
+
+class SlotScheduler:
+    def __init__(self, name: str, run_batch: Callable[[List[str]], None],
+                 task_scheduler: TaskScheduler, batch_size: int = 500, profile: str = 'io'):
+        """
+        Initialize the slot scheduler
+
+        Args:
+            name: Prefix of the slot job IDs
+            run_batch: Called with the IDs of at most batch_size due entries
+            task_scheduler: Scheduler running the slot jobs
+            batch_size: Maximum number of entries per run_batch call
+            profile: Executor profile of the slot jobs
+        """
+        self.name = name
+        self.run_batch = run_batch
+        self.task_scheduler = task_scheduler
+        self.batch_size = batch_size
+        self.profile = profile
+        self._slots = {}  # trigger -> entry IDs, a dict used as an ordered set
+        self._entry_slots = {}  # entry ID -> trigger
+        self._paused = set()
+        self._slot_jobs = {}  # trigger -> APScheduler job ID
+        self._job_ids = itertools.count(1)
+        self._next_runs = {}  # trigger -> next fire time
+        self._fire_order = []  # (next fire time, job ID, trigger), sorted
+        # Bumped whenever a slot's next fire time changes
+        self.generation = 0
+        self._next_runs_digest = (None, None)  # (generation, digest of the next fire times)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entry_slots)
+
+    def containers(self) -> Tuple:
+        """The slots and entries held, for memory accounting"""
+        return self._slots, self._entry_slots, self._paused, self._slot_jobs, self._next_runs, self._fire_order
+
+    def add_many(self, entries: Iterable[SlotEntry]) -> int:
+        """
+        Add entries, replacing entries with the same ID
+
+        An entry whose schedule fired after its last run, within the misfire
+        grace time, runs once right away.
+
+        Args:
+            entries: Entries to add
+
+        Returns:
+            Number of entries added
+        """
+        import pytz
+
+        now = datetime.now(pytz.utc)
+        memo = {}
+        missed = []
+        count = 0
+        with self._lock:
+            for entry_id, trigger, last_run_time, paused in entries:
+                self._remove(entry_id)
+                if trigger not in self._slots:
+                    self._add_slot(trigger)
+                self._slots[trigger][entry_id] = None
+                self._entry_slots[entry_id] = trigger
+                if paused:
+                    self._paused.add(entry_id)
+                elif last_run_time is not None:
+                    latest_missed, _ = self.task_scheduler.fire_times(trigger, now, memo, self.profile)
+                    if latest_missed is not None and latest_missed > last_run_time:
+                        missed.append(entry_id)
+                count += 1
+
+        if missed:
+            logger.info(f"Catching up on a missed run of {len(missed)} {self.name} entries")
+            # Numbered like the slot jobs, so their telemetry shares one label
+            job_id = f"{self.name}-catch-up-{next(self._job_ids)}"
+            self.task_scheduler.scheduler.add_job(self._run_batches, args=(missed,), id=job_id,
+                                                  **self.task_scheduler.job_options(self.profile))
+        return count
+
+    def add(self, entry_id: str, trigger, last_run_time: Optional[datetime] = None, paused: bool = False):
+        """
+        Add an entry, replacing an entry with the same ID
+
+        Args:
+            entry_id: Entry ID
+            trigger: Schedule; entries share a slot when their triggers are the same object
+            last_run_time: When the entry last ran, to catch up on a missed run
+            paused: Whether the entry starts paused
+        """
+        self.add_many(((entry_id, trigger, last_run_time, paused),))
+
+    def remove(self, entry_id: str) -> bool:
+        """
+        Remove an entry
+
+        Returns:
+            Whether the entry existed
+        """
+        with self._lock:
+            return self._remove(entry_id)
+
+    def set_paused(self, entry_id: str, paused: bool):
+        """
+        Pause or resume an entry
+
+        Args:
+            entry_id: Entry ID
+            paused: Whether to pause it
+        """
+        with self._lock:
+            if entry_id not in self._entry_slots:
+                raise KeyError(entry_id)
+            if paused:
+                self._paused.add(entry_id)
+            else:
+                self._paused.discard(entry_id)
+
+    def job_id(self, entry_id: str) -> Optional[str]:
+        """ID of the APScheduler job that runs an entry"""
+        trigger = self._entry_slots.get(entry_id)
+        return self._slot_jobs.get(trigger) if trigger is not None else None
+
+    def next_run_time(self, entry_id: str) -> Optional[datetime]:
+        """When an entry runs next, None if it is paused or unknown"""
+        trigger = self._entry_slots.get(entry_id)
+        if trigger is None or entry_id in self._paused:
+            return None
+        return self._next_runs.get(trigger)
+
+    def next_entries(self, limit: int) -> List[Tuple[str, datetime]]:
+        """
+        Get the entries that run next
+
+        Walks the slots in fire order, so only the slots holding the returned
+        entries are visited, plus those holding only paused entries.
+
+        Args:
+            limit: Maximum number of entries
+
+        Returns:
+            (entry_id, next run time) pairs, soonest first
+        """
+        entries = []
+        with self._lock:
+            for next_run_time, _, trigger in self._fire_order:
+                for entry_id in self._slots[trigger]:
+                    if entry_id in self._paused:
+                        continue
+                    entries.append((entry_id, next_run_time))
+                    if len(entries) >= limit:
+                        return entries
+        return entries
+
+    def next_runs_version(self) -> str:
+        """
+        A digest of the slots' next fire times
+
+        Unlike generation, which counts changes in this process, it is equal
+        in every worker whose slots fire next at the same times.
+
+        Returns:
+            Hex digest
+        """
+        with self._lock:
+            generation, digest = self._next_runs_digest
+            if generation != self.generation:
+                times = ','.join(repr(next_run_time.timestamp()) for next_run_time, _, _ in self._fire_order)
+                digest = hashlib.blake2b(times.encode(), digest_size=8).hexdigest()
+                self._next_runs_digest = (self.generation, digest)
+            return digest
+
+    def _set_next_run(self, trigger, next_run_time: Optional[datetime]):
+        # Caller holds the lock
+        previous = self._next_runs.pop(trigger, None)
+        if previous is not None:
+            # Job IDs are unique, so triggers are never compared
+            index = bisect.bisect_left(self._fire_order, (previous, self._slot_jobs[trigger]))
+            del self._fire_order[index]
+        if next_run_time is not None:
+            self._next_runs[trigger] = next_run_time
+            bisect.insort(self._fire_order, (next_run_time, self._slot_jobs[trigger], trigger))
+        self.generation += 1
+
+    def _add_slot(self, trigger):
+        # Caller holds the lock
+        job_id = f"{self.name}-slot-{next(self._job_ids)}"
+        job = self.task_scheduler.scheduler.add_job(self._fire, trigger, args=(trigger,), id=job_id,
+                                                    **self.task_scheduler.job_options(self.profile))
+        self._slots[trigger] = {}
+        self._slot_jobs[trigger] = job_id
+        self._set_next_run(trigger, job.next_run_time)
+
+    def _remove(self, entry_id: str) -> bool:
+        # Caller holds the lock
+        trigger = self._entry_slots.pop(entry_id, None)
+        if trigger is None:
+            return False
+        self._paused.discard(entry_id)
+        entries = self._slots[trigger]
+        del entries[entry_id]
+        if not entries:
+            # Keep one job per schedule in use
+            self._set_next_run(trigger, None)
+            del self._slots[trigger]
+            self.task_scheduler.scheduler.remove_job(self._slot_jobs.pop(trigger))
+        return True
+
+    def _fire(self, trigger):
+        """Job function of a slot: run its entries that are not paused"""
+        import pytz
+
+        with self._lock:
+            if trigger not in self._slots:
+                return
+            entry_ids = [entry_id for entry_id in self._slots[trigger] if entry_id not in self._paused]
+            self._set_next_run(trigger, trigger.get_next_fire_time(None, datetime.now(pytz.utc)))
+        self._run_batches(entry_ids)
+
+    def _run_batches(self, entry_ids: List[str]):
+        for start in range(0, len(entry_ids), self.batch_size):
+            batch = entry_ids[start:start + self.batch_size]
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                # One failed batch does not hold up the rest of the slot
+                logger.error(f"Failed to run a batch of {len(batch)} {self.name} entries: {e}")
@@ -0,0 +1,81 @@
+"""
+Startup Timing for TaskFlow Python Backend
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self):
+        """Initialize the startup timer"""
+        self.started_at = time.perf_counter()
+        self.last_checkpoint = self.started_at
+        self.phases = {}
+        self.first_response_seconds = None
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, start: float, elapsed: float):
+        with self._lock:
+            self.phases[name] = {
+                "offsetMs": round((start - self.started_at) * 1000, 3),
+                "durationMs": round(elapsed * 1000, 3)
+            }
+        logger.info(f"Startup phase {name} took {elapsed * 1000:.1f} ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a startup phase
+
+        Args:
+            name: Phase name, e.g. 'firebase' or 'scheduler'
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter() - start)
+
+    def checkpoint(self, name: str):
+        """
+        Record the time since the previous checkpoint as a phase
+
+        Args:
+            name: Phase name, e.g. 'imports'
+        """
+        now = time.perf_counter()
+        start, self.last_checkpoint = self.last_checkpoint, now
+        self._record(name, start, now - start)
+
+    def mark_first_response(self):
+        """Record the time from the start of the import to the first response"""
+        if self.first_response_seconds is not None:
+            return
+        with self._lock:
+            if self.first_response_seconds is None:
+                self.first_response_seconds = time.perf_counter() - self.started_at
+                logger.info(f"First response {self.first_response_seconds * 1000:.1f} ms after import")
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Get the startup timing report
+
+        Returns:
+            Phase timings and the import-to-first-response time in milliseconds
+        """
+        with self._lock:
+            return {
+                "phases": dict(self.phases),
+                "firstResponseMs": round(self.first_response_seconds * 1000, 3)
+                if self.first_response_seconds is not None else None
+            }
+
+
+# Global instance
+startup_timer = StartupTimer()
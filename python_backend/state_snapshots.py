@@ -0,0 +1,405 @@
+"""
+State Snapshots for TaskFlow Python Backend
+
+Periodic binary snapshots of the in-memory state that has no durable
+backend (analytics events, rate limiter windows), so a restarted worker
+picks up where the previous one left off. Preferences, scheduled tasks,
+search indexes and events are kept in SQLite already.
+
+Each registered state saves itself as named NumPy columns. One snapshot
+file holds the columns of every state: a struct-packed directory of section
+names, dtypes, offsets and lengths, then each section's raw bytes, 8-byte
+aligned, with a CRC-32 over everything. Files are written in the
+background to a temporary file that replaces the previous snapshot
+atomically, and restored by memory-mapping them, so columns are read
+straight from the page cache without parsing.
+
+State is per worker, so each worker takes a slot (a lock file held for as
+long as it runs) and snapshots to that slot's file. A worker started in a
+slot restores its file; snapshots of slots nobody has taken since, e.g.
+after scaling down, are merged into a running worker.
+"""
+
+import atexit
+import gc
+import glob
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from database import default_database_path
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TFSTATE\x00'
+FORMAT_VERSION = 1
+
+# Magic, format version, section count, CRC-32 of the directory and sections
+HEADER = struct.Struct('<8sIII')
+# Section name, NumPy dtype string, offset, length in bytes
+SECTION = struct.Struct('<48s16sQQ')
+ALIGNMENT = 8
+
+SLOT_FILE = re.compile(r'worker-(\d+)\.snapshot$')
+
+# Saves the columns of a state
+SaveState = Callable[[], Dict[str, Any]]
+# Restores (merges) the columns of a state, returning the number of records restored
+RestoreState = Callable[[Dict[str, Any]], int]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def pack_strings(strings: List[str]) -> Dict[str, Any]:
+    """
+    Pack strings as two columns: their UTF-8 bytes concatenated, and offsets
+
+    Args:
+        strings: Strings, e.g. a table of the distinct values of a column
+
+    Returns:
+        {"offsets": int64 array of len(strings) + 1, "bytes": uint8 array}
+    """
+    import numpy as np
+
+    encoded = [string.encode('utf-8', 'surrogatepass') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return {"offsets": offsets, "bytes": np.frombuffer(b''.join(encoded), np.uint8)}
+
+
+def unpack_strings(offsets, data) -> List[str]:
+    """Strings packed by pack_strings"""
+    data = data.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode('utf-8', 'surrogatepass') for start, end in zip(bounds, bounds[1:])]
+
+
+@contextmanager
+def paused_gc():
+    """Pause the cyclic garbage collector, e.g. while restoring millions of objects that all stay alive"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write_snapshot(path: str, sections: Dict[str, Any]) -> int:
+    """
+    Write one-dimensional arrays to a snapshot file, atomically
+
+    Args:
+        path: Snapshot file, replaced only once the new one is on disk
+        sections: Section name -> NumPy array
+
+    Returns:
+        Size of the file in bytes
+    """
+    import numpy as np
+
+    arrays = [(name, np.ascontiguousarray(array).reshape(-1)) for name, array in sections.items()]
+    offset = _aligned(HEADER.size + SECTION.size * len(arrays))
+    directory = []
+    for name, array in arrays:
+        directory.append(SECTION.pack(name.encode(), array.dtype.str.encode(), offset, array.nbytes))
+        offset = _aligned(offset + array.nbytes)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(arrays), 0))
+            crc = 0
+            position = HEADER.size
+            for entry in directory:
+                file.write(entry)
+                crc = zlib.crc32(entry, crc)
+                position += len(entry)
+            for (_, array), entry in zip(arrays, directory):
+                start = SECTION.unpack(entry)[2]
+                padding = b'\0' * (start - position)
+                file.write(padding)
+                crc = zlib.crc32(padding, crc)
+                data = array.view(np.uint8)
+                file.write(data)
+                crc = zlib.crc32(data, crc)
+                position = start + array.nbytes
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(arrays), crc))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+    # Make the rename itself durable
+    if hasattr(os, 'O_DIRECTORY'):
+        directory_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+    return position
+
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Map a snapshot file into memory
+
+    Args:
+        path: Snapshot file
+
+    Returns:
+        Section name -> read-only NumPy array over the mapped file
+
+    Raises:
+        ValueError: The file is not a snapshot, or is corrupt
+    """
+    import numpy as np
+
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            raise ValueError(f"{path} is too short to be a state snapshot")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count, crc = HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} state snapshot")
+    if zlib.crc32(memoryview(mapped)[HEADER.size:]) != crc:
+        raise ValueError(f"{path} is corrupt")
+
+    sections = {}
+    for index in range(count):
+        name, dtype, offset, length = SECTION.unpack_from(mapped, HEADER.size + index * SECTION.size)
+        dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        sections[name.rstrip(b'\0').decode()] = np.frombuffer(mapped, dtype, length // dtype.itemsize, offset)
+    return sections
+
+
+class RegisteredState:
+    def __init__(self, name: str, save: SaveState, restore: RestoreState, version: Optional[Callable[[], Hashable]]):
+        """Initialize a registered state"""
+        self.name = name
+        self.save = save
+        self.restore = restore
+        self.version = version
+
+
+class StateSnapshots:
+    def __init__(self, directory: Optional[str] = None, interval: float = 60.0):
+        """
+        Initialize the state snapshots
+
+        Args:
+            directory: Directory of the snapshot and slot lock files, defaults to <DATABASE_PATH>.state
+            interval: Seconds between snapshots, 0 to neither save nor restore them
+        """
+        self.directory = directory or f"{default_database_path()}.state"
+        self.interval = interval
+        self.states = {}  # name -> RegisteredState
+        self.slot = None
+        self.started = False
+        self._slot_file = None
+        self._saved_versions = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._duration = metrics.histogram(
+            'taskflow_state_snapshot_seconds', 'Time spent saving or restoring state snapshots', ('operation',)
+        )
+        self._size = metrics.gauge('taskflow_state_snapshot_bytes', 'Size of the last state snapshot saved').labels()
+
+    def register(self, name: str, save: SaveState, restore: RestoreState,
+                 version: Optional[Callable[[], Hashable]] = None):
+        """
+        Include a state in the snapshots
+
+        Args:
+            name: State name, the prefix of its section names
+            save: Returns the state as section name -> one-dimensional NumPy array
+            restore: Merges saved sections into the state, returning the number of records restored
+            version: Returns a value that changes with the state; snapshots are skipped while no
+                state's version changes. Without one the state counts as always changed
+        """
+        self.states[name] = RegisteredState(name, save, restore, version)
+
+    def _slot_path(self, slot: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"worker-{slot}.{suffix}")
+
+    def _try_lock(self, slot: int):
+        """The slot's lock file, locked, or None if another worker holds it"""
+        lock_file = open(self._slot_path(slot, 'lock'), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def start(self):
+        """
+        Take a slot, restore its snapshot and start saving to it (once per worker)
+
+        Returns once the snapshot is restored, so that requests served
+        afterwards add to the restored state; concurrent callers wait for it.
+        """
+        if self.started:
+            return
+        with self._lock:
+            if self.started:
+                return
+            try:
+                if self.interval > 0:
+                    self._take_slot()
+                    self.restore(self._slot_path(self.slot, 'snapshot'))
+                    self._thread = threading.Thread(target=self._run, name='state-snapshots', daemon=True)
+                    self._thread.start()
+                    atexit.register(self._save_on_exit)
+            finally:
+                # Not retried on failure
+                self.started = True
+
+    def _take_slot(self):
+        os.makedirs(self.directory, exist_ok=True)
+        slot = 0
+        while self._slot_file is None:
+            self._slot_file = self._try_lock(slot)
+            if self._slot_file is None:
+                slot += 1
+        self.slot = slot
+        logger.info(f"Process {os.getpid()} took state snapshot slot {slot}")
+
+    def restore(self, path: str) -> int:
+        """
+        Merge a snapshot file into the registered states
+
+        Args:
+            path: Snapshot file
+
+        Returns:
+            Number of records restored, 0 if the file is missing or unreadable
+        """
+        if not os.path.exists(path):
+            return 0
+        start = time.perf_counter()
+        try:
+            sections = read_snapshot(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read state snapshot {path}: {e}")
+            return 0
+
+        restored = 0
+        for state in list(self.states.values()):
+            prefix = f"{state.name}."
+            columns = {name[len(prefix):]: array for name, array in sections.items() if name.startswith(prefix)}
+            if not columns:
+                continue
+            try:
+                restored += state.restore(columns)
+            except Exception as e:
+                logger.error(f"Failed to restore {state.name} from state snapshot {path}: {e}")
+        elapsed = time.perf_counter() - start
+        self._duration.labels('restore').observe(elapsed)
+        logger.info(f"Restored {restored} records from state snapshot {path} in {elapsed:.2f}s")
+        return restored
+
+    def save(self, force: bool = False) -> int:
+        """
+        Save the registered states to this worker's slot
+
+        Args:
+            force: Save even if no state changed since the last snapshot
+
+        Returns:
+            Size of the snapshot in bytes, 0 if it was skipped
+        """
+        if self.slot is None:
+            return 0
+        with self._save_lock:
+            versions = {name: state.version() if state.version else object()
+                        for name, state in list(self.states.items())}
+            if not force and versions == self._saved_versions:
+                return 0
+            start = time.perf_counter()
+            sections = {}
+            for state in list(self.states.values()):
+                try:
+                    for name, array in state.save().items():
+                        sections[f"{state.name}.{name}"] = array
+                except Exception as e:
+                    logger.error(f"Failed to save {state.name} to the state snapshot: {e}")
+            size = write_snapshot(self._slot_path(self.slot, 'snapshot'), sections)
+            self._saved_versions = versions
+            self._duration.labels('save').observe(time.perf_counter() - start)
+            self._size.set(size)
+            return size
+
+    def adopt_orphans(self) -> int:
+        """
+        Merge the snapshots of slots no worker holds, then remove them
+
+        Returns:
+            Number of records restored
+        """
+        restored = 0
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.snapshot')):
+            match = SLOT_FILE.search(path)
+            slot = int(match.group(1)) if match else None
+            if slot is None or slot == self.slot:
+                continue
+            lock_file = self._try_lock(slot)
+            if lock_file is None:
+                continue
+            try:
+                if os.path.exists(path):
+                    restored += self.restore(path)
+                    # Saved first, so the records are never in no snapshot
+                    self.save(force=True)
+                    os.remove(path)
+            finally:
+                lock_file.close()
+        return restored
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.save()
+                if fcntl is not None:
+                    self.adopt_orphans()
+            except Exception as e:
+                logger.error(f"State snapshot failed: {e}")
+
+    def _save_on_exit(self):
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Failed to save the state snapshot on exit: {e}")
+
+
+# Global instance
+state_snapshots = StateSnapshots(
+    directory=os.getenv('STATE_SNAPSHOT_DIR'),
+    interval=float(os.getenv('STATE_SNAPSHOT_INTERVAL', '60'))
+)
@@ -2,30 +2,260 @@
 Task Scheduler Service for TaskFlow Python Backend
 """
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.interval import IntervalTrigger
 import atexit
-from datetime import datetime
-import pytz
-from typing import Callable, Optional
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
 import logging
+from database import default_database_path
+from leader import LeaderLock
+from metrics import metrics
+from scheduler_telemetry import SchedulerTelemetry
+from startup import startup_timer
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A job to restore: (func, job_id, trigger, args, last_run_time or None, paused)
+JobSpec = Tuple[Callable, str, Any, Sequence, Optional[datetime], bool]
+
+# Executor profiles. Jobs of each profile run in its own thread pool, so a
+# long report cannot hold up the short I/O jobs. 'cpu' jobs hand their heavy
+# computation to worker processes through offload_map, off the GIL of the
+# process serving requests. Missed runs are coalesced into one, and skipped
+# once later than misfire_grace_time seconds.
+EXECUTOR_PROFILES = {
+    'io': {
+        'workers': int(os.getenv('SCHEDULER_IO_WORKERS', '10')),
+        'max_instances': 1,
+        'coalesce': True,
+        'misfire_grace_time': int(os.getenv('SCHEDULER_MISFIRE_GRACE_TIME', '3600'))
+    },
+    'cpu': {
+        'workers': int(os.getenv('SCHEDULER_CPU_WORKERS', str(os.cpu_count() or 1))),
+        'max_instances': 1,
+        'coalesce': True,
+        # A late report still beats none
+        'misfire_grace_time': int(os.getenv('SCHEDULER_CPU_MISFIRE_GRACE_TIME', '21600'))
+    }
+}
+
 class TaskScheduler:
-    def __init__(self):
-        """Initialize the task scheduler"""
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.start()
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Initialize the task scheduler
+        
+        Args:
+            profiles: Executor profiles by name, defaults to EXECUTOR_PROFILES
+        """
+        # The APScheduler instance is created and started on first use
+        self._scheduler = None
+        self._process_pool = None
+        self._lock = threading.Lock()
+        self.profiles = profiles or EXECUTOR_PROFILES
+        self.misfire_grace_time = self.profiles['io']['misfire_grace_time']
+        # Triggers hold no state, so jobs on the same schedule share one
+        self._triggers = {}
+        # Every worker schedules the jobs; jobs that must run once check is_leader
+        self.leader = LeaderLock(os.getenv('SCHEDULER_LOCK_PATH', f"{default_database_path()}.scheduler-lock"))
+        self.telemetry = SchedulerTelemetry()
+    
+    @property
+    def scheduler(self):
+        """The background scheduler, started on first access"""
+        if self._scheduler is None:
+            with self._lock:
+                if self._scheduler is None:
+                    with startup_timer.phase('scheduler'):
+                        from apscheduler.executors.pool import ThreadPoolExecutor
+                        from apscheduler.schedulers.background import BackgroundScheduler
+                        scheduler = BackgroundScheduler(
+                            executors={
+                                self._executor(name): ThreadPoolExecutor(profile['workers'])
+                                for name, profile in self.profiles.items()
+                            },
+                            job_defaults=self.job_options('io')
+                        )
+                        self.telemetry.attach(scheduler)
+                        scheduler.start()
+                    
+                    # Shut down the scheduler when exiting the app
+                    atexit.register(lambda: scheduler.shutdown())
+                    self._scheduler = scheduler
+                    logger.info("Task scheduler initialized")
+        return self._scheduler
+    
+    @staticmethod
+    def _executor(profile: str) -> str:
+        # Jobs added without a profile run on APScheduler's 'default' executor
+        return 'default' if profile == 'io' else profile
+    
+    def job_options(self, profile: str = 'io') -> Dict[str, Any]:
+        """
+        Get the add_job options routing a job to an executor profile
+        
+        Args:
+            profile: Executor profile name
+            
+        Returns:
+            executor, max_instances, coalesce and misfire_grace_time
+        """
+        settings = self.profiles[profile]
+        return {
+            'executor': self._executor(profile),
+            'max_instances': settings['max_instances'],
+            'coalesce': settings['coalesce'],
+            'misfire_grace_time': settings['misfire_grace_time']
+        }
+    
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        """Worker processes for CPU-bound work, started on first use"""
+        if self._process_pool is None:
+            with self._lock:
+                if self._process_pool is None:
+                    # Forking a process running request and scheduler threads could copy held locks
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    pool = ProcessPoolExecutor(max_workers=self.profiles['cpu']['workers'], mp_context=context)
+                    atexit.register(pool.shutdown)
+                    self._process_pool = pool
+                    logger.info(f"Started {self.profiles['cpu']['workers']} worker processes")
+        return self._process_pool
+    
+    def offload_map(self, func: Callable, items: Iterable) -> Iterator:
+        """
+        Apply a CPU-bound function to items in the worker processes
+        
+        The function must be defined at module level, and the items and
+        results must be picklable.
+        
+        Args:
+            func: Function to apply
+            items: Items, e.g. chunks of a large job
+            
+        Returns:
+            Iterator over the results, in the order of the items, each
+            available as soon as it and those before it are done
+        """
+        return self.process_pool.map(func, items)
+    
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process runs the jobs that must run once across workers"""
+        return self.leader.held
+    
+    def report(self) -> Dict[str, Any]:
+        """
+        Get the scheduler report
+        
+        Returns:
+            Whether this process is the leader, the number of jobs, and the
+            run telemetry per job label
+        """
+        scheduler = self._scheduler
+        return {
+            "running": scheduler is not None and scheduler.running,
+            "leader": self.is_leader,
+            "jobs": len(scheduler.get_jobs()) if scheduler is not None else 0,
+            "telemetry": self.telemetry.report()
+        }
+    
+    def cron_trigger(self, timezone: str, cron_expression: str = None, **fields):
+        """
+        Build a cron trigger, importing APScheduler on first use
+        
+        Triggers are cached, so equal schedules return the same trigger.
+        
+        Args:
+            timezone: Timezone name
+            cron_expression: Optional crontab expression
+            fields: Cron fields when no expression is given
+        """
+        key = (timezone, cron_expression, tuple(sorted(fields.items())))
+        trigger = self._triggers.get(key)
+        if trigger is not None:
+            return trigger
+        
+        import pytz
+        from apscheduler.triggers.cron import CronTrigger
+        
+        tz = pytz.timezone(timezone)
+        if cron_expression is not None:
+            trigger = CronTrigger.from_crontab(cron_expression, timezone=tz)
+        else:
+            trigger = CronTrigger(timezone=tz, **fields)
+        self._triggers[key] = trigger
+        return trigger
+    
+    def fire_times(self, trigger, now: datetime, memo: Optional[Dict[int, Tuple]] = None,
+                   profile: str = 'io') -> Tuple[Optional[datetime], Optional[datetime]]:
+        """
+        Get a trigger's latest fire time within the misfire grace time, and its next one
         
-        # Shut down the scheduler when exiting the app
-        atexit.register(lambda: self.scheduler.shutdown())
-        logger.info("Task scheduler initialized")
+        Args:
+            trigger: Trigger
+            now: Current time
+            memo: Results by trigger, so jobs sharing a trigger compute them once
+            profile: Executor profile whose misfire grace time applies
+            
+        Returns:
+            The latest missed fire time (None if there is none) and the next fire time
+        """
+        memo = {} if memo is None else memo
+        fire_times = memo.get(id(trigger))
+        if fire_times is None:
+            latest_missed = None
+            grace_time = timedelta(seconds=self.profiles[profile]['misfire_grace_time'])
+            fire_time = trigger.get_next_fire_time(None, now - grace_time)
+            while fire_time is not None and fire_time <= now:
+                latest_missed = fire_time
+                fire_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(microseconds=1))
+            fire_times = memo[id(trigger)] = (latest_missed, fire_time)
+        return fire_times
     
-    def schedule_daily_task_reminders(self, func: Callable, hour: int = 9, minute: int = 0, timezone: str = 'UTC'):
+    @metrics.timed('scheduler')
+    def restore_jobs(self, jobs: Iterable[JobSpec], profile: str = 'io') -> int:
+        """
+        Add many jobs at once, e.g. when rebuilding them from storage at startup
+        
+        Next run times are computed per trigger rather than per job. A job
+        whose trigger fired after its last run, while nothing was running it,
+        runs once right away if that was within the misfire grace time.
+        
+        Args:
+            jobs: Jobs to add, replacing jobs with the same ID
+            profile: Executor profile of the jobs
+            
+        Returns:
+            Number of jobs added
+        """
+        import pytz
+        
+        scheduler = self.scheduler
+        now = datetime.now(pytz.utc)
+        memo = {}
+        options = self.job_options(profile)
+        count = missed = 0
+        for func, job_id, trigger, args, last_run_time, paused in jobs:
+            if paused:
+                next_run_time = None
+            else:
+                latest_missed, next_run_time = self.fire_times(trigger, now, memo, profile)
+                if latest_missed is not None and last_run_time is not None and latest_missed > last_run_time:
+                    next_run_time = latest_missed
+                    missed += 1
+            scheduler.add_job(func, trigger, id=job_id, args=args, next_run_time=next_run_time,
+                              replace_existing=True, **options)
+            count += 1
+        logger.info(f"Restored {count} jobs, {missed} catching up on a missed run")
+        return count
+    
+    @metrics.timed('scheduler')
+    def schedule_daily_task_reminders(self, func: Callable, hour: int = 9, minute: int = 0, timezone: str = 'UTC',
+                                      job_id: str = 'daily_task_reminders', profile: str = 'io'):
         """
         Schedule daily task reminders
         
@@ -34,18 +264,21 @@ class TaskScheduler:
             hour: Hour to run (24-hour format)
             minute: Minute to run
             timezone: Timezone for scheduling (default: UTC)
+            job_id: Unique job identifier
+            profile: Executor profile
         """
         try:
-            tz = pytz.timezone(timezone)
-            trigger = CronTrigger(hour=hour, minute=minute, timezone=tz)
-            job = self.scheduler.add_job(func, trigger, id='daily_task_reminders')
+            trigger = self.cron_trigger(timezone, hour=hour, minute=minute)
+            job = self.scheduler.add_job(func, trigger, id=job_id, **self.job_options(profile))
             logger.info(f"Daily task reminders scheduled for {hour}:{minute} in timezone {timezone}")
             return job
         except Exception as e:
             logger.error(f"Failed to schedule daily task reminders: {e}")
             raise
     
-    def schedule_weekly_report(self, func: Callable, day_of_week: str = 'mon', hour: int = 9, minute: int = 0, timezone: str = 'UTC'):
+    @metrics.timed('scheduler')
+    def schedule_weekly_report(self, func: Callable, day_of_week: str = 'mon', hour: int = 9, minute: int = 0, timezone: str = 'UTC',
+                               job_id: str = 'weekly_report', profile: str = 'cpu'):
         """
         Schedule weekly reports
         
@@ -55,35 +288,83 @@ class TaskScheduler:
             hour: Hour to run (24-hour format)
             minute: Minute to run
             timezone: Timezone for scheduling (default: UTC)
+            job_id: Unique job identifier
+            profile: Executor profile, 'cpu' as reports for many users are CPU-bound
         """
         try:
-            tz = pytz.timezone(timezone)
-            trigger = CronTrigger(day_of_week=day_of_week, hour=hour, minute=minute, timezone=tz)
-            job = self.scheduler.add_job(func, trigger, id='weekly_report')
+            trigger = self.cron_trigger(timezone, day_of_week=day_of_week, hour=hour, minute=minute)
+            job = self.scheduler.add_job(func, trigger, id=job_id, **self.job_options(profile))
             logger.info(f"Weekly report scheduled for {day_of_week} at {hour}:{minute} in timezone {timezone}")
             return job
         except Exception as e:
             logger.error(f"Failed to schedule weekly report: {e}")
             raise
     
-    def schedule_overdue_task_check(self, func: Callable, interval_minutes: int = 30):
+    @metrics.timed('scheduler')
+    def schedule_summary_delivery(self, func: Callable, profile: str = 'cpu'):
+        """
+        Schedule the hourly summary delivery tick
+        
+        Runs at the top of every hour, UTC; the job itself looks up the users
+        whose local delivery hour has come.
+        
+        Args:
+            func: Function to call
+            profile: Executor profile
+        """
+        try:
+            trigger = self.cron_trigger('UTC', minute=0)
+            job = self.scheduler.add_job(func, trigger, id='summary_delivery', **self.job_options(profile))
+            logger.info("Summary delivery scheduled hourly")
+            return job
+        except Exception as e:
+            logger.error(f"Failed to schedule summary delivery: {e}")
+            raise
+    
+    @metrics.timed('scheduler')
+    def schedule_overdue_task_check(self, func: Callable, interval_minutes: int = 30, profile: str = 'io'):
         """
         Schedule periodic overdue task checks
         
         Args:
             func: Function to call
             interval_minutes: Interval in minutes
+            profile: Executor profile
         """
         try:
+            from apscheduler.triggers.interval import IntervalTrigger
             trigger = IntervalTrigger(minutes=interval_minutes)
-            job = self.scheduler.add_job(func, trigger, id='overdue_task_check')
+            job = self.scheduler.add_job(func, trigger, id='overdue_task_check', **self.job_options(profile))
             logger.info(f"Overdue task check scheduled every {interval_minutes} minutes")
             return job
         except Exception as e:
             logger.error(f"Failed to schedule overdue task check: {e}")
             raise
     
-    def schedule_custom_task(self, func: Callable, cron_expression: str, job_id: str, timezone: str = 'UTC'):
+    @metrics.timed('scheduler')
+    def schedule_interval_job(self, func: Callable, job_id: str, profile: str = 'io', **interval):
+        """
+        Schedule a job at a fixed interval
+        
+        Args:
+            func: Function to call
+            job_id: Unique job identifier
+            profile: Executor profile
+            interval: Interval fields, e.g. seconds=10
+        """
+        try:
+            from apscheduler.triggers.interval import IntervalTrigger
+            job = self.scheduler.add_job(func, IntervalTrigger(**interval), id=job_id, replace_existing=True,
+                                         **self.job_options(profile))
+            logger.info(f"Job {job_id} scheduled every {interval}")
+            return job
+        except Exception as e:
+            logger.error(f"Failed to schedule job {job_id}: {e}")
+            raise
+    
+    @metrics.timed('scheduler')
+    def schedule_custom_task(self, func: Callable, cron_expression: str, job_id: str, timezone: str = 'UTC',
+                             profile: str = 'io'):
         """
         Schedule a custom task with a cron expression
         
@@ -92,18 +373,20 @@ class TaskScheduler:
             cron_expression: Cron expression
             job_id: Unique job identifier
             timezone: Timezone for scheduling (default: UTC)
+            profile: Executor profile
         """
         try:
-            tz = pytz.timezone(timezone)
-            trigger = CronTrigger.from_crontab(cron_expression, timezone=tz)
-            job = self.scheduler.add_job(func, trigger, id=job_id)
+            trigger = self.cron_trigger(timezone, cron_expression=cron_expression)
+            job = self.scheduler.add_job(func, trigger, id=job_id, **self.job_options(profile))
             logger.info(f"Custom task {job_id} scheduled with cron expression {cron_expression} in timezone {timezone}")
             return job
         except Exception as e:
             logger.error(f"Failed to schedule custom task {job_id}: {e}")
             raise
     
-    def schedule_recurring_task(self, func: Callable, task_id: str, cron_expression: str, timezone: str = 'UTC'):
+    @metrics.timed('scheduler')
+    def schedule_recurring_task(self, func: Callable, task_id: str, cron_expression: str, timezone: str = 'UTC',
+                                profile: str = 'io'):
         """
         Schedule a recurring task with a cron expression
         
@@ -112,17 +395,19 @@ class TaskScheduler:
             task_id: Unique task identifier
             cron_expression: Cron expression
             timezone: Timezone for scheduling (default: UTC)
+            profile: Executor profile
         """
         try:
-            tz = pytz.timezone(timezone)
-            trigger = CronTrigger.from_crontab(cron_expression, timezone=tz)
-            job = self.scheduler.add_job(func, trigger, id=task_id, name=f"Recurring task: {task_id}")
+            trigger = self.cron_trigger(timezone, cron_expression=cron_expression)
+            job = self.scheduler.add_job(func, trigger, id=task_id, name=f"Recurring task: {task_id}",
+                                         **self.job_options(profile))
             logger.info(f"Recurring task {task_id} scheduled with cron expression {cron_expression} in timezone {timezone}")
             return job
         except Exception as e:
             logger.error(f"Failed to schedule recurring task {task_id}: {e}")
             raise
     
+    @metrics.timed('scheduler')
     def remove_job(self, job_id: str):
         """
         Remove a scheduled job
@@ -137,6 +422,7 @@ class TaskScheduler:
             logger.error(f"Failed to remove job {job_id}: {e}")
             raise
     
+    @metrics.timed('scheduler')
     def get_jobs(self):
         """
         Get all scheduled jobs
@@ -152,6 +438,7 @@ class TaskScheduler:
             logger.error(f"Failed to retrieve scheduled jobs: {e}")
             raise
     
+    @metrics.timed('scheduler')
     def pause_job(self, job_id: str):
         """
         Pause a scheduled job
@@ -166,6 +453,7 @@ class TaskScheduler:
             logger.error(f"Failed to pause job {job_id}: {e}")
             raise
     
+    @metrics.timed('scheduler')
     def resume_job(self, job_id: str):
         """
         Resume a paused job
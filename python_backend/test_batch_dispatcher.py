@@ -0,0 +1,78 @@
+"""
+Tests for the /api/batch dispatcher: sub-requests run the view decorators
+the batch request has not already run, such as the admin key check
+"""
+
+import tracemalloc
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from benchmark import ADMIN_KEY, BENCHMARK_USER, install_fakes
+
+backend = install_fakes()
+
+
+@pytest.fixture
+def client():
+    backend.request_counts.clear()
+    with backend.app.app_context():
+        token = create_access_token(identity=BENCHMARK_USER)
+    client = backend.app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def batch(client, *sub_requests):
+    response = client.post("/api/batch", json={"requests": list(sub_requests)})
+    assert response.status_code == 200
+    return response.get_json()["responses"]
+
+
+def get_paths():
+    """A path for every route answering GET, other than the ones a batch refuses"""
+    paths = []
+    for rule in backend.app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.endpoint in backend.batch_dispatcher.excluded_endpoints:
+            continue
+        if rule.endpoint == "static":
+            continue
+        paths.append(rule.build({argument: "1" for argument in rule.arguments})[1])
+    return paths
+
+
+@pytest.mark.parametrize("path", get_paths())
+def test_sub_request_is_refused_like_a_direct_request(client, path):
+    direct = client.get(path)
+    [sub_response] = batch(client, {"method": "GET", "path": path})
+    assert (sub_response["status"] == 403) == (direct.status_code == 403), path
+
+
+def test_admin_endpoints_need_the_admin_key_in_a_batch(client):
+    admin_paths = [path for path in get_paths() if client.get(path).status_code == 403]
+    assert "/api/admin/memory" in admin_paths
+    assert "/api/preferences/changes" in admin_paths
+
+    sub_responses = batch(client, *({"method": "GET", "path": path} for path in admin_paths))
+    assert [sub_response["status"] for sub_response in sub_responses] == [403] * len(admin_paths)
+
+    sub_responses = batch(client, *({"method": "GET", "path": path, "headers": {"X-Admin-Key": ADMIN_KEY}}
+                                    for path in admin_paths))
+    assert all(sub_response["status"] != 403 for sub_response in sub_responses)
+
+
+def test_admin_post_is_refused_in_a_batch(client):
+    was_tracing = tracemalloc.is_tracing()
+    [sub_response] = batch(client, {"method": "POST", "path": "/api/admin/memory/snapshots"})
+    assert sub_response["status"] == 403
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_batch_is_authenticated_and_rate_limited_once(client):
+    sub_responses = batch(client, *({"method": "GET", "path": "/api/health"} for _ in range(3)))
+    assert [sub_response["status"] for sub_response in sub_responses] == [200] * 3
+    assert len(backend.request_counts["127.0.0.1"]) == 1
+
+    anonymous = backend.app.test_client()
+    response = anonymous.post("/api/batch", json={"requests": [{"method": "GET", "path": "/api/admin/memory"}]})
+    assert response.status_code == 401
@@ -0,0 +1,124 @@
+"""
+Tests for bulk task operations over the in-memory Firestore fake
+"""
+
+import os
+
+import pytest
+
+from benchmark import FakeFirestore
+from bulk_task_service import BulkTaskService
+from database import Database
+from firestore_store import FirestoreStore, project_path, task_path, workspace_path
+from user_preferences_service import UserPreferencesService
+
+OWNER = "owner"
+
+
+class RecordingNotifications:
+    def __init__(self):
+        self.sent = []
+
+    def send_assignment_notifications(self, assignments, workspace_name):
+        self.sent.append((dict(assignments), workspace_name))
+        return {"success_count": len(assignments), "failure_count": 0}
+
+
+@pytest.fixture
+def client():
+    client = FakeFirestore()
+    client.set(workspace_path("w"), {"name": "Workspace", "ownerId": OWNER, "members": [OWNER, "u1", "u2"]})
+    client.set(project_path("w", "p"), {"name": "Project"})
+    for member, status in ((OWNER, "accepted"), ("u1", "accepted"), ("u2", "accepted"), ("u3", "invited")):
+        client.set(f"{project_path('w', 'p')}/members/{member}", {"userId": member, "status": status})
+    for n in range(4):
+        client.set(task_path("w", "p", f"t{n}"), {"title": f"Task {n}", "status": "todo", "assigneeId": None})
+    return client
+
+
+@pytest.fixture
+def preferences(tmp_path):
+    return UserPreferencesService(Database(os.path.join(tmp_path, "preferences.db")))
+
+
+@pytest.fixture
+def notifications():
+    return RecordingNotifications()
+
+
+@pytest.fixture
+def service(client, notifications, preferences):
+    store = FirestoreStore(client)
+    yield BulkTaskService(store, notifications, preferences)
+    store.close()
+
+
+def apply(service, *operations):
+    workspace = service.store.get_workspace("w")
+    return service.apply(workspace, list(operations), OWNER)
+
+
+def assign(task_id, assignee_id):
+    return {"type": "assign", "projectId": "p", "taskId": task_id, "assigneeId": assignee_id}
+
+
+def test_assignees_who_turned_notifications_off_are_not_notified(service, notifications, preferences):
+    preferences.update_user_preferences("u2", {"taskAssignment": False})
+
+    result = apply(service, assign("t0", "u1"), assign("t1", "u1"), assign("t2", "u2"))
+    assert result["succeeded"] == 3
+    assert result["notified"] == 1
+    assert notifications.sent == [({"u1": ["Task 0", "Task 1"]}, "Workspace")]
+
+
+def test_no_notification_when_every_assignee_opted_out(service, notifications, preferences):
+    preferences.update_user_preferences("u1", {"taskAssignment": False})
+
+    result = apply(service, assign("t0", "u1"))
+    assert result["succeeded"] == 1
+    assert result["notified"] == 0
+    assert notifications.sent == []
+
+
+def assignment(client, task_id, user_id):
+    return client.documents.get(f"{task_path('w', 'p', task_id)}/assignments/{user_id}")
+
+
+def test_assign_writes_the_assignment_document(service, client):
+    result = apply(service, assign("t0", "u1"))
+    assert result["results"] == [{"index": 0, "status": "ok"}]
+    assert client.documents[task_path("w", "p", "t0")]["assigneeId"] == "u1"
+    document = assignment(client, "t0", "u1")
+    assert document["taskId"] == "t0" and document["userId"] == "u1"
+    assert document["role"] == "assignee" and document["status"] == "accepted"
+
+
+def test_reassign_replaces_the_previous_assignee_only(service, client):
+    apply(service, assign("t0", "u1"))
+    client.set(f"{task_path('w', 'p', 't0')}/assignments/u2", {"taskId": "t0", "userId": "u2",
+                                                              "role": "reviewer", "status": "accepted"})
+
+    apply(service, assign("t0", OWNER))
+    assert assignment(client, "t0", "u1") is None
+    assert assignment(client, "t0", OWNER)["role"] == "assignee"
+    assert assignment(client, "t0", "u2")["role"] == "reviewer"
+
+    apply(service, assign("t0", None))
+    assert client.documents[task_path("w", "p", "t0")]["assigneeId"] is None
+    assert assignment(client, "t0", OWNER) is None
+    assert assignment(client, "t0", "u2") is not None
+
+
+def test_assignee_must_be_an_accepted_project_member(service, client):
+    result = apply(service, assign("t0", "u3"), assign("t1", "stranger"))
+    assert [r["error"] for r in result["results"]] == ["Assignee is not a member of the project"] * 2
+    assert client.documents[task_path("w", "p", "t0")]["assigneeId"] is None
+    assert assignment(client, "t0", "u3") is None
+
+
+def test_move_keeps_the_assignment(service, client):
+    client.set(project_path("w", "q"), {"name": "Other project"})
+    apply(service, assign("t0", "u1"))
+    apply(service, {"type": "move", "projectId": "p", "taskId": "t0", "targetProjectId": "q"})
+    assert assignment(client, "t0", "u1") is None
+    assert client.documents[f"{task_path('w', 'q', 't0')}/assignments/u1"]["role"] == "assignee"
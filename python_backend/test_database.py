@@ -0,0 +1,98 @@
+"""
+Tests for the SQLite database under gevent's monkey-patching, run in a
+subprocess as patching cannot be undone
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip("gevent")
+
+GEVENT_WORKER = """
+from gevent import monkey
+monkey.patch_all()
+
+import sqlite3
+import sys
+import time
+
+import gevent
+
+from database import Database
+from preferences_store import PreferencesStore
+
+path = sys.argv[1]
+database = Database(path)
+
+def check_same_connection():
+    connections = gevent.joinall([gevent.spawn(lambda: database.connection) for _ in range(5)])
+    assert len({id(greenlet.value) for greenlet in connections}) == 1, "one connection per greenlet"
+
+def check_sync_skipped_without_commits():
+    store = PreferencesStore(database, {"flag": True}, ("flag",))
+    store.update("u1", {"flag": False})
+    reads = []
+    database.connection.set_trace_callback(reads.append)
+    gevent.joinall([gevent.spawn(store.get, "u1") for _ in range(5)])
+    database.connection.set_trace_callback(None)
+    assert not any("version > " in statement for statement in reads), reads
+
+def check_write_lock_wait_yields():
+    database.busy_timeout = 5
+    database.connection.execute("CREATE TABLE t (n INTEGER)")
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    ticks = []
+
+    def tick():
+        while len(ticks) < 10:
+            ticks.append(time.monotonic())
+            gevent.sleep(0.01)
+        other.execute("COMMIT")
+
+    def write():
+        with database.transaction() as connection:
+            connection.execute("INSERT INTO t VALUES (1)")
+        return len(ticks)
+
+    writer, ticker = gevent.spawn(write), gevent.spawn(tick)
+    gevent.joinall([writer, ticker], raise_error=True)
+    assert writer.value == 10, f"the writer waited for {writer.value} ticks"
+    assert database.connection.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+def check_write_lock_wait_times_out():
+    database.busy_timeout = 0.05
+    database.connection
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with database.transaction():
+            pass
+    except sqlite3.OperationalError as e:
+        assert "locked" in str(e)
+    else:
+        raise AssertionError("the transaction began while another connection held the write lock")
+    finally:
+        other.execute("COMMIT")
+
+for check in sys.argv[2:]:
+    globals()[check]()
+"""
+
+
+@pytest.mark.parametrize("check", [
+    "check_same_connection",
+    "check_sync_skipped_without_commits",
+    "check_write_lock_wait_yields",
+    "check_write_lock_wait_times_out",
+])
+def test_under_gevent(tmp_path, check):
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(GEVENT_WORKER), str(tmp_path / "gevent.db"), check],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
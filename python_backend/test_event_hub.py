@@ -0,0 +1,68 @@
+"""
+Tests for the event hub: replay on reconnect and fan-out right after a worker starts
+"""
+
+import os
+import queue
+import threading
+
+import pytest
+
+from database import Database
+from event_hub import EventHub
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(os.path.join(tmp_path, "events.db"))
+
+
+def make_hub(database, started=None):
+    """A hub whose fan-out thread, if started is given, waits for it to be set before running"""
+    hub = EventHub(database, poll_interval=0.01, heartbeat=0.05, coalesce_interval=0.01)
+    if started is not None:
+        run = hub._run
+        hub._run = lambda: started.wait() and run()
+    return hub
+
+
+def received(subscription, timeout=2.0):
+    """Event IDs of the messages a subscription has received, waiting for the first one"""
+    ids = []
+    while True:
+        try:
+            message = subscription.queue.get(timeout=timeout if not ids else 0.2)
+        except queue.Empty:
+            return ids
+        ids.append(int(message.split("\n", 1)[0][len("id: "):]))
+
+
+def test_first_reconnect_to_a_new_hub_replays_missed_events(database):
+    make_hub(database).publish_many(("u1", "preferences", {"n": n}) for n in range(10))
+
+    # A restarted worker, before its fan-out thread has run
+    started = threading.Event()
+    hub = make_hub(database, started)
+    subscription = hub.subscribe("u1", last_event_id=3)
+    assert received(subscription, timeout=0) == list(range(4, 11))
+    started.set()
+
+
+def test_events_published_right_after_subscribing_are_delivered(database):
+    make_hub(database).publish("u1", "preferences", {"n": 0})
+
+    started = threading.Event()
+    hub = make_hub(database, started)
+    subscription = hub.subscribe("u1")
+    hub.publish("u1", "preferences", {"n": 1})
+    started.set()
+    assert received(subscription) == [2]
+
+
+def test_events_from_another_worker_are_fanned_out(database):
+    hub = make_hub(database)
+    subscription = hub.subscribe("u1")
+    other = make_hub(database)
+    other.publish("u2", "preferences", {})
+    other.publish("u1", "scheduled_task", {})
+    assert received(subscription) == [2]
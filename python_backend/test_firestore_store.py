@@ -0,0 +1,193 @@
+"""
+Tests for the Firestore store's cache over the in-memory Firestore fake:
+TTL expiry, LRU eviction, listener invalidation and the listener cap
+"""
+
+import pytest
+
+import firestore_store as firestore_store_module
+from benchmark import FakeFirestore, FakeFirestoreReference
+from firestore_store import FirestoreStore, project_path, task_path, tasks_path, workspace_path
+
+
+class RacingFirestore(FakeFirestore):
+    """Runs a write right after a document is read, as another client could between the read and its caching"""
+
+    def __init__(self):
+        super().__init__()
+        self.after_read = {}  # path -> function called once after the document is read
+
+    def document(self, path):
+        return RacingReference(self, path)
+
+    collection = document
+
+
+class RacingReference(FakeFirestoreReference):
+    def get(self):
+        snapshot = super().get()
+        after_read = self.client.after_read.pop(self.path, None)
+        if after_read is not None:
+            after_read()
+        return snapshot
+
+
+@pytest.fixture
+def client():
+    client = RacingFirestore()
+    client.set(workspace_path("w"), {"name": "Workspace"})
+    for project_id in ("p0", "p1", "p2"):
+        client.set(project_path("w", project_id), {"name": project_id})
+        for n in range(3):
+            client.set(task_path("w", project_id, f"t{n}"), {"title": f"Task {n}", "status": "todo"})
+    return client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(firestore_store_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def watched(client, path):
+    return len(client.listeners.get(path, ()))
+
+
+def test_reads_are_cached(client):
+    store = FirestoreStore(client)
+    assert store.get_task("w", "p0", "t0")["title"] == "Task 0"
+    reads = client.reads
+    assert store.get_task("w", "p0", "t0")["id"] == "t0"
+    assert store.get_task("w", "p0", "missing") is None
+    store.get_task("w", "p0", "missing")
+    assert client.reads == reads + 1
+
+
+def test_entries_expire_after_the_ttl(client, clock):
+    store = FirestoreStore(client, ttl=60)
+    store.get_task("w", "p0", "t0")
+    reads = client.reads
+
+    clock[0] += 59
+    store.get_task("w", "p0", "t0")
+    assert client.reads == reads
+
+    clock[0] += 2
+    store.get_task("w", "p0", "t0")
+    assert client.reads == reads + 1
+
+
+def test_least_recently_read_entries_are_evicted(client):
+    store = FirestoreStore(client, cache_size=2)
+    store.get_task("w", "p0", "t0")
+    store.get_task("w", "p0", "t1")
+    store.get_task("w", "p0", "t0")  # t1 is now the least recently read
+    store.get_task("w", "p0", "t2")
+    reads = client.reads
+
+    store.get_task("w", "p0", "t0")
+    store.get_task("w", "p0", "t2")
+    assert client.reads == reads
+    store.get_task("w", "p0", "t1")
+    assert client.reads == reads + 1
+
+
+def test_writes_reach_the_cache_through_the_listeners(client):
+    store = FirestoreStore(client)
+    assert [task["status"] for task in store.get_project_tasks("w", "p0")] == ["todo"] * 3
+    store.get_task("w", "p0", "t0")
+    assert store.get_project("w", "p0")["name"] == "p0"
+
+    client.set(task_path("w", "p0", "t0"), {"title": "Task 0", "status": "done"})
+    client.set(project_path("w", "p0"), {"name": "Renamed"})
+    assert store.get_task("w", "p0", "t0")["status"] == "done"
+    assert [task["status"] for task in store.get_project_tasks("w", "p0")] == ["done", "todo", "todo"]
+    assert store.get_project("w", "p0")["name"] == "Renamed"
+
+    client.delete(task_path("w", "p0", "t1"))
+    assert store.get_task("w", "p0", "t1") is None
+    assert len(store.get_project_tasks("w", "p0")) == 2
+
+
+def test_subscribers_see_the_changes(client):
+    store = FirestoreStore(client)
+    changes = []
+    store.subscribe(lambda path, data: changes.append((path, data and data["status"])))
+    store.get_project_tasks("w", "p0")
+
+    client.set(task_path("w", "p0", "t0"), {"title": "Task 0", "status": "done"})
+    client.delete(task_path("w", "p0", "t1"))
+    client.set(task_path("w", "p1", "t0"), {"title": "Task 0", "status": "done"})  # Not watched
+    assert changes == [(task_path("w", "p0", "t0"), "done"), (task_path("w", "p0", "t1"), None)]
+
+
+def test_listeners_are_capped_and_evicted_paths_invalidated(client):
+    store = FirestoreStore(client, max_listeners=2)
+    store.get_project_tasks("w", "p0")
+    store.get_project_tasks("w", "p1")
+    first_id = store.listener_id(tasks_path("w", "p0"))
+    assert watched(client, tasks_path("w", "p0")) == 1 and watched(client, tasks_path("w", "p1")) == 1
+
+    # A third listener stops the least recently used one and evicts what it kept fresh
+    store.get_project_tasks("w", "p2")
+    assert watched(client, tasks_path("w", "p0")) == 0
+    assert store.listener_id(tasks_path("w", "p0")) is None
+    assert sum(1 for path in client.listeners if client.listeners[path]) == 2
+
+    reads = client.reads
+    client.set(task_path("w", "p0", "t0"), {"title": "Task 0", "status": "done"})
+    tasks = store.get_project_tasks("w", "p0")
+    assert client.reads > reads
+    assert tasks[0]["status"] == "done"
+    # Listening again, with a new ID so subscribers know changes may have been missed
+    assert store.listener_id(tasks_path("w", "p0")) not in (None, first_id)
+    assert watched(client, tasks_path("w", "p1")) == 0
+
+
+def test_recently_read_listeners_are_kept(client):
+    store = FirestoreStore(client, max_listeners=2)
+    store.get_project_tasks("w", "p0")
+    store.get_project_tasks("w", "p1")
+    store.get_task("w", "p0", "t0")  # Same listener as p0's task list, now the most recent
+    store.get_project_tasks("w", "p2")
+    assert watched(client, tasks_path("w", "p0")) == 1
+    assert watched(client, tasks_path("w", "p1")) == 0
+
+
+def test_a_read_overtaken_by_a_change_is_not_cached(client):
+    store = FirestoreStore(client)
+    store.get_project_tasks("w", "p0")  # Start the listener
+    path = task_path("w", "p0", "t0")
+    client.after_read[path] = lambda: client.set(path, {"title": "Task 0", "status": "done"})
+
+    # The read returns what it read, but the change it missed evicted it
+    assert store.get_task("w", "p0", "t0")["status"] == "todo"
+    assert store.get_task("w", "p0", "t0")["status"] == "done"
+
+
+def test_a_batched_read_overtaken_by_a_change_is_not_cached(client):
+    store = FirestoreStore(client)
+    store.get_project_tasks("w", "p0")
+    keys = [("w", "p0", f"t{n}") for n in range(3)]
+    path = task_path(*keys[1])
+    client.after_read[path] = lambda: client.set(path, {"title": "Task 1", "status": "done"})
+
+    tasks = store.get_tasks(keys)
+    assert [tasks[key]["status"] for key in keys] == ["todo"] * 3
+    reads = client.reads
+    tasks = store.get_tasks(keys)
+    assert [tasks[key]["status"] for key in keys] == ["todo", "done", "todo"]
+    # Only the overtaken read is read again
+    assert client.reads == reads + 1
+
+
+def test_close_stops_every_listener(client):
+    store = FirestoreStore(client)
+    store.get_project_tasks("w", "p0")
+    store.get_workspace("w")
+    store.close()
+    assert not any(client.listeners.values())
+    reads = client.reads
+    store.get_workspace("w")
+    assert client.reads == reads + 1
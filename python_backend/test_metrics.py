@@ -0,0 +1,105 @@
+"""
+Tests for the request metrics and service timings
+"""
+
+import time
+
+import pytest
+from flask import Flask, abort, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+from metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def app(registry):
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-key-of-at-least-32-bytes"
+    JWTManager(app)
+
+    @app.route("/ok")
+    def ok():
+        return jsonify({}), 201
+
+    @app.route("/missing")
+    def missing():
+        abort(404)
+
+    @app.route("/private")
+    @jwt_required()
+    def private():
+        return jsonify({})
+
+    @app.route("/broken")
+    def broken():
+        raise RuntimeError("broken")
+
+    registry.init_app(app)
+    return app
+
+
+def counts(registry):
+    return {values: child.count for values, child in registry.http_duration.items()}
+
+
+def test_status_of_returned_responses(app, registry):
+    app.test_client().get("/ok")
+    assert counts(registry) == {("ok", "GET", "201"): 1}
+
+
+def test_status_of_exceptions_turned_into_responses(app, registry):
+    client = app.test_client()
+    assert client.get("/missing").status_code == 404
+    assert client.get("/private").status_code == 401
+    with app.app_context():
+        token = create_access_token(identity="u1")
+    assert client.get("/private", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert counts(registry) == {
+        ("missing", "GET", "404"): 1,
+        ("private", "GET", "401"): 1,
+        ("private", "GET", "200"): 1,
+    }
+
+
+def test_unhandled_exceptions_are_recorded_as_500(app, registry):
+    assert app.test_client().get("/broken").status_code == 500
+    assert counts(registry) == {("broken", "GET", "500"): 1}
+    assert registry.http_in_flight.labels("broken").value == 0
+
+
+def test_generators_are_timed_over_their_iteration(registry):
+    @registry.timed("test")
+    def produce(count):
+        for n in range(count):
+            time.sleep(0.01)
+            yield n
+
+    histogram = registry.service_duration.labels("test", "produce")
+    items = produce(3)
+    assert histogram.count == 0
+    for _ in items:
+        time.sleep(0.05)  # The caller's time is not the generator's
+    assert histogram.count == 1
+    assert 0.03 <= histogram.snapshot()["sum"] < 0.1
+
+    # Closed early by the caller
+    for _ in produce(3):
+        break
+    assert histogram.count == 2
+
+
+def test_generator_errors_are_counted(registry):
+    @registry.timed("test")
+    def fail():
+        yield 1
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        list(fail())
+    assert registry.service_errors.labels("test", "fail").value == 1
+    assert registry.service_duration.labels("test", "fail").count == 1
@@ -0,0 +1,55 @@
+"""
+Tests for the request profiles ring, shared by the workers through its directory
+"""
+
+import os
+import threading
+
+import pytest
+
+from request_profiler import RequestProfiler, SamplingProfiler
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Two workers' profilers over one profile directory"""
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_MAX_FILES", "4")
+    profilers = [RequestProfiler(), RequestProfiler()]
+    for profiler in profilers:
+        os.makedirs(profiler.profile_dir, exist_ok=True)
+    return profilers
+
+
+def save(profiler, endpoint="get_scheduled_tasks", duration=0.0125):
+    sampler = SamplingProfiler(threading.get_ident(), 0.005)
+    sampler.stacks["app.py:view"] = 3
+    return profiler.save("sample", sampler, endpoint, duration)
+
+
+def test_profiles_are_found_by_every_worker(workers):
+    first, second = workers
+    profile_id = save(first)
+    assert second.get_profile_path(profile_id) == os.path.join(first.profile_dir, profile_id)
+    [profile] = second.list_profiles()
+    assert profile["profileId"] == profile_id
+    assert profile["endpoint"] == "get_scheduled_tasks"
+    assert profile["durationMs"] == 12.5
+    assert profile["mode"] == "sample"
+    assert profile["sizeBytes"] == len("app.py:view 3\n")
+
+
+def test_the_limit_holds_across_workers(workers):
+    first, second = workers
+    profile_ids = [save(workers[n % 2], endpoint=f"endpoint_{n}") for n in range(7)]
+    assert len(os.listdir(first.profile_dir)) == 4 + 1  # And the lock file
+    assert [profile["profileId"] for profile in second.list_profiles()] == profile_ids[:-5:-1]
+    assert first.get_profile_path(profile_ids[0]) is None
+    assert second.get_profile_path(profile_ids[-1]) is not None
+
+
+def test_unknown_and_unsafe_profile_ids_are_not_served(workers):
+    first, _ = workers
+    assert first.get_profile_path("1-missing-1us-0123abcd.prof") is None
+    assert first.get_profile_path("../app.py") is None
+    assert first.get_profile_path(".lock") is None
@@ -0,0 +1,41 @@
+"""
+Tests for running due scheduled tasks
+"""
+
+import os
+
+import pytest
+
+import scheduled_tasks_service as scheduled_tasks_service_module
+from database import Database
+from scheduled_tasks_service import ScheduledTasksService
+from task_scheduler import task_scheduler
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(type(task_scheduler), "is_leader", property(lambda self: True))
+    service = ScheduledTasksService(Database(os.path.join(tmp_path, "tasks.db")))
+    recorded = service.recorded = []
+    monkeypatch.setattr(service.store, "record_runs", lambda task_ids, run_time: recorded.append(list(task_ids)))
+
+    def fail(task):
+        raise RuntimeError("failed")
+    monkeypatch.setitem(scheduled_tasks_service_module.TASK_HANDLERS, "ok", lambda task: None)
+    monkeypatch.setitem(scheduled_tasks_service_module.TASK_HANDLERS, "failing", fail)
+    service.scheduled_tasks.update({
+        "t1": {"taskId": "t1", "taskType": "ok"},
+        "t2": {"taskId": "t2", "taskType": "failing"},
+    })
+    return service
+
+
+def test_runs_are_recorded_in_one_write(service):
+    service.run_tasks(["t1", "t2"])
+    assert service.recorded == [["t1"]]
+
+
+def test_nothing_is_written_when_no_task_ran(service):
+    service.run_tasks(["t2"])
+    service.run_tasks(["missing"])
+    assert service.recorded == []
@@ -0,0 +1,67 @@
+"""
+Tests for the search service's workspace indexes: dropping the least recently searched
+"""
+
+import os
+
+import pytest
+
+from benchmark import FakeFirestore
+from database import Database
+from firestore_store import FirestoreStore, project_path, task_path, workspace_path
+from search_service import SearchService
+
+
+@pytest.fixture
+def store():
+    client = FakeFirestore()
+    for workspace_id in ("w0", "w1", "w2"):
+        client.set(workspace_path(workspace_id), {"name": workspace_id})
+        client.set(project_path(workspace_id, "p"), {"name": "Project"})
+        client.set(task_path(workspace_id, "p", "t"), {"title": f"Report for {workspace_id}", "status": "todo"})
+    store = FirestoreStore(client)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def service(store, tmp_path):
+    return SearchService(store, Database(os.path.join(tmp_path, "search.db")), max_workspaces=2)
+
+
+def wait_for_background(service):
+    service._executor.submit(lambda: None).result()
+
+
+def test_least_recently_searched_indexes_are_dropped(service):
+    service.search("w0", "report")
+    service.search("w1", "report")
+    service.search("w0", "report")  # w1 is now the least recently searched
+    service.search("w2", "report")
+    assert list(service._workspaces) == ["w0", "w2"]
+
+
+def test_a_dropped_index_is_saved_and_restored_from_its_snapshot(service):
+    service.search("w0", "report")
+    service.search("w1", "report")
+    service.search("w2", "report")
+    wait_for_background(service)
+    assert "w0" not in service._workspaces
+
+    result = service.search("w0", "report")
+    assert result["stale"] and result["total"] == 1
+    wait_for_background(service)
+    assert service.search("w0", "report")["stale"] is False
+    assert list(service._workspaces) == ["w2", "w0"]
+
+
+def test_changes_while_dropped_are_caught_up(service, store):
+    service.search("w0", "report")
+    service.search("w1", "report")
+    service.search("w2", "report")
+    store._client.set(task_path("w0", "p", "t2"), {"title": "Report two", "status": "todo"})
+    wait_for_background(service)
+
+    assert service.search("w0", "report")["total"] == 1  # From the snapshot
+    wait_for_background(service)
+    assert service.search("w0", "report")["total"] == 2
@@ -0,0 +1,53 @@
+"""
+Tests for the slot scheduler's next run times version, which scheduled task ETags share between workers
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from slot_scheduler import SlotScheduler
+from task_scheduler import task_scheduler
+
+
+@pytest.fixture
+def triggers():
+    return [task_scheduler.cron_trigger("UTC", hour=hour, minute=0) for hour in (9, 17)]
+
+
+def make_slots(name, triggers):
+    slots = SlotScheduler(name, lambda entry_ids: None, task_scheduler)
+    slots.add_many((f"task_{n}", triggers[n % 2], None, False) for n in range(4))
+    return slots
+
+
+def remove_all(*all_slots):
+    for slots in all_slots:
+        for n in range(4):
+            slots.remove(f"task_{n}")
+
+
+def test_equal_next_runs_give_equal_versions_in_every_worker(triggers):
+    first, second = make_slots("first", triggers), make_slots("second", triggers)
+    try:
+        # Another history of changes in the second worker
+        second.add("task_x", task_scheduler.cron_trigger("UTC", hour=12, minute=0))
+        second.remove("task_x")
+        assert first.generation != second.generation
+        assert first.next_runs_version() == second.next_runs_version()
+    finally:
+        remove_all(first, second)
+
+
+def test_different_next_runs_give_different_versions(triggers):
+    first, second = make_slots("first", triggers), make_slots("second", triggers)
+    try:
+        version = second.next_runs_version()
+        with second._lock:
+            # As in a worker whose slot fired and moved on
+            second._set_next_run(triggers[0], second._next_runs[triggers[0]] + timedelta(days=1))
+        assert second.next_runs_version() != version
+        assert second.next_runs_version() != first.next_runs_version()
+        assert second.next_runs_version() == second.next_runs_version()
+    finally:
+        remove_all(first, second)
@@ -0,0 +1,108 @@
+"""
+Tests for state snapshots of the analytics events: restore on start, orphan adoption and event IDs
+"""
+
+import pytest
+
+import state_snapshots as state_snapshots_module
+from analytics_service import AnalyticsService
+from state_snapshots import StateSnapshots
+
+
+@pytest.fixture(autouse=True)
+def no_save_on_exit(monkeypatch):
+    monkeypatch.setattr(state_snapshots_module.atexit, "register", lambda function: None)
+
+
+class Worker:
+    """An analytics service with its own state snapshots, as one worker process has"""
+
+    def __init__(self, directory):
+        self.analytics = AnalyticsService()
+        self.snapshots = StateSnapshots(str(directory), interval=3600)
+        self.snapshots.register("analytics", self.analytics.save_state, self.analytics.restore_state,
+                                lambda: (id(self.analytics.events), len(self.analytics.events)))
+
+    def record(self, count, user_id="u1"):
+        return [self.analytics.record_user_activity(user_id, "task_completed", {"project_id": "p1"})
+                for _ in range(count)]
+
+    def stop(self):
+        """Exit, leaving the slot's snapshot behind"""
+        self.snapshots.save()
+        self.snapshots._slot_file.close()
+
+    def event_ids(self):
+        return [event["event_id"] for event in self.analytics.events]
+
+
+def event_ids(first, last):
+    return [f"event_{number}" for number in range(first, last + 1)]
+
+
+def test_restart_restores_events_and_numbers_on(tmp_path):
+    worker = Worker(tmp_path)
+    worker.snapshots.start()
+    worker.record(1000)
+    worker.stop()
+
+    restarted = Worker(tmp_path)
+    restarted.snapshots.start()
+    assert restarted.snapshots.slot == 0
+    assert restarted.event_ids() == event_ids(1, 1000)
+    assert restarted.record(1) == ["event_1001"]
+
+
+def test_events_recorded_before_the_restore_keep_ids_unique(tmp_path):
+    worker = Worker(tmp_path)
+    worker.snapshots.start()
+    worker.record(1000)
+    worker.stop()
+
+    restarted = Worker(tmp_path)
+    restarted.record(1, user_id="u2")
+    restarted.snapshots.start()
+    assert restarted.event_ids() == event_ids(1, 1001)
+    assert restarted.analytics.events[0]["user_id"] == "u2"
+    assert restarted.record(1) == ["event_1002"]
+    summary = restarted.analytics.get_user_summary("u1")
+    assert summary["summary"]["tasksCompleted"] == 1001
+
+
+def test_orphaned_snapshots_are_merged_with_new_ids(tmp_path):
+    first, second = Worker(tmp_path), Worker(tmp_path)
+    first.snapshots.start()
+    second.snapshots.start()
+    assert (first.snapshots.slot, second.snapshots.slot) == (0, 1)
+    first.record(3)
+    second.record(2, user_id="u2")
+    first.stop()
+    second.stop()
+
+    # Only one worker comes back
+    restarted = Worker(tmp_path)
+    restarted.snapshots.start()
+    assert restarted.snapshots.adopt_orphans() == 2
+    assert restarted.event_ids() == event_ids(1, 5)
+    assert [event["user_id"] for event in restarted.analytics.events] == ["u1"] * 3 + ["u2"] * 2
+    assert restarted.record(1) == ["event_6"]
+    assert not (tmp_path / "worker-1.snapshot").exists()
+
+    # The merged events are in the adopting worker's own snapshot
+    restarted.stop()
+    again = Worker(tmp_path)
+    again.snapshots.start()
+    assert again.event_ids() == event_ids(1, 6)
+
+
+def test_start_waits_for_the_restore(tmp_path):
+    worker = Worker(tmp_path)
+    worker.snapshots.start()
+    worker.record(10)
+    worker.stop()
+
+    restarted = Worker(tmp_path)
+    assert not restarted.snapshots.started
+    restarted.snapshots.start()
+    assert restarted.snapshots.started
+    assert len(restarted.analytics.events) == 10
@@ -0,0 +1,87 @@
+"""
+Tests for user preferences: validation, the delivery slot index and recipient filtering
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+import pytz
+
+from database import Database
+from user_preferences_service import UserPreferencesService, summary_slots
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(os.path.join(tmp_path, "preferences.db"))
+
+
+@pytest.fixture
+def service(database):
+    return UserPreferencesService(database)
+
+
+NINE_UTC = pytz.utc.localize(datetime(2024, 1, 2, 9))
+
+
+@pytest.mark.parametrize("preferences", [
+    {"timezone": ["x"]},
+    {"timezone": "Not/AZone"},
+    {"summaryHour": 24},
+    {"summaryHour": "9"},
+    {"summaryHour": True},
+])
+def test_invalid_preferences_are_rejected(service, preferences):
+    assert service.validate(preferences)
+    with pytest.raises(ValueError):
+        service.update_user_preferences("u1", preferences)
+    assert service.get_version("u1") == 0
+
+
+def test_valid_preferences_are_accepted(service):
+    assert service.validate({"timezone": "Europe/Berlin", "summaryHour": 0}) is None
+    assert service.update_user_preferences("u1", {"timezone": "Europe/Berlin", "summaryHour": 0})
+
+
+def test_bad_stored_values_fall_back_to_the_defaults():
+    assert summary_slots({"timezone": ["x"], "summaryHour": "soon", "weeklySummary": False}) == (("daily", "UTC", 9),)
+    assert summary_slots({"timezone": "Not/AZone"}) == (("daily", "UTC", 9), ("weekly", "UTC", 9))
+
+
+def test_a_bad_row_does_not_stop_later_syncs(database, service):
+    assert service.get_due_summary_recipients(NINE_UTC)["daily"] == []
+
+    # Written by another worker, or before preferences were validated
+    other = UserPreferencesService(Database(database.path))
+    other.store.update("bad", {"timezone": ["x"]})
+    other.store.update("u1", {"summaryHour": 10})
+    other.update_user_preferences("u2", {"dailySummary": True})
+
+    assert sorted(service.get_due_summary_recipients(NINE_UTC)["daily"]) == ["bad", "u2"]
+    assert service.store.get("u1")[0] == {"summaryHour": 10}
+    service.update_user_preferences("u3", {"taskAssignment": False})
+    assert service.filter_recipients(["u1", "u3"], "task_assignment") == ["u1"]
+
+
+def test_unhashable_slots_leave_the_index_unchanged(database):
+    service = UserPreferencesService(database)
+    service.update_user_preferences("u1", {"summaryHour": 10})
+    assert service.store.slot_users(("daily", "UTC", 10)) == ["u1"]
+
+    service.store.slot_fn = lambda overrides: (("daily", ["x"], 9),)
+    service.store.update("u1", {"summaryHour": 11})
+    assert service.store.slot_users(("daily", "UTC", 10)) == ["u1"]
+    service.store.slot_fn = summary_slots
+    service.update_user_preferences("u1", {"summaryHour": 12})
+    assert service.store.slot_users(("daily", "UTC", 10)) == []
+    assert service.store.slot_users(("daily", "UTC", 12)) == ["u1"]
+
+
+
+def test_recipients_given_as_a_generator_are_all_notified_on_failure(service, monkeypatch):
+    def fail(user_ids, key):
+        next(iter(user_ids))
+        raise RuntimeError("index unavailable")
+    monkeypatch.setattr(service.store, "filter_users", fail)
+    assert service.filter_recipients((user_id for user_id in ["u1", "u2"]), "task_assignment") == ["u1", "u2"]
@@ -3,21 +3,126 @@ User Preferences Service for TaskFlow Python Backend
 """
 
 import logging
-from typing import Dict, Any
+import os
+from collections.abc import Mapping
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import json
+from database import Database
+from preferences_store import PreferencesStore
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One immutable default profile shared by every user
+DEFAULT_PREFERENCES = MappingProxyType({
+    "emailNotifications": True,
+    "pushNotifications": True,
+    "dailySummary": True,
+    "weeklySummary": True,
+    "taskAssignment": True,
+    "taskDueDate": True,
+    "emailFrequency": "daily",
+    "timezone": "UTC",
+    "summaryHour": 9
+})
+
+# Boolean preferences, stored as bit flags for bulk filtering
+FLAG_PREFERENCES = tuple(key for key, value in DEFAULT_PREFERENCES.items() if isinstance(value, bool))
+
+# Map notification types to preference keys
+NOTIFICATION_PREFERENCES = {
+    "task_assignment": "taskAssignment",
+    "task_due_date": "taskDueDate",
+    "daily_summary": "dailySummary",
+    "weekly_summary": "weeklySummary"
+}
+
+# Summary frequencies and the preferences that enable them
+SUMMARY_PREFERENCES = {
+    "daily": "dailySummary",
+    "weekly": "weeklySummary"
+}
+
+# Weekly summaries go out on Mondays, local time
+WEEKLY_SUMMARY_WEEKDAY = 0
+
+class UserPreferences(Mapping):
+    """Read-only view of a user's overrides on top of the default preferences"""
+    
+    __slots__ = ('overrides',)
+    
+    def __init__(self, overrides: Optional[Dict[str, Any]] = None):
+        self.overrides = overrides or {}
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in self.overrides:
+            return self.overrides[key]
+        return DEFAULT_PREFERENCES[key]
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from DEFAULT_PREFERENCES
+        yield from (key for key in self.overrides if key not in DEFAULT_PREFERENCES)
+    
+    def __len__(self) -> int:
+        return len(DEFAULT_PREFERENCES) + sum(1 for key in self.overrides if key not in DEFAULT_PREFERENCES)
+    
+    def __repr__(self) -> str:
+        return f"UserPreferences({dict(self)!r})"
+
+def is_timezone(name: Any) -> bool:
+    """Whether a value is a timezone name known to pytz"""
+    import pytz
+    
+    if not isinstance(name, str):
+        return False
+    try:
+        pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        return False
+    return True
+
+def summary_slots(overrides: Mapping[str, Any]) -> Tuple[Tuple[str, str, int], ...]:
+    """
+    Get the summary delivery slots of a user
+    
+    Args:
+        overrides: The user's overrides of the defaults
+        
+    Returns:
+        One (frequency, timezone, hour) slot per enabled summary
+    """
+    preferences = UserPreferences(overrides)
+    try:
+        hour = int(preferences["summaryHour"]) % 24
+    except (TypeError, ValueError, OverflowError):
+        hour = DEFAULT_PREFERENCES["summaryHour"]
+    timezone = preferences["timezone"]
+    if not is_timezone(timezone):
+        timezone = DEFAULT_PREFERENCES["timezone"]
+    return tuple(
+        (frequency, timezone, hour)
+        for frequency, key in SUMMARY_PREFERENCES.items() if preferences[key]
+    )
+
 class UserPreferencesService:
-    def __init__(self):
-        """Initialize the user preferences service"""
-        # In a real implementation, this would be a database
-        self.user_preferences = {}
+    def __init__(self, database: Optional[Database] = None):
+        """
+        Initialize the user preferences service
+        
+        Args:
+            database: SQLite database, defaults to DATABASE_PATH (opened on first use)
+        """
+        self.store = PreferencesStore(
+            database or Database(),
+            DEFAULT_PREFERENCES,
+            FLAG_PREFERENCES,
+            cache_size=int(os.getenv('PREFERENCES_CACHE_SIZE', '10000')),
+            slot_fn=summary_slots
+        )
         logger.info("User preferences service initialized")
     
-    def get_user_preferences(self, user_id: str) -> Dict[str, Any]:
+    def get_user_preferences(self, user_id: str) -> UserPreferences:
         """
         Get user notification preferences
         
@@ -25,30 +130,86 @@ class UserPreferencesService:
             user_id: User ID
             
         Returns:
-            User preferences
+            Read-only user preferences, the defaults merged with the user's overrides on access
         """
         try:
-            # Return default preferences if user has none
-            if user_id not in self.user_preferences:
-                default_preferences = {
-                    "emailNotifications": True,
-                    "pushNotifications": True,
-                    "dailySummary": True,
-                    "weeklySummary": True,
-                    "taskAssignment": True,
-                    "taskDueDate": True,
-                    "emailFrequency": "daily"
-                }
-                self.user_preferences[user_id] = default_preferences
-                logger.info(f"Created default preferences for user {user_id}")
-            
+            overrides, _ = self.store.get(user_id)
             logger.info(f"Retrieved preferences for user {user_id}")
-            return self.user_preferences[user_id]
+            return UserPreferences(overrides)
             
         except Exception as e:
             logger.error(f"Failed to get user preferences: {e}")
             raise Exception(f"Failed to get user preferences: {e}")
     
+    def get_version(self, user_id: str) -> int:
+        """
+        Get the version of a user's preferences
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Version number, 0 if the user never changed them
+        """
+        return self.store.get(user_id)[1]
+    
+    def get_changes_since(self, version: int, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Get the preference changes after a version
+        
+        Consumers keeping their own cache start from version 0 and pass the
+        returned version on the next call. A different storeId means the
+        database was replaced and the cache must be dropped.
+        
+        Args:
+            version: Last version the consumer has applied
+            limit: Maximum number of changes to return
+            
+        Returns:
+            Changed users with their overrides, the version to resume from and
+            whether more changes are pending
+        """
+        try:
+            changes, resume_version, has_more = self.store.changes_since(version, limit)
+            return {
+                "storeId": self.store.store_id,
+                "version": resume_version,
+                "hasMore": has_more,
+                "changes": [
+                    {"userId": user_id, "version": change_version, "overrides": overrides}
+                    for user_id, overrides, change_version in changes
+                ]
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to get preference changes: {e}")
+            raise Exception(f"Failed to get preference changes: {e}")
+    
+    @property
+    def store_id(self) -> str:
+        """ID of the preferences database, shared by all workers"""
+        return self.store.store_id
+    
+    def validate(self, preferences: Any) -> Optional[str]:
+        """
+        Validate preferences from a request body
+        
+        Args:
+            preferences: Preferences to set
+            
+        Returns:
+            Error message, or None if the preferences are valid
+        """
+        if not isinstance(preferences, dict):
+            return "preferences must be an object"
+        if "timezone" in preferences and not is_timezone(preferences["timezone"]):
+            return "timezone must be a timezone name such as Europe/Berlin"
+        if "summaryHour" in preferences:
+            hour = preferences["summaryHour"]
+            if isinstance(hour, bool) or not isinstance(hour, int) or not 0 <= hour <= 23:
+                return "summaryHour must be an hour from 0 to 23"
+        return None
+    
     def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> bool:
         """
         Update user notification preferences
@@ -59,14 +220,16 @@ class UserPreferencesService:
             
         Returns:
             Success status
+            
+        Raises:
+            ValueError: If the preferences are invalid
         """
+        error = self.validate(preferences)
+        if error:
+            raise ValueError(error)
         try:
-            # Initialize user preferences if they don't exist
-            if user_id not in self.user_preferences:
-                self.user_preferences[user_id] = {}
-            
-            # Update preferences
-            self.user_preferences[user_id].update(preferences)
+            # Persist only what differs from the defaults
+            self.store.update(user_id, preferences)
             logger.info(f"Updated preferences for user {user_id}")
             return True
             
@@ -74,6 +237,44 @@ class UserPreferencesService:
             logger.error(f"Failed to update user preferences: {e}")
             raise Exception(f"Failed to update user preferences: {e}")
     
+    def get_due_summary_recipients(self, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """
+        Get the users whose summaries are due in the current hour
+        
+        Users are grouped by delivery slot (frequency, timezone and hour), so
+        only the slots whose local hour has come are read. In timezones with a
+        half-hour offset the summary goes out at half past the hour.
+        
+        Args:
+            now: Current time, defaults to now
+            
+        Returns:
+            User IDs per summary frequency
+        """
+        import pytz
+        
+        now = now or datetime.now(pytz.utc)
+        if now.tzinfo is None:
+            now = pytz.utc.localize(now)
+        
+        due = {frequency: [] for frequency in SUMMARY_PREFERENCES}
+        local_times = {}
+        for slot in self.store.slots():
+            frequency, timezone, hour = slot
+            if timezone not in local_times:
+                try:
+                    local_times[timezone] = now.astimezone(pytz.timezone(timezone))
+                except pytz.UnknownTimeZoneError:
+                    logger.warning(f"Skipping summaries for unknown timezone {timezone}")
+                    local_times[timezone] = None
+            local_time = local_times[timezone]
+            if local_time is None or local_time.hour != hour:
+                continue
+            if frequency == "weekly" and local_time.weekday() != WEEKLY_SUMMARY_WEEKDAY:
+                continue
+            due[frequency].extend(self.store.slot_users(slot))
+        return due
+    
     def should_send_notification(self, user_id: str, notification_type: str) -> bool:
         """
         Check if a notification should be sent to a user
@@ -85,24 +286,39 @@ class UserPreferencesService:
         Returns:
             Whether notification should be sent
         """
-        try:
-            preferences = self.get_user_preferences(user_id)
+        return bool(self.filter_recipients((user_id,), notification_type))
+    
+    def filter_recipients(self, user_ids: Iterable[str], notification_type: str) -> List[str]:
+        """
+        Keep the users who accept a type of notification
+        
+        Args:
+            user_ids: Recipient user IDs
+            notification_type: Type of notification
             
-            # Map notification types to preference keys
-            preference_map = {
-                "task_assignment": "taskAssignment",
-                "task_due_date": "taskDueDate",
-                "daily_summary": "dailySummary",
-                "weekly_summary": "weeklySummary"
-            }
+        Returns:
+            The recipients to notify, in the given order
+        """
+        # Once, so the fallback below still has every recipient
+        user_ids = list(user_ids)
+        preference_key = NOTIFICATION_PREFERENCES.get(notification_type, notification_type)
+        try:
+            if preference_key in self.store.flag_bits:
+                return self.store.filter_users(user_ids, preference_key)
             
-            preference_key = preference_map.get(notification_type, notification_type)
-            return preferences.get(preference_key, True)
+            # Not a boolean preference, check each user's stored value
+            recipients = []
+            default = DEFAULT_PREFERENCES.get(preference_key, True)
+            for user_id in user_ids:
+                overrides, _ = self.store.get(user_id)
+                if (overrides or {}).get(preference_key, default):
+                    recipients.append(user_id)
+            return recipients
             
         except Exception as e:
-            logger.error(f"Failed to check notification preference: {e}")
-            # Default to sending notification if there's an error
-            return True
+            logger.error(f"Failed to check notification preferences: {e}")
+            # Default to sending notifications if there's an error
+            return list(user_ids)
 
 # Global instance
 user_preferences_service = UserPreferencesService()
\ No newline at end of file